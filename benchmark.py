@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timezone
+from os import getenv
+from types import SimpleNamespace
+from typing import Callable, Awaitable, Dict, List
+
+from disnake import Object, PermissionOverwrite
+from dotenv import load_dotenv
+
+from src.classes.channel_settings import ChannelSettings
+from src.classes.overwrite_templates import OverwriteTemplates
+from src.classes.setting_change import SettingLatency, apply_setting_change
+from src.storage.backend import create_database, Database
+from src.storage.mongo import PoolMetrics, create_mongo_client
+from src.utils import generate_channel_metadata
+
+
+async def measure(samples: Dict[str, List[float]], name: str, operation: Callable[[], Awaitable]) -> None:
+    started_at = time.perf_counter()
+    await operation()
+    samples.setdefault(name, []).append((time.perf_counter() - started_at) * 1000)
+
+
+async def benchmark_storage(backend: str, users: int) -> None:
+    """
+    Run the channel settings access patterns of Krabbe against a storage backend and print the latencies.
+    """
+    pool_metrics = PoolMetrics()
+
+    database = create_database(
+        backend,
+        mongodb_client_factory=lambda: create_mongo_client(getenv("MONGODB_URL"), pool_metrics=pool_metrics),
+        sqlite_path=getenv("SQLITE_PATH", "benchmark.db"),
+        name="krabbe_benchmark"
+    )
+
+    await ChannelSettings.ensure_indexes(database)
+
+    samples: Dict[str, List[float]] = {}
+    user_ids = range(10 ** 17, 10 ** 17 + users)
+
+    for user_id in user_ids:
+        settings = ChannelSettings(None, database, user_id=user_id, channel_name=f"{user_id}'s channel")
+        await measure(samples, "insert", settings.upsert)
+
+    for user_id in user_ids:
+        await measure(samples, "find_one", lambda: ChannelSettings.find_one(None, database, user_id=user_id))
+
+    for user_id in user_ids:
+        settings = await ChannelSettings.find_one(None, database, user_id=user_id)
+        settings.volume = 50
+        await measure(samples, "update", settings.upsert)
+
+    for batch_start in range(0, users, 100):
+        batch = list(user_ids[batch_start:batch_start + 100])
+
+        async def find_batch():
+            return [settings async for settings in ChannelSettings.find(None, database, user_id={"$in": batch})]
+
+        await measure(samples, "find_in_100", find_batch)
+
+    for user_id in user_ids:
+        settings = ChannelSettings(None, database, user_id=user_id)
+        await measure(samples, "delete", settings.delete)
+
+    print(f"Storage backend: {backend}, {users} users")
+
+    for name, values in samples.items():
+        values.sort()
+        print(
+            f"  {name:<12} n={len(values):<6} "
+            f"p50={statistics.median(values):8.3f}ms "
+            f"p95={values[int(len(values) * 0.95) - 1]:8.3f}ms "
+            f"max={values[-1]:8.3f}ms"
+        )
+
+    if isinstance(database, Database):
+        await database.close()
+    else:
+        print(f"  connection pool: {pool_metrics.stats()}")
+
+
+def benchmark_overwrites(overwrites: int, calls: int) -> None:
+    """
+    Generate the metadata of a channel in a category with many overwrites and print the cost per call,
+    with the template and the metadata rebuilt on every call, with the template only, and fully memoized.
+    """
+    category_overwrites = {Object(10 ** 17 + i): PermissionOverwrite(view_channel=True) for i in range(overwrites)}
+
+    guild = SimpleNamespace(id=1, premium_tier=2, get_member=lambda member_id: None)
+    category = SimpleNamespace(overwrites=category_overwrites)
+    bot = SimpleNamespace(kava_server=SimpleNamespace(clients={}))
+    bot.overwrite_templates = OverwriteTemplates(bot)
+
+    guild_settings = SimpleNamespace(
+        guild_id=1, guild=guild, category_channel=category, category_channel_id=2,
+        base_role=Object(3), base_role_id=3, allow_nsfw=False
+    )
+    channel_settings = ChannelSettings(None, None, user_id=4, channel_name="benchmark", media_allowed=True)
+    owner = Object(4)
+
+    def generate() -> None:
+        generate_channel_metadata(bot, owner, [], channel_settings, guild_settings)
+
+    def generate_cold() -> None:
+        bot.overwrite_templates.invalidate(guild.id)
+        generate()
+
+    def generate_template_only() -> None:
+        bot.overwrite_templates.metadata_cache.clear()
+        generate()
+
+    print(f"Channel metadata generation: {overwrites} category overwrites, {calls} calls")
+
+    for name, operation in [("cold", generate_cold), ("template", generate_template_only), ("memoized", generate)]:
+        started_at = time.perf_counter()
+
+        for _ in range(calls):
+            operation()
+
+        print(f"  {name:<12} {(time.perf_counter() - started_at) / calls * 1_000_000:10.2f}us/call")
+
+
+async def benchmark_setting_changes(changes: int, effect_latency: float) -> None:
+    """
+    Apply setting changes whose effects each take `effect_latency` milliseconds and print the latencies of
+    `apply_setting_change` next to the ones of the sequential path it replaced, as the baseline.
+    """
+    delay = effect_latency / 1000
+
+    async def effect(*_args, **_kwargs) -> None:
+        await asyncio.sleep(delay)
+
+    async def schedule_edit() -> Awaitable:
+        return asyncio.ensure_future(effect())
+
+    bot = SimpleNamespace(setting_latency=SettingLatency(samples=changes))
+    channel = SimpleNamespace(
+        channel_id=1,
+        channel_settings=SimpleNamespace(upsert=effect),
+        apply_setting_and_permissions=schedule_edit,
+        notify=effect,
+        guild_settings=SimpleNamespace(log_settings_event=effect)
+    )
+
+    def interaction() -> SimpleNamespace:
+        return SimpleNamespace(bot=bot, created_at=datetime.now(timezone.utc), followup=SimpleNamespace(send=effect))
+
+    async def apply_sequentially() -> None:
+        # Every effect awaited in turn, and the response sent before the settings event is logged
+        change = interaction()
+
+        await channel.channel_settings.upsert()
+        await (await channel.apply_setting_and_permissions())
+        await channel.notify(wait=True, embed=None)
+        await effect()
+
+        bot.setting_latency.record(
+            "sequential", "response", (datetime.now(timezone.utc) - change.created_at).total_seconds()
+        )
+
+        await channel.guild_settings.log_settings_event(prefix="", channel=channel, message="")
+
+        bot.setting_latency.record(
+            "sequential", "applied", (datetime.now(timezone.utc) - change.created_at).total_seconds()
+        )
+
+    for _ in range(changes):
+        await apply_setting_change(interaction(), channel, "concurrent", effect, notification=object(), log_message="")
+        await apply_sequentially()
+
+    print(f"Setting changes: {changes} changes, {effect_latency}ms per effect")
+
+    for name, stats in bot.setting_latency.stats().items():
+        print(f"  {name:<20} p50={stats['p50_ms']:8.1f}ms p95={stats['p95_ms']:8.1f}ms max={stats['max_ms']:8.1f}ms")
+
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark Krabbe storage backends, channel metadata generation and setting changes"
+    )
+    parser.add_argument("--target", choices=["storage", "overwrites", "settings"], default="storage")
+    parser.add_argument("--backend", choices=["mongo", "memory", "sqlite"], default="memory")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--overwrites", type=int, default=500)
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--changes", type=int, default=100)
+    parser.add_argument("--effect-latency", type=float, default=50)
+
+    args = parser.parse_args()
+
+    if args.target == "overwrites":
+        benchmark_overwrites(args.overwrites, args.calls)
+    elif args.target == "settings":
+        asyncio.run(benchmark_setting_changes(args.changes, args.effect_latency))
+    else:
+        asyncio.run(benchmark_storage(args.backend, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,96 @@
+import argparse
+import asyncio
+import logging
 from os import getenv
+from typing import Optional
 
-from disnake import ForumChannel
+from disnake import Client, Intents
 from dotenv import load_dotenv
 
-from src.bot import Krabbe
+from src.migrations.runner import MigrationRunner, MigrationLocked
+from src.storage.backend import create_database, Database
+from src.storage.mongo import create_mongo_client
 
-load_dotenv()
 
-bot = Krabbe()
+async def login() -> Client:
+    """
+    Log in a minimal Discord client, only caching guilds and channels, for the migrations that need Discord.
 
+    :return: The ready client.
+    """
+    client = Client(intents=Intents(guilds=True))
 
-@bot.event
-async def on_ready():
-    print(f"Logged in as {bot.user}")
+    await client.login(getenv("BOT_TOKEN"))
 
-    guild_settings = bot.database.get_collection("guild_settings").find({})
+    _ = asyncio.get_running_loop().create_task(client.connect())
 
-    async for guild_setting in guild_settings:
-        print(guild_setting)
+    await client.wait_until_ready()
 
-        if guild_setting.get("settings_event_logging_thread_id") and guild_setting.get("voice_event_logging_thread_id"):
-            continue
+    print(f"Logged in as {client.user}")
 
-        event_logging_channel: ForumChannel = bot.get_channel(guild_setting["event_logging_channel_id"])
+    return client
 
-        if not event_logging_channel:
-            await bot.database.get_collection("guild_settings").delete_one({"_id": guild_setting["_id"]})
-            continue
 
-        settings_event_logging_thread, _ = await event_logging_channel.create_thread(
-            name="設定事件記錄",
-            content="這裡是設定事件記錄討論串，用於紀錄成員對於頻道設定的更新"
-        )
-        voice_event_logging_thread, _ = await event_logging_channel.create_thread(
-            name="語音事件記錄",
-            content="這裡是語音事件記錄頻道，用於紀錄語音頻道的動態，如成員加入、離開等"
-        )
+async def migrate(args: argparse.Namespace) -> None:
+    database = create_database(
+        getenv("STORAGE_BACKEND", "mongo"),
+        mongodb_client_factory=lambda: create_mongo_client(getenv("MONGODB_URL")),
+        sqlite_path=getenv("SQLITE_PATH", "krabbe.db")
+    )
 
-        await bot.database.get_collection("guild_settings").update_one(
-            {"_id": guild_setting["_id"]},
-            {
-                "$set": {
-                    "settings_event_logging_thread_id": settings_event_logging_thread.id,
-                    "voice_event_logging_thread_id": voice_event_logging_thread.id
-                }
-            }
-        )
+    runner = MigrationRunner(database, batch_size=args.batch_size, concurrency=args.concurrency)
+    client: Optional[Client] = None
 
-    print("Migration Done")
+    try:
+        if args.command == "status":
+            for checkpoint in await runner.status():
+                print(checkpoint)
+
+        elif args.command == "reset":
+            await runner.reset(args.number)
+            print(f"Reset migration {args.number}")
+
+        elif args.command == "run":
+            numbers = [args.number] if args.number is not None else None
+            selected = runner.migrations if numbers is None else [runner.get_migration(args.number)]
+
+            if any(migration.needs_discord for migration in selected):
+                client = await login()
+                runner.client = client
+
+            for checkpoint in await runner.run(numbers):
+                print(checkpoint)
+
+            print("Migration Done")
+
+    except MigrationLocked as error:
+        print(error)
+
+    finally:
+        if client is not None:
+            await client.close()
+
+        if isinstance(database, Database):
+            await database.close()
+
+
+def main() -> None:
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Run the Krabbe database migrations")
+    parser.add_argument("command", choices=["run", "status", "reset"])
+    parser.add_argument("number", type=int, nargs="?", help="The migration to run or reset. Every migration if omitted")
+    parser.add_argument("--batch-size", type=int, help="Override the batch size of the migrations")
+    parser.add_argument("--concurrency", type=int, help="Override the concurrency of the migrations")
+
+    args = parser.parse_args()
+
+    if args.command == "reset" and args.number is None:
+        parser.error("reset needs the number of the migration")
+
+    asyncio.run(migrate(args))
 
 
 if __name__ == "__main__":
-    bot.run(getenv("BOT_TOKEN"))
+    main()
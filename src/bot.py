@@ -1,21 +1,42 @@
+import asyncio
 import json
 import logging
+import time
 from os import getenv
-from typing import Optional
+from typing import Optional, List
 
 from ZeitfreiOauth import AsyncDiscordOAuthClient
 from aiohttp import ClientSession
 from colorlog import ColoredFormatter
 from disnake import Intents, Event, VoiceState, Member, Webhook
 from disnake.ext.commands import InteractionBot, CommandSyncFlags
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pymongo.server_api import ServerApi
-
+from pymongo.errors import PyMongoError
+
+from src.classes.cache_invalidator import CacheInvalidator
+from src.classes.channel_edit_planner import ChannelEditPlanner
+from src.classes.channel_settings import ChannelSettings
+from src.classes.channel_pool import ChannelPool, PooledChannel
+from src.classes.guild_settings import GuildSettings
+from src.classes.log_aggregator import LogAggregator
+from src.classes.message_mirror import MessageMirror
+from src.classes.setting_change import SettingLatency
+from src.classes.mongo_object import MongoObject
+from src.classes.orphan_reconciler import OrphanReconciler
+from src.classes.outbound_queue import OutboundQueue
+from src.classes.overwrite_templates import OverwriteTemplates
+from src.classes.rate_limited_queue import RateLimitedQueue
+from src.classes.rename_queue import RenameQueue
 from src.classes.voice_channel import VoiceChannel
+from src.classes.voice_event_recorder import VoiceEventRecorder
 from src.errors import FailedToResolve
 from src.kava.handlers import add_handlers
 from src.kava.server import KavaServer
+from src.migrations.m0002_sparse_channel_settings import SparseChannelSettings
+from src.migrations.runner import MigrationRunner, MigrationLocked
 from src.panels import setup_views
+from src.storage.backend import create_database, Database
+from src.storage.journal import WriteAheadJournal
+from src.storage.mongo import PoolMetrics, create_mongo_client
 
 
 def setup_logging(debug: bool) -> logging.Logger:
@@ -61,11 +82,99 @@ class Krabbe(InteractionBot):
 
         self.debug: bool = bool(getenv("DEBUG"))
 
-        self.database: AsyncIOMotorDatabase = AsyncIOMotorClient(
-            getenv("MONGODB_URL"), server_api=ServerApi('1')
-        ).get_database("krabbe")
+        self.pool_metrics: PoolMetrics = PoolMetrics()
+
+        # A Motor database, or one of the storage backends implementing the same interface
+        self.database: Database = create_database(
+            getenv("STORAGE_BACKEND", "mongo"),
+            mongodb_client_factory=lambda: create_mongo_client(
+                getenv("MONGODB_URL"),
+                pool_metrics=self.pool_metrics,
+                max_pool_size=int(getenv("MONGODB_MAX_POOL_SIZE", "100")),
+                min_pool_size=int(getenv("MONGODB_MIN_POOL_SIZE", "0")),
+                server_selection_timeout_ms=int(getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+                connect_timeout_ms=int(getenv("MONGODB_CONNECT_TIMEOUT_MS", "20000")),
+                socket_timeout_ms=int(getenv("MONGODB_SOCKET_TIMEOUT_MS")) if getenv("MONGODB_SOCKET_TIMEOUT_MS") else None
+            ),
+            sqlite_path=getenv("SQLITE_PATH", "krabbe.db")
+        )
+
+        self.journal: Optional[WriteAheadJournal] = WriteAheadJournal(
+            getenv("WRITE_AHEAD_JOURNAL_PATH"), self.database
+        ) if getenv("WRITE_AHEAD_JOURNAL_PATH") else None
+
+        self.stats_interval: int = int(getenv("STATS_INTERVAL", "600"))
+        self.restore_concurrency: int = int(getenv("RESTORE_CONCURRENCY", "5"))
+        self.setup_concurrency: int = int(getenv("SETUP_CONCURRENCY", "3"))
+        # The number of webhooks created in a new message logging channel, at most 15 per channel
+        self.message_logging_webhooks: int = min(int(getenv("MESSAGE_LOGGING_WEBHOOKS", "1")), 15)
+
+        self.outbound: OutboundQueue = OutboundQueue(
+            max_pending=int(getenv("OUTBOUND_MAX_PENDING", "1000")),
+            max_concurrency=int(getenv("OUTBOUND_CONCURRENCY", "10"))
+        )
+
+        self.log_aggregator: Optional[LogAggregator] = LogAggregator(
+            self, flush_interval=float(getenv("LOG_AGGREGATION_INTERVAL", "3"))
+        ) if float(getenv("LOG_AGGREGATION_INTERVAL", "3")) > 0 else None
+
+        self.setting_latency: SettingLatency = SettingLatency()
+
+        self.overwrite_templates: OverwriteTemplates = OverwriteTemplates(
+            self, metadata_cache_size=int(getenv("CHANNEL_METADATA_CACHE_SIZE", "10000"))
+        )
+
+        self.rename_queue: RenameQueue = RenameQueue(self)
+
+        self.edit_planner: ChannelEditPlanner = ChannelEditPlanner(
+            max_permission_calls=int(getenv("EDIT_PLANNER_MAX_PERMISSION_CALLS", "1"))
+        )
+
+        self.channel_pool: ChannelPool = ChannelPool(
+            self,
+            self.database,
+            max_size=int(getenv("CHANNEL_POOL_MAX_SIZE", "0")),
+            horizon=float(getenv("CHANNEL_POOL_HORIZON", "60")),
+            demand_window=float(getenv("CHANNEL_POOL_DEMAND_WINDOW", "600"))
+        )
+
+        self.message_mirror: MessageMirror = MessageMirror(
+            self, window=float(getenv("MESSAGE_MIRROR_WINDOW", "2"))
+        )
+
+        self.restore_notifications: RateLimitedQueue = RateLimitedQueue(
+            name="restore_notifications", rate=int(getenv("RESTORE_NOTIFICATION_RATE", "2")), per=1.0
+        )
+
+        ChannelSettings.configure_cache(
+            max_size=int(getenv("CHANNEL_SETTINGS_CACHE_SIZE", "10000")),
+            ttl=float(getenv("CHANNEL_SETTINGS_CACHE_TTL", "1800"))
+        )
 
         self.logger = setup_logging(self.debug)
+
+        self.cache_invalidator: CacheInvalidator = CacheInvalidator(
+            self,
+            self.database,
+            mode=getenv("CACHE_INVALIDATION", "off"),
+            poll_interval=float(getenv("CACHE_POLL_INTERVAL", "30"))
+        )
+
+        self.voice_events: VoiceEventRecorder = VoiceEventRecorder(
+            self,
+            self.database,
+            flush_interval=float(getenv("VOICE_EVENTS_FLUSH_INTERVAL", "10")),
+            max_buffer_size=int(getenv("VOICE_EVENTS_BUFFER_SIZE", "500")),
+            retention_days=int(getenv("VOICE_EVENTS_RETENTION_DAYS", "90"))
+        )
+
+        self.orphan_reconciler: OrphanReconciler = OrphanReconciler(
+            self,
+            self.database,
+            interval=float(getenv("ORPHAN_RECONCILE_INTERVAL", "3600")),
+            min_age=float(getenv("ORPHAN_MIN_AGE", "300")),
+            cleanup_rate=int(getenv("ORPHAN_CLEANUP_RATE", "1"))
+        )
         self.__load_extensions()
 
         self.webhooks_client_session: ClientSession = ClientSession()
@@ -99,24 +208,106 @@ class Krabbe(InteractionBot):
             self.load_extension(extension)
             self.logger.info(f"Loaded extension {extension}")
 
+    async def login(self, token: str) -> None:
+        """
+        Open the write-ahead journal before logging in, so the writes left by the previous run are replayed
+        before any view, listener or the Kava server can write newer ones.
+
+        :param token: The bot token.
+        :return: None
+        """
+        await self.__open_journal()
+
+        await super().login(token)
+
+    async def __open_journal(self) -> None:
+        """
+        Open the write-ahead journal, and wait for the writes left by the previous run to be applied.
+
+        :return: None
+        """
+        if self.journal is None:
+            return
+
+        if await self.journal.open():
+            try:
+                await asyncio.wait_for(self.journal.join(), float(getenv("JOURNAL_REPLAY_TIMEOUT", "60")))
+            except asyncio.TimeoutError:
+                self.logger.warning("Journal replay is taking too long, continuing while it's applied in the background")
+
+        MongoObject.configure_journal(self.journal)
+
+    async def __ensure_indexes(self) -> None:
+        """
+        Create the missing indexes of every collection.
+
+        :return: None
+        """
+        for mongo_object in (GuildSettings, ChannelSettings, VoiceChannel, PooledChannel):
+            await mongo_object.ensure_indexes(self.database)
+
+        await self.voice_events.ensure_collections()
+
     async def __load_channels(self) -> None:
         """
         Load all voice channels from the database.
 
         :return: None
         """
-        async for voice_channel in VoiceChannel.find(self, self.database):
+        started_at = time.perf_counter()
+
+        voice_channels = await VoiceChannel.load_all(self, self.database)
+
+        loaded_at = time.perf_counter()
+
+        restorable: List[VoiceChannel] = []
+
+        for voice_channel in voice_channels:
             try:
                 self.logger.info(f"Resolving voice channel {voice_channel.channel} with owner {voice_channel.owner}")
             except FailedToResolve:
-                self.logger.warning(f"Failed to resolve voice channel {voice_channel.channel_id}, removing.")
-                await voice_channel.remove()
+                # Left for the orphan reconciler to clean up in bulk
+                self.logger.warning(f"Failed to resolve voice channel {voice_channel.channel_id}, skipping.")
                 continue
 
             VoiceChannel.active_channels[voice_channel.channel_id] = voice_channel
             voice_channel.start_listeners()
 
-            await voice_channel.restore_state()
+            restorable.append(voice_channel)
+
+        semaphore = asyncio.Semaphore(self.restore_concurrency)
+
+        async def restore(channel: VoiceChannel) -> None:
+            async with semaphore:
+                await channel.restore_state()
+
+        results = await asyncio.gather(*[restore(channel) for channel in restorable], return_exceptions=True)
+
+        for channel, result in zip(restorable, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f"Failed to restore the state of voice channel {channel.channel_id}: {result}")
+
+        self.logger.info(
+            f"Restored {len(VoiceChannel.active_channels)} voice channels in {time.perf_counter() - started_at:.2f}s "
+            f"(loading took {loaded_at - started_at:.2f}s)"
+        )
+
+    async def __migrate_channel_settings(self) -> None:
+        """
+        Rewrite the stored channel settings in the sparse format in the background.
+
+        :return: None
+        """
+        runner = MigrationRunner(
+            self.database, client=self, batch_size=int(getenv("CHANNEL_SETTINGS_MIGRATION_BATCH_SIZE", "1000"))
+        )
+
+        try:
+            await runner.run([SparseChannelSettings.number])
+        except MigrationLocked as error:
+            self.logger.info(f"Skipping the channel settings migration: {error}")
+        except PyMongoError as error:
+            self.logger.error(f"Channel settings migration failed, it resumes from its checkpoint on restart: {error}")
 
     async def __setup_kava_server(self) -> None:
         """
@@ -128,6 +319,61 @@ class Krabbe(InteractionBot):
         
         add_handlers(self.kava_server)
 
+    async def close(self) -> None:
+        """
+        Close the bot, flush the buffered event logs, mirrored messages and voice events and release the storage backend.
+
+        :return: None
+        """
+        if self.log_aggregator is not None:
+            await self.log_aggregator.close()  # Before the HTTP session is closed
+
+        await self.message_mirror.close()
+
+        self.rename_queue.stop()
+
+        await super().close()
+
+        await self.voice_events.close()
+
+        if self.journal is not None:
+            await self.journal.close()
+
+        if isinstance(self.database, Database):
+            await self.database.close()
+
+    async def __report_stats(self) -> None:
+        """
+        Periodically log the runtime statistics of the bot.
+
+        :return: None
+        """
+        while not self.is_closed():
+            await asyncio.sleep(self.stats_interval)
+
+            self.logger.info(f"Channel settings cache: {ChannelSettings.cache_stats()}")
+            self.logger.info(f"Restore notifications queue: {self.restore_notifications.stats()}")
+            self.logger.info(f"Outbound queue: {self.outbound.stats()}")
+
+            if self.log_aggregator is not None:
+                self.logger.info(f"Event log aggregator: {self.log_aggregator.stats()}")
+
+            self.logger.info(f"Message mirror: {self.message_mirror.stats()}")
+            self.logger.info(f"Setting change latency: {self.setting_latency.stats()}")
+            self.logger.info(f"Channel edit planner: {self.edit_planner.stats()}")
+            self.logger.info(f"Rename queue: {self.rename_queue.stats()}")
+            self.logger.info(f"Overwrite templates: {self.overwrite_templates.stats()}")
+            self.logger.info(f"Channel pool: {self.channel_pool.stats()}")
+
+            self.logger.info(f"Orphan reconciler: {self.orphan_reconciler.stats()}")
+            self.logger.info(f"Voice events: {self.voice_events.stats()}")
+
+            if self.journal is not None:
+                self.logger.info(f"Write-ahead journal: {self.journal.stats()}")
+
+            if not isinstance(self.database, Database):
+                self.logger.info(f"MongoDB connection pool: {self.pool_metrics.stats()}")
+
     async def __on_ready(self) -> None:
         """
         Method executed when the bot is ready to start receiving events.
@@ -142,8 +388,28 @@ class Krabbe(InteractionBot):
 
         await self.__setup_kava_server()
 
+        self.restore_notifications.start()
+
+        if self.log_aggregator is not None:
+            self.log_aggregator.start()
+
+        await self.__ensure_indexes()
+
         await self.__load_channels()
 
+        if self.channel_pool.enabled:
+            await self.channel_pool.load()
+
+        if getenv("MIGRATE_CHANNEL_SETTINGS"):
+            _ = self.loop.create_task(self.__migrate_channel_settings())
+
+        self.voice_events.start()
+        self.orphan_reconciler.start()
+        self.channel_pool.start()
+        self.cache_invalidator.start()
+
+        _ = self.loop.create_task(self.__report_stats())
+
     async def __on_voice_state_update(self, member: Member, before: VoiceState, after: VoiceState) -> None:
         """
         Method executed when a voice state update event is received.
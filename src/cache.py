@@ -0,0 +1,125 @@
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar, Optional, Dict, Hashable, List, Tuple
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    A bounded least-recently-used cache with a time-to-live for each entry.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """
+        :param max_size: The maximum number of entries kept in the cache.
+        :param ttl: The number of seconds an entry stays valid. None for no expiration.
+        """
+        self.max_size: int = max_size
+        self.ttl: Optional[float] = ttl
+
+        self._entries: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return self.peek(key) is not None
+
+    def _is_expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        Get the value of the key, counting a hit or a miss.
+
+        :param key: The key to look up.
+        :return: The cached value. None if the key is missing or expired.
+        """
+        entry = self._entries.get(key)
+
+        if entry is None or self._is_expired(entry[0]):
+            if entry is not None:
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return entry[1]
+
+    def peek(self, key: K) -> Optional[V]:
+        """
+        Get the value of the key without touching the recency order or the statistics.
+
+        :param key: The key to look up.
+        :return: The cached value. None if the key is missing or expired.
+        """
+        entry = self._entries.get(key)
+
+        if entry is None or self._is_expired(entry[0]):
+            return None
+
+        return entry[1]
+
+    def put(self, key: K, value: V) -> None:
+        """
+        Store the value of the key, evicting the least recently used entries if the cache is full.
+
+        :param key: The key to store.
+        :param value: The value to store.
+        """
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: K) -> Optional[V]:
+        """
+        Remove the key from the cache.
+
+        :param key: The key to remove.
+        :return: The removed value if any.
+        """
+        entry = self._entries.pop(key, None)
+
+        return entry[1] if entry else None
+
+    def clear(self) -> None:
+        """
+        Remove every entry from the cache.
+        """
+        self._entries.clear()
+
+    def keys(self) -> List[K]:
+        return list(self._entries.keys())
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the statistics of this cache.
+
+        :return: A dictionary of the cache statistics.
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hit_ratio, 4)
+        }
@@ -0,0 +1,170 @@
+import asyncio
+from logging import getLogger
+from typing import TYPE_CHECKING, Literal, Optional, Dict, Any
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from src.classes.channel_settings import ChannelSettings
+from src.classes.guild_settings import GuildSettings
+from src.classes.voice_channel import VoiceChannel
+from src.utils import split_list
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+
+InvalidationMode = Literal["off", "watch", "poll", "auto"]
+
+
+class CacheInvalidator:
+    """
+    Keeps the in-process GuildSettings and ChannelSettings caches in sync with the database,
+    so changes made by other Krabbe processes or by hand are picked up without a restart.
+
+    In `watch` mode a change stream is used, which requires a replica set.
+    In `poll` mode the cached documents are re-read periodically.
+    `auto` tries the change stream first and falls back to polling if it's not supported.
+    """
+    logger = getLogger("krabbe.cache_invalidator")
+
+    def __init__(
+            self,
+            bot: "Krabbe",
+            database: AsyncIOMotorDatabase,
+            mode: InvalidationMode = "off",
+            poll_interval: float = 30
+    ):
+        self.bot: "Krabbe" = bot
+        self.database: AsyncIOMotorDatabase = database
+        self.mode: InvalidationMode = mode
+        self.poll_interval: float = poll_interval
+
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start keeping the caches in sync in the background.
+        """
+        if self.mode == "off" or (self._task and not self._task.done()):
+            return
+
+        if self.mode == "poll":
+            self._task = self.bot.loop.create_task(self._poll())
+        else:
+            self._task = self.bot.loop.create_task(self._watch())
+
+    def stop(self) -> None:
+        """
+        Stop keeping the caches in sync.
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self) -> None:
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": [GuildSettings.collection_name, ChannelSettings.collection_name]}}}
+        ]
+
+        self.logger.info("Watching settings changes with a change stream")
+
+        while True:
+            try:
+                async with self.database.watch(pipeline, full_document="updateLookup") as stream:
+                    async for change in stream:
+                        self.handle_change(change)
+
+            except OperationFailure as error:
+                if self.mode == "auto":
+                    self.logger.warning(f"Change streams are not available ({error}), falling back to polling")
+                    await self._poll()
+                    return
+
+                self.logger.error(f"Change stream failed: {error}")
+                raise
+
+            except PyMongoError as error:
+                self.logger.warning(f"Change stream interrupted, caches cleared and reconnecting: {error}")
+
+                # Changes may have been missed while the stream was down
+                GuildSettings.invalidate_cache()
+                ChannelSettings.invalidate_cache()
+
+                await asyncio.sleep(5)
+
+    def handle_change(self, change: Dict[str, Any]) -> None:
+        """
+        Apply a change stream event to the caches.
+
+        :param change: The change event.
+        """
+        collection = change["ns"]["coll"]
+        document = change.get("fullDocument")
+
+        if collection == GuildSettings.collection_name:
+            if document is None:  # Deleted, we can't tell which guild it was without the document
+                GuildSettings.invalidate_cache()
+                return
+
+            if cached := GuildSettings.get_from_cache(guild_id=document["guild_id"]):
+                cached.refresh_from_document(document)
+
+        elif collection == ChannelSettings.collection_name:
+            if document is None:
+                ChannelSettings.invalidate_cache()
+                return
+
+            self._refresh_channel_settings(document)
+
+    @staticmethod
+    def _refresh_channel_settings(document: Dict[str, Any]) -> None:
+        if cached := ChannelSettings.get_from_cache(document["user_id"]):
+            cached.refresh_from_document(document)
+
+        for voice_channel in VoiceChannel.active_channels.values():
+            if voice_channel.channel_settings.user_id == document["user_id"] \
+                    and voice_channel.channel_settings is not cached:
+                voice_channel.channel_settings.refresh_from_document(document)
+
+    async def _poll(self) -> None:
+        self.logger.info(f"Polling settings changes every {self.poll_interval} seconds")
+
+        while True:
+            await asyncio.sleep(self.poll_interval)
+
+            try:
+                await self.poll_once()
+            except PyMongoError as error:
+                self.logger.warning(f"Failed to poll settings changes: {error}")
+
+    async def poll_once(self) -> None:
+        """
+        Re-read every cached settings document and update or drop the cached objects.
+        """
+        for guild_ids in split_list(GuildSettings.cached_guild_ids(), 1000):
+            found = set()
+
+            async for document in self.database.get_collection(GuildSettings.collection_name).find(
+                    {"guild_id": {"$in": guild_ids}}
+            ):
+                found.add(document["guild_id"])
+
+                if cached := GuildSettings.get_from_cache(guild_id=document["guild_id"]):
+                    cached.refresh_from_document(document)
+
+            for guild_id in set(guild_ids) - found:
+                GuildSettings.invalidate_cache(guild_id)
+
+        for user_ids in split_list(ChannelSettings.cached_user_ids(), 1000):
+            found = set()
+
+            async for document in self.database.get_collection(ChannelSettings.collection_name).find(
+                    {"user_id": {"$in": user_ids}}
+            ):
+                found.add(document["user_id"])
+                self._refresh_channel_settings(document)
+
+            for user_id in set(user_ids) - found:
+                # Not stored, cached defaults are only dropped if they were stored before
+                if (cached := ChannelSettings.get_from_cache(user_id)) and cached.is_persisted():
+                    ChannelSettings.invalidate_cache(user_id)
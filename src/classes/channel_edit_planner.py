@@ -0,0 +1,196 @@
+import asyncio
+from enum import Enum
+from logging import getLogger
+from typing import Dict, Any, Tuple, Union, Optional
+
+import disnake
+from disnake import PermissionOverwrite, Role, Member, User, Object
+
+OverwriteTarget = Union[Role, Member, User, Object]
+
+
+class EditStrategy(Enum):
+    NONE = "none"
+    EDIT = "edit"
+    SET_PERMISSIONS = "set_permissions"
+
+
+class ChannelEditPlan:
+    """
+    The changes between a channel and its wanted metadata, and the REST calls applying them.
+    """
+
+    def __init__(
+            self,
+            channel: disnake.abc.GuildChannel,
+            fields: Dict[str, Any],
+            overwrites: Optional[Dict[OverwriteTarget, PermissionOverwrite]],
+            changed_overwrites: Dict[int, Tuple[OverwriteTarget, Optional[PermissionOverwrite]]],
+            strategy: EditStrategy
+    ):
+        """
+        :param channel: The channel to edit.
+        :param fields: The changed fields, other than the overwrites.
+        :param overwrites: The whole wanted overwrites map, None if the overwrites didn't change.
+        :param changed_overwrites: The changed overwrites by target ID, None overwrites are removed.
+        :param strategy: How the changes are applied.
+        """
+        self.channel: disnake.abc.GuildChannel = channel
+        self.fields: Dict[str, Any] = fields
+        self.overwrites: Optional[Dict[OverwriteTarget, PermissionOverwrite]] = overwrites
+        self.changed_overwrites: Dict[int, Tuple[OverwriteTarget, Optional[PermissionOverwrite]]] = changed_overwrites
+        self.strategy: EditStrategy = strategy
+
+    def __bool__(self) -> bool:
+        return self.strategy != EditStrategy.NONE
+
+    def __repr__(self) -> str:
+        return f"<ChannelEditPlan strategy={self.strategy.value} fields={list(self.fields)} " \
+               f"overwrites={list(self.changed_overwrites)}>"
+
+    async def execute(self) -> None:
+        """
+        Apply the changes to the channel.
+        """
+        if self.strategy == EditStrategy.EDIT:
+            edits = dict(self.fields)
+
+            if self.overwrites is not None:
+                edits["overwrites"] = self.overwrites
+
+            await self.channel.edit(**edits)
+
+        elif self.strategy == EditStrategy.SET_PERMISSIONS:
+            await asyncio.gather(
+                *[
+                    self.channel.set_permissions(target, overwrite=overwrite)
+                    for target, overwrite in self.changed_overwrites.values()
+                ]
+            )
+
+
+class ChannelEditPlanner:
+    """
+    Plans channel edits from a structural diff of the channel and its wanted metadata.
+
+    Overwrites are compared by target ID and by their allowed and denied permissions, so an overwrite is never
+    rewritten just because its target is a different object, or its unset permissions are stored differently.
+    When the overwrites of only a few targets changed and nothing else did, they're applied with one
+    `set_permissions` call per target instead of rewriting every overwrite with a full edit.
+    `set_permissions` needs to know whether a target is a role or a member, so targets that aren't cached are
+    resolved from the guild, and a full edit is used if any of them can't be.
+    """
+    logger = getLogger("krabbe.channel_edit_planner")
+
+    def __init__(self, max_permission_calls: int = 1):
+        """
+        :param max_permission_calls: The number of changed targets up to which `set_permissions` calls are
+            preferred over a full edit. 0 to always use a full edit.
+        """
+        self.max_permission_calls: int = max_permission_calls
+
+        self.plans: Dict[EditStrategy, int] = {strategy: 0 for strategy in EditStrategy}
+        self.overwrite_rewrites_skipped: int = 0
+        self.unresolved_targets: int = 0
+
+    @staticmethod
+    def diff_overwrites(
+            current: Dict[OverwriteTarget, PermissionOverwrite],
+            wanted: Dict[OverwriteTarget, PermissionOverwrite]
+    ) -> Dict[int, Tuple[OverwriteTarget, Optional[PermissionOverwrite]]]:
+        """
+        Get the overwrites that differ between two overwrite maps.
+
+        :param current: The overwrites of the channel.
+        :param wanted: The wanted overwrites.
+        :return: The changed overwrites by target ID, with None for the removed ones.
+        """
+        current_pairs = {target.id: overwrite.pair() for target, overwrite in current.items()}
+        wanted_by_id = {target.id: (target, overwrite) for target, overwrite in wanted.items()}
+
+        changed: Dict[int, Tuple[OverwriteTarget, Optional[PermissionOverwrite]]] = {
+            target_id: (target, overwrite)
+            for target_id, (target, overwrite) in wanted_by_id.items()
+            if current_pairs.get(target_id) != overwrite.pair()
+        }
+
+        for target, _ in current.items():
+            if target.id not in wanted_by_id:
+                changed[target.id] = (target, None)
+
+        return changed
+
+    @staticmethod
+    def resolve_target(channel: disnake.abc.GuildChannel, target: OverwriteTarget) -> Optional[OverwriteTarget]:
+        """
+        Get the role or member of an overwrite target, which may be a bare `Object` when it isn't cached.
+
+        :param channel: The channel of the overwrite.
+        :param target: The target of the overwrite.
+        :return: The role or member, None if it can't be resolved.
+        """
+        if isinstance(target, (Role, Member, User)):
+            return target
+
+        return channel.guild.get_role(target.id) or channel.guild.get_member(target.id)
+
+    def plan(self, channel: disnake.abc.GuildChannel, metadata: Dict[str, Any]) -> ChannelEditPlan:
+        """
+        Plan the edit bringing a channel to its wanted metadata.
+
+        :param channel: The channel to edit.
+        :param metadata: The wanted metadata, as generated by `generate_channel_metadata`.
+        :return: The plan of the edit.
+        """
+        fields = {
+            key: value for key, value in metadata.items()
+            if key != "overwrites" and getattr(channel, key) != value
+        }
+
+        overwrites: Optional[Dict[OverwriteTarget, PermissionOverwrite]] = None
+        changed_overwrites = {}
+
+        if "overwrites" in metadata:
+            current = channel.overwrites
+
+            changed_overwrites = self.diff_overwrites(current, metadata["overwrites"])
+
+            if changed_overwrites:
+                overwrites = metadata["overwrites"]
+            elif current != metadata["overwrites"]:
+                self.overwrite_rewrites_skipped += 1
+
+        if not fields and not changed_overwrites:
+            strategy = EditStrategy.NONE
+        elif not fields and len(changed_overwrites) <= self.max_permission_calls:
+            strategy = EditStrategy.SET_PERMISSIONS
+        else:
+            strategy = EditStrategy.EDIT
+
+        if strategy == EditStrategy.SET_PERMISSIONS:
+            resolved = {
+                target_id: (self.resolve_target(channel, target), overwrite)
+                for target_id, (target, overwrite) in changed_overwrites.items()
+            }
+
+            if all(target is not None for target, _ in resolved.values()):
+                changed_overwrites = resolved
+            else:
+                self.unresolved_targets += 1
+                strategy = EditStrategy.EDIT
+
+        self.plans[strategy] += 1
+
+        return ChannelEditPlan(channel, fields, overwrites, changed_overwrites, strategy)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the planner.
+
+        :return: A dictionary of the planner statistics.
+        """
+        return {
+            **{f"{strategy.value}_plans": count for strategy, count in self.plans.items()},
+            "overwrite_rewrites_skipped": self.overwrite_rewrites_skipped,
+            "unresolved_targets": self.unresolved_targets
+        }
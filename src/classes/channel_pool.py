@@ -0,0 +1,369 @@
+import asyncio
+import math
+import time
+from collections import deque
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import TYPE_CHECKING, Optional, Dict, List, Deque, Any, Union
+
+import disnake
+from disnake import HTTPException, PermissionOverwrite, Role, Member
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING
+
+from src.classes.guild_settings import GuildSettings
+from src.classes.mongo_object import MongoObject
+from src.errors import FailedToResolve
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+    from src.classes.voice_channel import VoiceChannel
+
+POOLED_CHANNEL_NAME = "🔊 語音頻道"
+
+
+class PooledChannel(MongoObject):
+    """
+    A hidden voice channel, created ahead of time and waiting to be claimed.
+    """
+    collection_name = "channel_pool"
+    indexes = [
+        IndexModel([("channel_id", ASCENDING)], unique=True),
+        IndexModel([("guild_id", ASCENDING)])
+    ]
+
+    def __init__(
+            self,
+            bot: "Krabbe",
+            database: AsyncIOMotorDatabase,
+            channel_id: int,
+            guild_id: int,
+            pooled_at: datetime
+    ):
+        super().__init__(bot, database)
+
+        self.channel_id: int = channel_id
+        self.guild_id: int = guild_id
+        self.pooled_at: datetime = pooled_at
+
+    def unique_identifier(self) -> dict:
+        return {"channel_id": self.channel_id}
+
+    def to_dict(self) -> dict:
+        return {
+            "channel_id": self.channel_id,
+            "guild_id": self.guild_id,
+            "pooled_at": self.pooled_at
+        }
+
+    @property
+    def channel(self) -> disnake.VoiceChannel:
+        channel = self.bot.get_channel(self.channel_id)
+
+        if channel:
+            return channel
+
+        raise FailedToResolve(f"Pooled channel {self.channel_id} not found.")
+
+
+class ChannelPool:
+    """
+    Keeps a few hidden voice channels per guild, so a member joining the root channel gets a channel with
+    a single edit instead of waiting for a channel to be created.
+
+    The size of the pool of a guild follows its recent demand: enough channels for the claims expected in the next
+    `horizon` seconds, judging by the claims of the last `demand_window` seconds, up to `max_size`.
+    The pools are refilled in the background, and empty channels are returned to the pool instead of being deleted.
+    The pool is disabled unless `max_size` is set, since it keeps hidden channels in the category of every guild.
+    """
+    logger = getLogger("krabbe.channel_pool")
+
+    def __init__(
+            self,
+            bot: "Krabbe",
+            database: AsyncIOMotorDatabase,
+            max_size: int = 0,
+            horizon: float = 60,
+            demand_window: float = 600,
+            refill_interval: float = 30
+    ):
+        """
+        :param bot: The bot instance.
+        :param database: The database instance.
+        :param max_size: The maximum number of pooled channels per guild. 0 to disable the pool.
+        :param horizon: The number of seconds of expected demand the pool should cover.
+        :param demand_window: The number of seconds of claims the demand is measured over.
+        :param refill_interval: The number of seconds between refills, pools are also refilled after every claim.
+        """
+        self.bot: "Krabbe" = bot
+        self.database: AsyncIOMotorDatabase = database
+        self.max_size: int = max_size
+        self.horizon: float = horizon
+        self.demand_window: float = demand_window
+        self.refill_interval: float = refill_interval
+
+        self._pools: Dict[int, List[PooledChannel]] = {}
+        self._demand: Dict[int, Deque[float]] = {}
+
+        self._refill_requested: asyncio.Event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.released: int = 0
+        self.created: int = 0
+        self.discarded: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    async def load(self) -> None:
+        """
+        Load the pooled channels from the database, discarding the ones whose channel is gone.
+        """
+        async for pooled in PooledChannel.find(self.bot, self.database):
+            try:
+                _ = pooled.channel
+            except FailedToResolve:
+                self.logger.warning(f"Pooled channel {pooled.channel_id} is gone, discarding.")
+                await self._discard(pooled)
+                continue
+
+            self._pools.setdefault(pooled.guild_id, []).append(pooled)
+
+        self.logger.info(f"Loaded {sum(len(pool) for pool in self._pools.values())} pooled channels")
+
+    def start(self) -> None:
+        """
+        Start refilling the pools in the background.
+        """
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = self.bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._refill_requested.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._refill_requested.clear()
+
+            try:
+                await self.refill()
+            except Exception as error:
+                self.logger.error(f"Failed to refill the channel pools: {error!r}")
+
+    def target_size(self, guild_id: int) -> int:
+        """
+        Get the number of channels the pool of a guild should hold, from its recent demand.
+
+        :param guild_id: The guild ID.
+        :return: The target size of the pool.
+        """
+        demand = self._demand.get(guild_id)
+
+        if demand is None:
+            return 0
+
+        while demand and demand[0] < time.monotonic() - self.demand_window:
+            demand.popleft()
+
+        return min(self.max_size, math.ceil(len(demand) / self.demand_window * self.horizon))
+
+    def size(self, guild_id: int) -> int:
+        return len(self._pools.get(guild_id, []))
+
+    def _can_rename(self, channel_id: int, name: str, current_name: str) -> bool:
+        return name == current_name or self.bot.rename_queue.delay(channel_id) == 0
+
+    async def claim(
+            self, guild_settings: GuildSettings, metadata: Dict[str, Any]
+    ) -> Optional[disnake.VoiceChannel]:
+        """
+        Claim a pooled channel of the guild and apply the metadata of the new channel to it with a single edit.
+        Channels that already used their rename budget are skipped.
+
+        :param guild_settings: The settings of the guild.
+        :param metadata: The metadata of the new channel, as generated by `generate_channel_metadata`.
+        :return: The channel, or None if no pooled channel could be claimed.
+        """
+        if not self.enabled:
+            return None
+
+        guild_id = guild_settings.guild_id
+
+        self._demand.setdefault(guild_id, deque()).append(time.monotonic())
+        self._refill_requested.set()
+
+        for pooled in list(self._pools.get(guild_id, [])):
+            try:
+                channel = pooled.channel
+            except FailedToResolve:
+                self._pools[guild_id].remove(pooled)
+                await self._discard(pooled)
+                continue
+
+            if not self._can_rename(pooled.channel_id, metadata["name"], channel.name):
+                continue
+
+            self._pools[guild_id].remove(pooled)
+
+            renamed = channel.name != metadata["name"]
+            edits = {key: value for key, value in metadata.items() if getattr(channel, key) != value}
+
+            try:
+                if edits:
+                    await channel.edit(**edits)
+            except HTTPException as error:
+                self.logger.warning(f"Failed to claim pooled channel {pooled.channel_id}: {error!r}")
+                await self._discard(pooled, delete_channel=True)
+                continue
+
+            if renamed:
+                self.bot.rename_queue.record(pooled.channel_id)
+
+            _ = self.bot.loop.create_task(pooled.delete())
+
+            self.hits += 1
+
+            return channel
+
+        self.misses += 1
+
+        return None
+
+    @staticmethod
+    def hidden_overwrites(guild_settings: GuildSettings) -> Dict[Union[Role, Member], PermissionOverwrite]:
+        """
+        Get the overwrites of a pooled channel, hidden from everyone but the bot.
+        Every target the category lets view or join its channels is denied both, along with the base role.
+        """
+        overwrites = {}
+
+        for target, overwrite in guild_settings.category_channel.overwrites.items():
+            if overwrite.view_channel or overwrite.connect:
+                overwrite = PermissionOverwrite.from_pair(*overwrite.pair())
+                overwrite.update(view_channel=False, connect=False)
+
+            overwrites[target] = overwrite
+
+        overwrites[guild_settings.base_role] = PermissionOverwrite(view_channel=False, connect=False)
+        overwrites[guild_settings.guild.me] = PermissionOverwrite(view_channel=True, connect=True, manage_channels=True)
+
+        return overwrites
+
+    async def release(self, voice_channel: "VoiceChannel") -> bool:
+        """
+        Return the channel of a removed voice channel to the pool, if the pool of its guild needs it.
+        The channel is renamed back to the pooled name, so it's only taken if its rename budget allows it.
+
+        :param voice_channel: The removed voice channel, its channel must be empty.
+        :return: Whether the channel was taken by the pool. If not, the caller should delete it.
+        """
+        guild_settings = voice_channel.guild_settings
+
+        try:
+            channel = voice_channel.channel
+        except FailedToResolve:
+            return False
+
+        if channel.members or self.size(guild_settings.guild_id) >= self.target_size(guild_settings.guild_id):
+            return False
+
+        if not self._can_rename(channel.id, POOLED_CHANNEL_NAME, channel.name):
+            return False
+
+        renamed = channel.name != POOLED_CHANNEL_NAME
+
+        try:
+            await channel.edit(
+                name=POOLED_CHANNEL_NAME, overwrites=self.hidden_overwrites(guild_settings), user_limit=0
+            )
+        except (HTTPException, FailedToResolve) as error:
+            self.logger.warning(f"Failed to return {channel.id} to the pool: {error!r}")
+            return False
+
+        if renamed:
+            self.bot.rename_queue.record(channel.id)
+
+        self.released += 1
+
+        await self._add(guild_settings, channel)
+
+        return True
+
+    async def _add(self, guild_settings: GuildSettings, channel: disnake.VoiceChannel) -> None:
+        pooled = PooledChannel(
+            bot=self.bot,
+            database=self.database,
+            channel_id=channel.id,
+            guild_id=guild_settings.guild_id,
+            pooled_at=datetime.now(timezone.utc)
+        )
+
+        self._pools.setdefault(guild_settings.guild_id, []).append(pooled)
+
+        await pooled.upsert()
+
+    async def _discard(self, pooled: PooledChannel, delete_channel: bool = False) -> None:
+        self.discarded += 1
+
+        if delete_channel:
+            try:
+                await pooled.channel.delete()
+            except (HTTPException, FailedToResolve):
+                pass
+
+        await pooled.delete()
+
+    async def refill(self) -> None:
+        """
+        Create channels for the pools below their target size, and delete the channels of the pools above it.
+        """
+        for guild_id in set(self._demand) | set(self._pools):
+            target = self.target_size(guild_id)
+
+            guild_settings = await GuildSettings.find_one(self.bot, self.database, guild_id=guild_id)
+
+            if guild_settings is None or guild_settings.guild is None:
+                continue
+
+            while self.size(guild_id) > target and self._pools.get(guild_id):
+                await self._discard(self._pools[guild_id].pop(), delete_channel=True)
+
+            while self.size(guild_id) < target:
+                try:
+                    channel = await guild_settings.category_channel.create_voice_channel(
+                        POOLED_CHANNEL_NAME, overwrites=self.hidden_overwrites(guild_settings)
+                    )
+                except (HTTPException, FailedToResolve) as error:
+                    self.logger.warning(f"Failed to create a pooled channel in {guild_id}: {error!r}")
+                    break
+
+                self.created += 1
+
+                await self._add(guild_settings, channel)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the pool.
+
+        :return: A dictionary of the pool statistics.
+        """
+        return {
+            "pooled": sum(len(pool) for pool in self._pools.values()),
+            "guilds": len(self._pools),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / (self.hits + self.misses), 3) if self.hits + self.misses else 0.0,
+            "released": self.released,
+            "created": self.created,
+            "discarded": self.discarded
+        }
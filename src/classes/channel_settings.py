@@ -1,9 +1,12 @@
-from typing import Optional, TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING, Dict, Iterable, List, FrozenSet
 
 import disnake
 from disnake import Embed
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, WriteConcern
+from pymongo.results import UpdateResult, DeleteResult
 
+from src.cache import LRUCache
 from src.classes.mongo_object import MongoObject
 from src.errors import FailedToResolve
 
@@ -13,6 +16,19 @@ if TYPE_CHECKING:
 
 class ChannelSettings(MongoObject):
     collection_name = "channel_settings"
+    indexes = [
+        IndexModel([("user_id", ASCENDING)], unique=True)
+    ]
+    # Settings change often and are cosmetic, the primary's acknowledgement is enough
+    write_concerns = {
+        "upsert": WriteConcern(w=1)
+    }
+    # Most settings are never changed from their defaults, so unset fields are not stored.
+    # Version 1 documents, without a schema_version field, store every field including nulls.
+    sparse = True
+    schema_version = 2
+
+    _cache: LRUCache[int, "ChannelSettings"] = LRUCache(max_size=10000, ttl=1800)
 
     def __init__(
             self,
@@ -79,6 +95,26 @@ class ChannelSettings(MongoObject):
             "volume": self.volume
         }
 
+    async def upsert(self) -> Optional[UpdateResult]:
+        """
+        Updates or inserts a document in the collection, and writes this object through to the cache.
+
+        :return: The UpdateResult of the update operation. None if nothing changed or the write was journaled.
+        """
+        self._cache.put(self.user_id, self)
+
+        return await super().upsert()
+
+    async def delete(self) -> Optional[DeleteResult]:
+        """
+        Deletes this document from the collection, and removes this object from the cache.
+
+        :return: The DeleteResult of the delete operation. None if the delete was journaled.
+        """
+        self._cache.invalidate(self.user_id)
+
+        return await super().delete()
+
     @property
     def user(self) -> disnake.User:
         """
@@ -132,12 +168,137 @@ class ChannelSettings(MongoObject):
     async def get_settings(cls, bot: "Krabbe", database: AsyncIOMotorDatabase, user_id: int) -> "ChannelSettings":
         """
         Gets the settings for the specified user. A default ChannelSettings object is created if the user has no settings stored.
+        Settings are served from the cache when possible.
         :param bot: The bot instance.
         :param database: The database instance.
         :param user_id: The user ID.
         :return: The ChannelSettings object.
         """
-        if settings := await cls.find_one(bot, database, user_id=user_id):
-            return settings
+        if cached := cls._cache.get(user_id):
+            return cached
+
+        if not (settings := await cls.find_one(bot, database, user_id=user_id)):
+            settings = cls(bot, database, user_id=user_id)
+
+        cls._cache.put(user_id, settings)
+
+        return settings
+
+    @classmethod
+    async def get_many_settings(
+            cls, bot: "Krabbe", database: AsyncIOMotorDatabase, user_ids: Iterable[int]
+    ) -> Dict[int, "ChannelSettings"]:
+        """
+        Gets the settings for all the specified users, querying the database once for every user not in the cache.
+        :param bot: The bot instance.
+        :param database: The database instance.
+        :param user_ids: The user IDs.
+        :return: A dictionary mapping user IDs to their ChannelSettings objects.
+        """
+        settings: Dict[int, "ChannelSettings"] = {}
+        missing = []
+
+        for user_id in set(user_ids):
+            if cached := cls._cache.get(user_id):
+                settings[user_id] = cached
+            else:
+                missing.append(user_id)
+
+        if missing:
+            async for channel_settings in cls.find(bot, database, user_id={"$in": missing}):
+                settings[channel_settings.user_id] = channel_settings
+
+        for user_id in missing:
+            if user_id not in settings:
+                settings[user_id] = cls(bot, database, user_id=user_id)
+
+            cls._cache.put(user_id, settings[user_id])
+
+        return settings
+
+    @classmethod
+    def configure_cache(cls, max_size: int, ttl: Optional[float]) -> None:
+        """
+        Replace the settings cache with a new one of the specified size and time-to-live.
+        :param max_size: The maximum number of settings kept in memory.
+        :param ttl: The number of seconds a cached settings object stays valid.
+        """
+        cls._cache = LRUCache(max_size=max_size, ttl=ttl)
+
+    @classmethod
+    def get_from_cache(cls, user_id: int) -> Optional["ChannelSettings"]:
+        """
+        Get the cached settings of the user without affecting the cache statistics.
+        :param user_id: The user ID.
+        :return: The cached ChannelSettings object if any.
+        """
+        return cls._cache.peek(user_id)
+
+    @classmethod
+    def cached_user_ids(cls) -> List[int]:
+        """
+        Get the IDs of every user whose settings are cached.
+        :return: The list of user IDs.
+        """
+        return cls._cache.keys()
+
+    @classmethod
+    def invalidate_cache(cls, user_id: Optional[int] = None) -> None:
+        """
+        Remove the settings of the user from the cache.
+        :param user_id: The user ID. None to clear the whole cache.
+        """
+        if user_id is None:
+            cls._cache.clear()
+        else:
+            cls._cache.invalidate(user_id)
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """
+        Get the statistics of the settings cache.
+        :return: A dictionary of the cache statistics.
+        """
+        return cls._cache.stats()
+
+    @classmethod
+    async def migrate_to_sparse(cls, database: AsyncIOMotorDatabase, documents: List[Dict]) -> int:
+        """
+        Rewrite version 1 documents in the sparse format.
+        Documents with the same null fields are rewritten by a single update.
+        A field is only unset if it's still null, so settings changed in the meantime are never lost,
+        the documents changed in the meantime are left for the next pass instead.
+
+        :param database: The database instance.
+        :param documents: The version 1 documents to rewrite.
+        :return: The number of documents rewritten.
+        """
+        collection = database.get_collection(cls.collection_name)
+        fields = [key for key in cls(None, database, user_id=0).to_dict() if key != "user_id"]
+
+        groups: Dict[FrozenSet[str], List] = {}
+
+        for document in documents:
+            null_fields = frozenset(key for key in fields if key in document and document[key] is None)
+            groups.setdefault(null_fields, []).append(document["_id"])
+
+        migrated = 0
+
+        for null_fields, ids in groups.items():
+            update = {"$set": {"schema_version": cls.schema_version}}
+
+            if null_fields:
+                update["$unset"] = {key: "" for key in null_fields}
+
+            result = await collection.update_many(
+                {
+                    "_id": {"$in": ids},
+                    "schema_version": {"$exists": False},
+                    **{key: None for key in null_fields}
+                },
+                update
+            )
+
+            migrated += result.modified_count
 
-        return cls(bot, database, user_id=user_id)
+        return migrated
@@ -1,12 +1,14 @@
 from logging import getLogger
-from typing import Optional, TYPE_CHECKING, Dict, AsyncIterator
+from typing import Optional, TYPE_CHECKING, Dict, AsyncIterator, List, Any
 
 from disnake import Guild, CategoryChannel, VoiceChannel, Role, Webhook, ForumChannel, Message, Thread, AllowedMentions, \
-    Embed, Color
+    Embed, Color, NotFound
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING
 from pymongo.results import UpdateResult, DeleteResult
 
 from src.classes.mongo_object import MongoObject
+from src.classes.outbound_queue import Priority
 from src.errors import FailedToResolve
 
 if TYPE_CHECKING:
@@ -16,6 +18,10 @@ if TYPE_CHECKING:
 
 class GuildSettings(MongoObject):
     collection_name = "guild_settings"
+    indexes = [
+        IndexModel([("guild_id", ASCENDING)], unique=True),
+        IndexModel([("root_channel_id", ASCENDING)])
+    ]
     __logger = getLogger("krabbe.mongo")
 
     _caches: Dict[int, "GuildSettings"] = {}
@@ -34,7 +40,9 @@ class GuildSettings(MongoObject):
             message_logging_channel_id: int,
             message_logging_webhook_url: str,
             allow_nsfw: bool,
-            lock_message_dm: bool
+            lock_message_dm: bool,
+            message_logging_webhook_pool_urls: Optional[List[str]] = None,
+            batch_message_logging: bool = False
     ):
         super().__init__(bot, database)
 
@@ -49,9 +57,12 @@ class GuildSettings(MongoObject):
 
         self.message_logging_channel_id: int = message_logging_channel_id
         self.message_logging_webhook_url: str = message_logging_webhook_url
+        # Extra webhooks of the message logging channel, mirrored messages are spread across them
+        self.message_logging_webhook_pool_urls: List[str] = message_logging_webhook_pool_urls or []
 
         self.allow_nsfw: bool = allow_nsfw
         self.lock_message_dm: bool = lock_message_dm
+        self.batch_message_logging: bool = batch_message_logging
 
         self._guild: Optional[Guild] = None
         self._category_channel: Optional[CategoryChannel] = None
@@ -59,7 +70,8 @@ class GuildSettings(MongoObject):
         self._base_role: Optional[Role] = None
         self._event_logging_channel: Optional[ForumChannel] = None
         self._message_logging_channel: Optional[VoiceChannel] = None
-        self._message_logging_webhook: Optional[Webhook] = None
+        self._message_logging_webhooks: Dict[str, Webhook] = {}
+        self._message_logging_webhook_index: int = 0
 
     def unique_identifier(self) -> dict:
         return {"guild_id": self.guild_id}
@@ -76,7 +88,9 @@ class GuildSettings(MongoObject):
             "message_logging_channel_id": self.message_logging_channel_id,
             "message_logging_webhook_url": self.message_logging_webhook_url,
             "allow_nsfw": self.allow_nsfw,
-            "lock_message_dm": self.lock_message_dm
+            "lock_message_dm": self.lock_message_dm,
+            "message_logging_webhook_pool_urls": self.message_logging_webhook_pool_urls,
+            "batch_message_logging": self.batch_message_logging
         }
 
     @property
@@ -141,16 +155,86 @@ class GuildSettings(MongoObject):
 
         raise FailedToResolve(f"Failed to resolve logging channel {self.message_logging_channel_id}")
 
+    def _get_webhook(self, url: str) -> Webhook:
+        """
+        Get the webhook of a URL, only building it the first time the URL is seen.
+
+        :param url: The webhook URL.
+        :raise FailedToResolve: If the URL is not a valid webhook URL.
+        :return: The webhook.
+        """
+        if url not in self._message_logging_webhooks:
+            try:
+                self._message_logging_webhooks[url] = Webhook.from_url(url, session=self.bot.webhooks_client_session)
+            except ValueError:
+                raise FailedToResolve(f"Failed to resolve logging webhook {url}")
+
+        return self._message_logging_webhooks[url]
+
     @property
     def message_logging_webhook(self) -> Webhook:
-        try:
-            self._message_logging_webhook = Webhook.from_url(
-                self.message_logging_webhook_url, session=self.bot.webhooks_client_session
-            )
-        except ValueError:
-            raise FailedToResolve(f"Failed to resolve logging webhook {self.message_logging_webhook_url}")
+        return self._get_webhook(self.message_logging_webhook_url)
+
+    @property
+    def message_logging_webhooks(self) -> List[Webhook]:
+        urls = [self.message_logging_webhook_url, *self.message_logging_webhook_pool_urls]
+
+        # Drop the webhooks of URLs that were replaced
+        for url in list(self._message_logging_webhooks):
+            if url not in urls:
+                del self._message_logging_webhooks[url]
+
+        return [self._get_webhook(url) for url in urls]
+
+    async def retire_message_logging_webhook(self, webhook: Webhook) -> None:
+        """
+        Remove a deleted webhook from the message logging webhooks. A deleted main webhook is replaced by a pool webhook.
+
+        :param webhook: The deleted webhook.
+        :raise FailedToResolve: If it was the last message logging webhook.
+        """
+        url = next((url for url, cached in self._message_logging_webhooks.items() if cached is webhook), None)
 
-        return self._message_logging_webhook
+        if url is None:
+            return
+
+        self.__logger.warning(f"Retiring deleted message logging webhook {webhook.id} of guild {self.guild_id}")
+
+        del self._message_logging_webhooks[url]
+
+        pool_urls = self.message_logging_webhook_pool_urls
+
+        # The lists are replaced rather than changed in place, like every field of a MongoObject
+        if url in pool_urls:
+            self.message_logging_webhook_pool_urls = [pool_url for pool_url in pool_urls if pool_url != url]
+
+        elif url == self.message_logging_webhook_url:
+            if not pool_urls:
+                raise FailedToResolve(f"Every message logging webhook of guild {self.guild_id} was deleted")
+
+            self.message_logging_webhook_url = pool_urls[0]
+            self.message_logging_webhook_pool_urls = pool_urls[1:]
+
+        await self.upsert()
+
+    async def send_message_log(self, **kwargs: Any) -> Optional[Message]:
+        """
+        Send a mirrored message through the message logging webhooks, in turns.
+        Webhooks deleted from Discord are retired and the message is sent through the next one.
+
+        :param kwargs: The arguments of `Webhook.send`.
+        :raise FailedToResolve: If every message logging webhook was deleted.
+        :return: The sent message, if `wait` is set.
+        """
+        while True:
+            webhooks = self.message_logging_webhooks
+            webhook = webhooks[self._message_logging_webhook_index % len(webhooks)]
+            self._message_logging_webhook_index += 1
+
+            try:
+                return await webhook.send(**kwargs)
+            except NotFound:
+                await self.retire_message_logging_webhook(webhook)
 
     @property
     def event_logging_channel(self) -> Optional[ForumChannel]:
@@ -212,6 +296,7 @@ class GuildSettings(MongoObject):
         embed.add_field(name="💬 訊息紀錄頻道", value=self.message_logging_channel.mention)
         embed.add_field(name="🔞 NSFW 允許", value="是" if self.allow_nsfw else "否")
         embed.add_field(name="🔒 鎖定訊息 DM", value="是" if self.lock_message_dm else "否")
+        embed.add_field(name="📦 批次訊息紀錄", value="是" if self.batch_message_logging else "否")
 
         return embed
 
@@ -228,13 +313,22 @@ class GuildSettings(MongoObject):
         """
         log_string = f"{prefix} | 語音頻道：【**{channel.channel.name}**】 | {message}"
 
-        if wait:
-            return await self.settings_event_logging_thread.send(log_string, allowed_mentions=AllowedMentions.none())
+        if not wait and self.bot.log_aggregator is not None:
+            self.bot.log_aggregator.add(
+                self.settings_event_logging_thread_id, lambda: self.settings_event_logging_thread, log_string
+            )
+            return None
 
-        _ = self.bot.loop.create_task(
-            self.settings_event_logging_thread.send(log_string, allowed_mentions=AllowedMentions.none())
+        future = self.bot.outbound.put(
+            self.settings_event_logging_thread_id,
+            Priority.AUDIT_LOG,
+            lambda: self.settings_event_logging_thread.send(log_string, allowed_mentions=AllowedMentions.none()),
+            wait=wait
         )
 
+        if wait:
+            return await future
+
         return None
 
     async def log_voice_event(
@@ -250,50 +344,43 @@ class GuildSettings(MongoObject):
         """
         log_string = f"{prefix} | 語音頻道：【**{channel.channel.name}**】 | {message}"
 
-        if wait:
-            return await self.voice_event_logging_thread.send(log_string, allowed_mentions=AllowedMentions.none())
+        if not wait and self.bot.log_aggregator is not None:
+            self.bot.log_aggregator.add(
+                self.voice_event_logging_thread_id, lambda: self.voice_event_logging_thread, log_string
+            )
+            return None
 
-        _ = self.bot.loop.create_task(
-            self.voice_event_logging_thread.send(log_string, allowed_mentions=AllowedMentions.none())
+        future = self.bot.outbound.put(
+            self.voice_event_logging_thread_id,
+            Priority.AUDIT_LOG,
+            lambda: self.voice_event_logging_thread.send(log_string, allowed_mentions=AllowedMentions.none()),
+            wait=wait
         )
 
+        if wait:
+            return await future
+
         return None
 
-    async def upsert(self) -> UpdateResult:
+    async def upsert(self) -> Optional[UpdateResult]:
         """
-        Updates or inserts a document in the collection.
+        Updates or inserts a document in the collection, and caches this object.
 
-        :return: The UpdateResult of the update operation.
+        :return: The UpdateResult of the update operation. None if nothing changed or the write was journaled.
         """
-        self.__logger.info(
-            f"Upserting {self.__class__.collection_name} document: {self.to_dict()}"
-        )
-
-        data = self.to_dict()
-
         self._caches[self.guild_id] = self
 
-        return await self.database.get_collection(self.__class__.collection_name).update_one(
-            self.unique_identifier(),
-            {"$set": data},
-            upsert=True
-        )
+        return await super().upsert()
 
-    async def delete(self) -> DeleteResult:
+    async def delete(self) -> Optional[DeleteResult]:
         """
-        Deletes this document from the collection.
+        Deletes this document from the collection, and removes this object from the cache.
 
-        :return: The DeleteResult of the delete operation.
+        :return: The DeleteResult of the delete operation. None if the delete was journaled.
         """
-        self.__logger.info(
-            f"Deleting {self.__class__.collection_name} document: {self.unique_identifier()}"
-        )
-
-        del self._caches[self.guild_id]
+        self._caches.pop(self.guild_id, None)
 
-        return await self.database.get_collection(self.__class__.collection_name).delete_one(
-            self.unique_identifier()
-        )
+        return await super().delete()
 
     @classmethod
     def get_from_cache(cls, **kwargs) -> Optional["GuildSettings"]:
@@ -317,16 +404,40 @@ class GuildSettings(MongoObject):
 
         return cached
 
+    @classmethod
+    def cached_guild_ids(cls) -> List[int]:
+        """
+        Get the IDs of every guild whose settings are cached.
+
+        :return: The list of guild IDs.
+        """
+        return list(cls._caches.keys())
+
+    @classmethod
+    def invalidate_cache(cls, guild_id: Optional[int] = None) -> None:
+        """
+        Remove the settings of the guild from the cache.
+
+        :param guild_id: The guild ID. None to clear the whole cache.
+        """
+        if guild_id is None:
+            cls._caches.clear()
+        else:
+            cls._caches.pop(guild_id, None)
+
     @classmethod
     async def find_one(cls, bot: "Krabbe", database: AsyncIOMotorDatabase, **kwargs) -> Optional["GuildSettings"]:
         """
         Find a document in the collection that matches the specified query.
         """
         cls.__logger.info(f"Finding one {cls.collection_name} document: {kwargs}")
+        cls.check_indexed(kwargs)
 
         if cached := cls.get_from_cache(**kwargs):
             return cached
 
+        await cls.settle_journal()
+
         document = await database.get_collection(cls.collection_name).find_one(kwargs)
 
         if not document:
@@ -336,24 +447,35 @@ class GuildSettings(MongoObject):
         del document["_id"]
 
         guild_settings = cls(bot=bot, database=database, **document)
+        guild_settings.mark_clean()
 
         cls._caches[guild_settings.guild_id] = guild_settings
 
         return guild_settings
 
     @classmethod
-    async def find(cls, bot: "Krabbe", database: AsyncIOMotorDatabase, **kwargs) -> AsyncIterator["GuildSettings"]:
+    async def find(
+            cls, bot: "Krabbe", database: AsyncIOMotorDatabase, batch_size: Optional[int] = None,
+            **kwargs
+    ) -> AsyncIterator["GuildSettings"]:
         """
         Find all documents in the collection that match the specified query.
         """
         cls.__logger.info(f"Finding {cls.collection_name} documents: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
 
         cursor = database.get_collection(cls.collection_name).find(kwargs)
 
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+
         async for document in cursor:
             del document["_id"]
 
             guild_settings = cls(bot=bot, database=database, **document)
+            guild_settings.mark_clean()
 
             cls._caches[guild_settings.guild_id] = guild_settings
 
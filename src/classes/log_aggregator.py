@@ -0,0 +1,136 @@
+import asyncio
+from logging import getLogger
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from disnake import AllowedMentions, Thread
+
+from src.classes.outbound_queue import Priority
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+
+MESSAGE_LIMIT = 2000
+
+
+def pack_lines(lines: List[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Join lines into as few messages as possible, each under the character limit. Lines too long are truncated.
+
+    :param lines: The lines to join.
+    :param limit: The maximum length of a message.
+    :return: The messages.
+    """
+    messages: List[str] = []
+    current = ""
+
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + "…"
+
+        if current and len(current) + 1 + len(line) > limit:
+            messages.append(current)
+            current = ""
+
+        current = f"{current}\n{line}" if current else line
+
+    if current:
+        messages.append(current)
+
+    return messages
+
+
+class LogAggregator:
+    """
+    Buffers the event log lines of every logging thread, and sends them every `flush_interval` seconds
+    as a few messages instead of one message per line.
+    A busy guild produces far more events than a thread accepts messages, so sending them one by one falls behind.
+    """
+    logger = getLogger("krabbe.log_aggregator")
+
+    def __init__(self, bot: "Krabbe", flush_interval: float = 3):
+        """
+        :param bot: The bot instance.
+        :param flush_interval: The number of seconds between flushes.
+        """
+        self.bot: "Krabbe" = bot
+        self.flush_interval: float = flush_interval
+
+        self._buffers: Dict[int, Tuple[Callable[[], Thread], List[str]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.lines: int = 0
+        self.messages: int = 0
+
+    def add(self, thread_id: int, resolve_thread: Callable[[], Thread], line: str) -> None:
+        """
+        Buffer a log line for a thread.
+
+        :param thread_id: The ID of the logging thread.
+        :param resolve_thread: A callable returning the thread, called when the lines are sent.
+        :param line: The log line.
+        :return: None
+        """
+        self._buffers.setdefault(thread_id, (resolve_thread, []))[1].append(line)
+
+    def start(self) -> None:
+        """
+        Start flushing the buffered lines periodically.
+        """
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop flushing periodically, then send the remaining lines and wait for them to be sent.
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        await asyncio.gather(*self.flush(), return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            self.flush()
+
+    def flush(self) -> List[asyncio.Future]:
+        """
+        Queue the buffered lines of every thread on the outbound queue.
+
+        :return: The futures of the queued messages.
+        """
+        buffers, self._buffers = self._buffers, {}
+        futures = []
+
+        for thread_id, (resolve_thread, lines) in buffers.items():
+            self.lines += len(lines)
+
+            for content in pack_lines(lines):
+                futures.append(
+                    self.bot.outbound.put(
+                        thread_id,
+                        Priority.AUDIT_LOG,
+                        lambda content=content, resolve_thread=resolve_thread: resolve_thread().send(
+                            content, allowed_mentions=AllowedMentions.none()
+                        )
+                    )
+                )
+
+                self.messages += 1
+
+        return futures
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the statistics of the aggregator.
+
+        :return: A dictionary of the aggregator statistics.
+        """
+        return {
+            "buffered": sum(len(lines) for _, lines in self._buffers.values()),
+            "lines": self.lines,
+            "messages": self.messages,
+            "compression_ratio": round(self.lines / self.messages, 2) if self.messages else 0.0
+        }
@@ -0,0 +1,135 @@
+import asyncio
+from logging import getLogger
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from disnake import Embed, Object, AllowedMentions
+
+from src.classes.outbound_queue import Priority
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+    from src.classes.guild_settings import GuildSettings
+
+MAX_EMBEDS = 10
+MAX_EMBED_CHARACTERS = 6000
+
+
+class MessageMirror:
+    """
+    Mirrors the messages of voice channels to their logging threads in batches.
+
+    The messages of a logging thread are buffered for `window` seconds after the first one, then sent as embeds
+    in as few webhook calls as possible, up to 10 embeds and 6000 characters per call.
+    Batches go through the outbound queue with the thread as destination, so they're sent in order.
+    A batch carries up to 10 messages, so batches are queued above the sheddable audit logs and never dropped.
+    """
+    logger = getLogger("krabbe.message_mirror")
+
+    def __init__(self, bot: "Krabbe", window: float = 2):
+        """
+        :param bot: The bot instance.
+        :param window: The number of seconds messages are buffered before being sent.
+        """
+        self.bot: "Krabbe" = bot
+        self.window: float = window
+
+        self._buffers: Dict[int, Tuple["GuildSettings", List[Embed]]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._pending: List[asyncio.Future] = []
+
+        self.messages: int = 0
+        self.calls: int = 0
+
+    def add(self, guild_settings: "GuildSettings", thread_id: int, embeds: List[Embed]) -> None:
+        """
+        Buffer the embeds of a mirrored message. The embeds of a message are always sent in the same call.
+
+        :param guild_settings: The settings of the guild, whose webhooks send the message.
+        :param thread_id: The ID of the logging thread.
+        :param embeds: The embeds of the message, the first one carrying the author and the content.
+        :return: None
+        """
+        embeds = self._fit(embeds)
+
+        if thread_id in self._buffers:
+            buffered = self._buffers[thread_id][1]
+
+            if len(buffered) + len(embeds) > MAX_EMBEDS or \
+                    sum(len(embed) for embed in buffered + embeds) > MAX_EMBED_CHARACTERS:
+                self.flush(thread_id)
+
+        if thread_id not in self._buffers:
+            self._buffers[thread_id] = (guild_settings, [])
+            self._timers[thread_id] = self.bot.loop.call_later(self.window, self.flush, thread_id)
+
+        self._buffers[thread_id][1].extend(embeds)
+        self.messages += 1
+
+    @staticmethod
+    def _fit(embeds: List[Embed]) -> List[Embed]:
+        """
+        Drop the trailing embeds of a message that don't fit in a single webhook call.
+        """
+        fitted: List[Embed] = []
+        characters = 0
+
+        for embed in embeds[:MAX_EMBEDS]:
+            if fitted and characters + len(embed) > MAX_EMBED_CHARACTERS:
+                break
+
+            fitted.append(embed)
+            characters += len(embed)
+
+        return fitted
+
+    def flush(self, thread_id: int) -> None:
+        """
+        Queue the buffered embeds of a logging thread on the outbound queue.
+
+        :param thread_id: The ID of the logging thread.
+        :return: None
+        """
+        if timer := self._timers.pop(thread_id, None):
+            timer.cancel()
+
+        if thread_id not in self._buffers:
+            return
+
+        guild_settings, embeds = self._buffers.pop(thread_id)
+
+        future = self.bot.outbound.put(
+            thread_id,
+            Priority.NOTIFICATION,
+            lambda: guild_settings.send_message_log(
+                thread=Object(thread_id),
+                embeds=embeds,
+                wait=False,
+                allowed_mentions=AllowedMentions.none()
+            )
+        )
+        self.calls += 1
+
+        self._pending.append(future)
+        future.add_done_callback(self._pending.remove)
+
+    async def close(self) -> None:
+        """
+        Send every buffered message and wait for them to be sent.
+        """
+        for thread_id in list(self._buffers):
+            self.flush(thread_id)
+
+        await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the statistics of the mirror.
+
+        :return: A dictionary of the mirror statistics.
+        """
+        return {
+            "buffered_threads": len(self._buffers),
+            "messages": self.messages,
+            "calls": self.calls,
+            "messages_per_call": round(self.messages / self.calls, 2) if self.calls else 0.0
+        }
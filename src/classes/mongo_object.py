@@ -1,24 +1,107 @@
+import asyncio
 from abc import ABC, abstractmethod
+from copy import deepcopy
 from logging import getLogger, Logger
-from typing import Generic, TypeVar, Type, Optional, AsyncIterator, TYPE_CHECKING, Dict
+from typing import Generic, TypeVar, Type, Optional, AsyncIterator, TYPE_CHECKING, Dict, List, Set, FrozenSet, Tuple, \
+    Any, Iterator, Mapping, Iterable
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, WriteConcern
+from pymongo.errors import OperationFailure
 from pymongo.results import UpdateResult, DeleteResult
 
 if TYPE_CHECKING:
     from src.bot import Krabbe
+    from src.storage.journal import WriteAheadJournal
 
 T = TypeVar("T", bound="MongoObject")
 
 
+class DocumentView(Mapping[str, Any], Generic[T]):
+    """
+    A read-only, partially loaded document of a MongoObject collection.
+    Fields are accessible as attributes or items, only the projected fields are loaded.
+    """
+    __slots__ = ("model", "_document")
+
+    def __init__(self, model: Type[T], document: Dict[str, Any]):
+        object.__setattr__(self, "model", model)
+        object.__setattr__(self, "_document", document)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._document[name]
+        except KeyError:
+            raise AttributeError(f"Field {name} of {self.model.__name__} is not loaded in this view")
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.model.__name__} views are read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        return self._document[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._document)
+
+    def __len__(self) -> int:
+        return len(self._document)
+
+    def __repr__(self) -> str:
+        return f"<{self.model.__name__}View {self._document}>"
+
+
+def build_projection(fields: Optional[Iterable[str]]) -> Optional[Dict[str, int]]:
+    """
+    Build a MongoDB projection including only the specified fields.
+    The _id field is excluded unless it's explicitly requested.
+
+    :param fields: The fields to include. None for every field.
+    :return: The projection, or None if every field should be included.
+    """
+    if fields is None:
+        return None
+
+    projection = {field: 1 for field in fields}
+
+    if "_id" not in projection:
+        projection["_id"] = 0
+
+    return projection
+
+
 class MongoObject(ABC, Generic[T]):
     collection_name: str
     __logger: Logger = getLogger("krabbe.mongo")
 
+    indexes: List[IndexModel] = []
+    """The indexes of the collection, created by `ensure_indexes`. Subclasses should override this."""
+
+    write_concerns: Dict[str, WriteConcern] = {}
+    """
+    The write concerns of the `upsert` and `delete` operations, keyed by operation name.
+    Operations not listed use the default write concern of the client. Subclasses should override this.
+    """
+
+    sparse: bool = False
+    """Whether fields set to None are left out of the stored documents instead of being stored as null."""
+
+    schema_version: Optional[int] = None
+    """The version of the document format, stored in new documents. None to not store a version."""
+
+    journal: Optional["WriteAheadJournal"] = None
+    """The write-ahead journal upserts and deletes go through, if any. Set with `configure_journal`."""
+
+    journal_read_timeout: float = 5
+    """The number of seconds reads wait for the pending journal entries of their collection to be applied."""
+
+    _reported_unindexed_queries: Set[Tuple[str, FrozenSet[str]]] = set()
+
     def __init__(self, bot: "Krabbe", database: AsyncIOMotorDatabase):
         self.bot: "Krabbe" = bot
         self.database: AsyncIOMotorDatabase = database
 
+        self._persisted: Dict = {}
+
     @abstractmethod
     def unique_identifier(self) -> Dict:
         """
@@ -37,65 +120,365 @@ class MongoObject(ABC, Generic[T]):
         """
         raise NotImplementedError
 
-    async def upsert(self) -> UpdateResult:
+    def mark_clean(self) -> None:
         """
-        Updates or inserts a document in the collection.
+        Marks the current state of this object as the state stored in the database.
+        Should be called after the object is loaded from or flushed to the database.
+        The state is deep copied, so in-place changes to list and dict fields are still seen as changes.
+        """
+        self._persisted = deepcopy(self.to_dict())
+
+    def is_persisted(self) -> bool:
+        """
+        Check if this object has been loaded from or flushed to the database.
 
-        :return: The UpdateResult of the update operation.
+        :return: Whether the object is known to be stored.
         """
+        return bool(self._persisted)
+
+    def dirty_fields(self) -> Dict:
+        """
+        Returns the fields that changed since the object was last loaded or flushed.
+
+        :return: A dictionary of the changed fields and their new values.
+        """
+        return {
+            key: value for key, value in self.to_dict().items()
+            if key not in self._persisted or self._persisted[key] != value
+        }
+
+    def refresh_from_document(self, document: Dict) -> None:
+        """
+        Update this object with a version of its document stored by someone else, like another process.
+        Fields changed locally but not flushed yet are kept.
+
+        :param document: The stored document.
+        """
+        current = self.to_dict()
+        dirty = self.dirty_fields()
+
+        if self.sparse:  # Fields missing from a sparse document are None
+            document = {**{key: None for key in current}, **document}
+
+        for key, value in document.items():
+            if key not in current or key in dirty:
+                continue
+
+            setattr(self, key, value)
+            self._persisted[key] = deepcopy(value)
+
+    def build_update(self, data: Dict) -> Dict:
+        """
+        Build the update document writing the specified fields.
+        Fields set to None are unset in sparse documents, and the schema version is stored in new documents.
+
+        The other fields are only written if the document is inserted, so a document deleted since it was loaded
+        is recreated whole rather than with only the changed fields.
+
+        :param data: The fields to write.
+        :return: The update document.
+        """
+        if not self.sparse:
+            update = {"$set": data}
+        else:
+            update = {}
+
+            if values := {key: value for key, value in data.items() if value is not None}:
+                update["$set"] = values
+
+            if unset := {key: "" for key, value in data.items() if value is None}:
+                update["$unset"] = unset
+
+        identifier = self.unique_identifier()
+
+        on_insert = {
+            key: value for key, value in self.to_dict().items()
+            if key not in data and key not in identifier and not (self.sparse and value is None)
+        }
+
+        if self.schema_version is not None:
+            on_insert["schema_version"] = self.schema_version
+
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+
+        return update
+
+    async def upsert(self) -> Optional[UpdateResult]:
+        """
+        Updates or inserts a document in the collection. Only the fields changed since the last load or flush are sent.
+        If a write-ahead journal is configured, this returns as soon as the write is journaled.
+
+        :return: The UpdateResult of the update operation. None if nothing changed or the write was journaled.
+        """
+        data = self.dirty_fields()
+
+        if not data:
+            self.__logger.debug(
+                f"Skipping upsert of {self.__class__.collection_name} document {self.unique_identifier()}, nothing changed"
+            )
+            return None
+
         self.__logger.info(
-            f"Upserting {self.__class__.collection_name} document: {self.to_dict()}"
+            f"Upserting {self.__class__.collection_name} document {self.unique_identifier()}: {data}"
         )
 
-        data = self.to_dict()
+        if MongoObject.journal is not None:
+            await MongoObject.journal.append(
+                self.__class__.collection_name,
+                "upsert",
+                self.unique_identifier(),
+                self.build_update(data),
+                write_concern=self.write_concerns.get("upsert")
+            )
+
+            self._persisted.update(deepcopy(data))
 
-        return await self.database.get_collection(self.__class__.collection_name).update_one(
+            return None
+
+        result = await self.get_collection(self.database, "upsert").update_one(
             self.unique_identifier(),
-            {"$set": data},
+            self.build_update(data),
             upsert=True
         )
 
-    async def delete(self) -> DeleteResult:
+        self._persisted.update(deepcopy(data))
+
+        return result
+
+    async def delete(self) -> Optional[DeleteResult]:
         """
         Deletes this document from the collection.
+        If a write-ahead journal is configured, this returns as soon as the delete is journaled.
 
-        :return: The DeleteResult of the delete operation.
+        :return: The DeleteResult of the delete operation. None if the delete was journaled.
         """
         self.__logger.info(
             f"Deleting {self.__class__.collection_name} document: {self.unique_identifier()}"
         )
 
-        return await self.database.get_collection(self.__class__.collection_name).delete_one(
+        self._persisted = {}
+
+        if MongoObject.journal is not None:
+            await MongoObject.journal.append(
+                self.__class__.collection_name,
+                "delete",
+                self.unique_identifier(),
+                write_concern=self.write_concerns.get("delete")
+            )
+
+            return None
+
+        return await self.get_collection(self.database, "delete").delete_one(
             self.unique_identifier()
         )
 
+    @staticmethod
+    def configure_journal(journal: Optional["WriteAheadJournal"]) -> None:
+        """
+        Make the upserts and deletes of every MongoObject go through a write-ahead journal.
+
+        :param journal: The opened journal. None to write to the database directly.
+        """
+        MongoObject.journal = journal
+
+    @classmethod
+    async def settle_journal(cls) -> None:
+        """
+        Wait for the journaled writes of the collection to be applied, so reads see them.
+        If they aren't applied within `journal_read_timeout` seconds, the stored documents are read anyway.
+        """
+        journal = MongoObject.journal
+
+        if journal is None or not journal.pending(cls.collection_name):
+            return
+
+        try:
+            await asyncio.wait_for(journal.join(), cls.journal_read_timeout)
+        except asyncio.TimeoutError:
+            cls.__logger.warning(
+                f"Reading {cls.collection_name} with {journal.pending(cls.collection_name)} journal entries not applied"
+            )
+
+    @classmethod
+    def get_collection(cls, database: AsyncIOMotorDatabase, operation: Optional[str] = None):
+        """
+        Get the collection of this class, with the write concern declared for the operation if any.
+
+        :param database: The database instance.
+        :param operation: The name of the operation about to be run, like `upsert` or `delete`.
+        :return: The collection.
+        """
+        if (write_concern := cls.write_concerns.get(operation)) is None:
+            return database.get_collection(cls.collection_name)
+
+        return database.get_collection(cls.collection_name, write_concern=write_concern)
+
+    @classmethod
+    async def ensure_indexes(cls, database: AsyncIOMotorDatabase) -> None:
+        """
+        Create the declared indexes of the collection if they don't exist yet. This is idempotent.
+
+        :param database: The database instance.
+        """
+        if not cls.indexes:
+            return
+
+        try:
+            names = await database.get_collection(cls.collection_name).create_indexes(cls.indexes)
+        except OperationFailure as error:
+            cls.__logger.error(f"Failed to create indexes for {cls.collection_name}: {error}")
+            return
+
+        cls.__logger.info(f"Ensured indexes for {cls.collection_name}: {names}")
+
+    @classmethod
+    def check_indexed(cls, query: Dict) -> bool:
+        """
+        Check if the query can use one of the declared indexes, and log a warning the first time it can't.
+
+        :param query: The query to check.
+        :return: Whether the query can use an index.
+        """
+        if not query:
+            return True
+
+        fields = frozenset(query.keys())
+
+        if "_id" in fields or any(next(iter(index.document["key"])) in fields for index in cls.indexes):
+            return True
+
+        key = (cls.collection_name, fields)
+
+        if key not in cls._reported_unindexed_queries:
+            cls._reported_unindexed_queries.add(key)
+            cls.__logger.warning(f"Query on {cls.collection_name} has no index and will scan the collection: {query}")
+
+        return False
+
+    @classmethod
+    def from_document(cls: Type[T], bot: "Krabbe", database: AsyncIOMotorDatabase, document: Dict) -> T:
+        """
+        Build an object from a stored document. The _id and schema_version fields are not passed to the constructor,
+        and fields missing from sparse documents are left to their defaults.
+
+        :param bot: The bot instance.
+        :param database: The database instance.
+        :param document: The stored document.
+        :return: The object, marked clean.
+        """
+        obj = cls(
+            bot=bot,
+            database=database,
+            **{key: value for key, value in document.items() if key not in ("_id", "schema_version")}
+        )
+        obj.mark_clean()
+
+        return obj
+
     @classmethod
     async def find_one(cls: Type[T], bot: "Krabbe", database: AsyncIOMotorDatabase, **kwargs) -> Optional[T]:
         """
         Find a document in the collection that matches the specified query.
         """
         cls.__logger.info(f"Finding one {cls.collection_name} document: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
 
         document = await database.get_collection(cls.collection_name).find_one(kwargs)
 
         if not document:
             return None
 
-        # noinspection PyUnresolvedReferences
-        del document["_id"]
-
-        return cls(bot=bot, database=database, **document)
+        return cls.from_document(bot, database, document)
 
     @classmethod
-    async def find(cls: Type[T], bot: "Krabbe", database: AsyncIOMotorDatabase, **kwargs) -> AsyncIterator[T]:
+    async def find(
+            cls: Type[T], bot: "Krabbe", database: AsyncIOMotorDatabase, batch_size: Optional[int] = None, **kwargs
+    ) -> AsyncIterator[T]:
         """
         Find all documents in the collection that match the specified query.
+
+        :param batch_size: The number of documents fetched in each batch of the cursor. None for the server default.
         """
         cls.__logger.info(f"Finding {cls.collection_name} documents: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
 
         cursor = database.get_collection(cls.collection_name).find(kwargs)
 
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+
         async for document in cursor:
-            del document["_id"]
+            yield cls.from_document(bot, database, document)
+
+    @classmethod
+    async def count(cls, database: AsyncIOMotorDatabase, **kwargs) -> int:
+        """
+        Count the documents in the collection that match the specified query, without loading them.
+
+        :param database: The database instance.
+        :return: The number of matching documents.
+        """
+        cls.__logger.info(f"Counting {cls.collection_name} documents: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
+
+        return await database.get_collection(cls.collection_name).count_documents(kwargs)
+
+    @classmethod
+    async def find_one_view(
+            cls: Type[T], database: AsyncIOMotorDatabase, fields: Optional[Iterable[str]] = None, **kwargs
+    ) -> Optional[DocumentView[T]]:
+        """
+        Find a document in the collection that matches the specified query, as a read-only view.
+        No full object is built, so this is cheaper when only a few fields are needed.
 
-            yield cls(bot=bot, database=database, **document)
+        :param database: The database instance.
+        :param fields: The fields to load. None for every field.
+        :return: The view of the document, None if no document matches.
+        """
+        cls.__logger.info(f"Finding one {cls.collection_name} document view {fields}: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
+
+        document = await database.get_collection(cls.collection_name).find_one(kwargs, build_projection(fields))
+
+        if not document:
+            return None
+
+        return DocumentView(cls, document)
+
+    @classmethod
+    async def find_views(
+            cls: Type[T],
+            database: AsyncIOMotorDatabase,
+            fields: Optional[Iterable[str]] = None,
+            batch_size: Optional[int] = None,
+            **kwargs
+    ) -> AsyncIterator[DocumentView[T]]:
+        """
+        Find all documents in the collection that match the specified query, as read-only views.
+        No full objects are built, so this is cheaper for large scans.
+
+        :param database: The database instance.
+        :param fields: The fields to load. None for every field.
+        :param batch_size: The number of documents fetched in each batch of the cursor. None for the server default.
+        """
+        cls.__logger.info(f"Finding {cls.collection_name} document views {fields}: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
+
+        cursor = database.get_collection(cls.collection_name).find(kwargs, build_projection(fields))
+
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+
+        async for document in cursor:
+            yield DocumentView(cls, document)
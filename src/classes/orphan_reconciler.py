@@ -0,0 +1,209 @@
+import asyncio
+import time
+from datetime import datetime, timezone, timedelta
+from logging import getLogger
+from typing import TYPE_CHECKING, Optional, Dict, List, Any, Set
+
+from disnake import NotFound, HTTPException, Thread
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from src.classes.guild_settings import GuildSettings
+from src.classes.rate_limited_queue import RateLimitedQueue
+from src.classes.voice_channel import VoiceChannel
+from src.embeds import ErrorEmbed
+from src.utils import snowflake_time
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+
+ORPHAN_REASONS = ("missing_channel", "missing_guild_settings", "missing_owner")
+
+
+class OrphanReconciler:
+    """
+    Periodically finds voice channel documents that can no longer be managed, and cleans them up in bulk.
+
+    A document is orphaned if its channel no longer exists, its guild is no longer set up, or its owner left the guild.
+    Active channels and channels younger than `min_age` are never touched, as they may still be being created.
+    Orphaned documents are deleted with a single query, the lingering channels and logging threads are cleaned up
+    through a rate-limited queue so they don't compete with interactions.
+    """
+    logger = getLogger("krabbe.orphan_reconciler")
+
+    def __init__(
+            self,
+            bot: "Krabbe",
+            database: AsyncIOMotorDatabase,
+            interval: float = 3600,
+            min_age: float = 300,
+            cleanup_rate: int = 1
+    ):
+        """
+        :param bot: The bot instance.
+        :param database: The database instance.
+        :param interval: The number of seconds between reconciliations. 0 to only reconcile once at startup.
+        :param min_age: The minimum age of a channel in seconds before it can be considered orphaned.
+        :param cleanup_rate: The number of channels cleaned up per second.
+        """
+        self.bot: "Krabbe" = bot
+        self.database: AsyncIOMotorDatabase = database
+        self.interval: float = interval
+        self.min_age: float = min_age
+
+        self.cleanup_queue: RateLimitedQueue = RateLimitedQueue(name="orphan_cleanup", rate=cleanup_rate, per=1.0)
+        self.last_report: Dict[str, Any] = {}
+
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start reconciling in the background, starting right away.
+        """
+        if self._task and not self._task.done():
+            return
+
+        self.cleanup_queue.start()
+        self._task = self.bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        """
+        Stop reconciling. Queued cleanups are kept.
+        """
+        self.cleanup_queue.stop()
+
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile_once()
+            except PyMongoError as error:
+                self.logger.warning(f"Failed to reconcile orphaned voice channels: {error}")
+
+            if self.interval <= 0:
+                return
+
+            await asyncio.sleep(self.interval)
+
+    async def find_orphans(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Find the orphaned voice channel documents.
+
+        :return: The orphaned documents, grouped by the reason they're orphaned.
+        """
+        orphans: Dict[str, List[Dict[str, Any]]] = {reason: [] for reason in ORPHAN_REASONS}
+        resolved: Dict[int, List[Dict[str, Any]]] = {}
+
+        created_before = datetime.now(timezone.utc) - timedelta(seconds=self.min_age)
+
+        async for view in VoiceChannel.find_views(
+                self.database, fields=["channel_id", "owner_id", "logging_thread_id"], batch_size=1000
+        ):
+            document = dict(view)
+
+            if document["channel_id"] in VoiceChannel.active_channels:
+                continue
+
+            if snowflake_time(document["channel_id"]) > created_before:
+                continue
+
+            channel = self.bot.get_channel(document["channel_id"])
+
+            if channel is None:
+                orphans["missing_channel"].append(document)
+            elif channel.guild.get_member(document["owner_id"]) is None:
+                orphans["missing_owner"].append(document)
+            else:
+                resolved.setdefault(channel.guild.id, []).append(document)
+
+        configured_guild_ids: Set[int] = {
+            view.guild_id async for view in GuildSettings.find_views(
+                self.database, fields=["guild_id"], guild_id={"$in": list(resolved.keys())}
+            )
+        } if resolved else set()
+
+        for guild_id, documents in resolved.items():
+            if guild_id not in configured_guild_ids:
+                orphans["missing_guild_settings"].extend(documents)
+
+        return orphans
+
+    async def reconcile_once(self) -> Dict[str, Any]:
+        """
+        Find the orphaned voice channel documents, delete them and queue the cleanup of their channels and threads.
+
+        :return: The report of the reconciliation.
+        """
+        if any(guild.unavailable for guild in self.bot.guilds):
+            # Channels of unavailable guilds can't be resolved, don't mistake them for orphans
+            self.logger.info("Some guilds are unavailable, skipping the orphan reconciliation")
+            return self.last_report
+
+        started_at = time.perf_counter()
+
+        orphans = await self.find_orphans()
+
+        documents = [
+            document for reason in ORPHAN_REASONS for document in orphans[reason]
+            if document["channel_id"] not in VoiceChannel.active_channels  # May have been restored in the meantime
+        ]
+
+        deleted = 0
+
+        if documents:
+            result = await VoiceChannel.get_collection(self.database, "delete").delete_many(
+                {"channel_id": {"$in": [document["channel_id"] for document in documents]}}
+            )
+            deleted = result.deleted_count
+
+        for document in documents:
+            self.cleanup_queue.put(lambda document=document: self.clean_up(document))
+
+        self.last_report = {
+            **{reason: len(orphans[reason]) for reason in ORPHAN_REASONS},
+            "deleted": deleted,
+            "cleanup_pending": self.cleanup_queue.stats()["pending"],
+            "duration": round(time.perf_counter() - started_at, 3)
+        }
+
+        if documents:
+            self.logger.warning(f"Removed {deleted} orphaned voice channels: {self.last_report}")
+        else:
+            self.logger.info(f"No orphaned voice channels found: {self.last_report}")
+
+        return self.last_report
+
+    async def clean_up(self, document: Dict[str, Any]) -> None:
+        """
+        Delete the lingering channel of an orphaned document and archive its logging thread.
+
+        :param document: The orphaned voice channel document.
+        :return: None
+        """
+        if channel := self.bot.get_channel(document["channel_id"]):
+            try:
+                await channel.delete()
+            except NotFound:  # Forgive the channel if it's already deleted
+                pass
+
+        thread = self.bot.get_channel(document["logging_thread_id"])
+
+        if not isinstance(thread, Thread) or thread.archived:
+            return
+
+        try:
+            await thread.send(embed=ErrorEmbed("此頻道已被刪除，記錄到此為止"))
+            await thread.edit(locked=True, archived=True)
+        except (NotFound, HTTPException):
+            pass  # Forgive the thread if it's already deleted or not accessible
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the reconciler.
+
+        :return: The last report and the statistics of the cleanup queue.
+        """
+        return {"last_report": self.last_report, "cleanup_queue": self.cleanup_queue.stats()}
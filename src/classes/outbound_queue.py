@@ -0,0 +1,210 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from logging import getLogger
+from typing import Callable, Awaitable, Any, Dict, List, Optional, Tuple
+
+from disnake import HTTPException
+
+
+class Priority(IntEnum):
+    """
+    The priority classes of outbound messages, the lowest value is sent first.
+    """
+    INTERACTION = 0
+    NOTIFICATION = 1
+    AUDIT_LOG = 2
+    BACKGROUND = 3
+
+
+class _OutboundMessage:
+    __slots__ = ("priority", "sequence", "factory", "future", "wait", "queued_at")
+
+    def __init__(
+            self,
+            priority: Priority,
+            sequence: int,
+            factory: Callable[[], Awaitable[Any]],
+            future: asyncio.Future,
+            wait: bool
+    ):
+        self.priority: Priority = priority
+        self.sequence: int = sequence
+        self.factory: Callable[[], Awaitable[Any]] = factory
+        self.future: asyncio.Future = future
+        self.wait: bool = wait
+        self.queued_at: float = time.monotonic()
+
+    def __lt__(self, other: "_OutboundMessage") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class OutboundQueue:
+    """
+    Sends the messages of Krabbe to Discord by priority, one destination at a time.
+
+    Every destination (a channel or thread) has its own queue, and only one message is sent to a destination at once,
+    so a busy destination waits on its own rate limit bucket instead of piling requests onto it.
+    Within a destination, messages are sent by priority then in order.
+    When more than `max_pending` messages are waiting, the lowest priority sheddable messages are dropped.
+    """
+    logger = getLogger("krabbe.outbound_queue")
+
+    def __init__(self, max_pending: int = 1000, max_concurrency: int = 10, shed_priority: Priority = Priority.AUDIT_LOG):
+        """
+        :param max_pending: The number of waiting messages above which messages are shed.
+        :param max_concurrency: The number of messages sent at once across every destination.
+        :param shed_priority: The highest priority that can be shed. Higher priorities are never dropped.
+        """
+        self.max_pending: int = max_pending
+        self.shed_priority: Priority = shed_priority
+
+        self._queues: Dict[int, List[_OutboundMessage]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+        self._sequence = itertools.count()
+        self._pending: int = 0
+
+        self.sent: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self.failed: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self.dropped: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self.total_wait: Dict[Priority, float] = {priority: 0.0 for priority in Priority}
+        self.max_wait: Dict[Priority, float] = {priority: 0.0 for priority in Priority}
+        self.rate_limited: int = 0
+
+    def put(
+            self,
+            destination_id: int,
+            priority: Priority,
+            factory: Callable[[], Awaitable[Any]],
+            wait: bool = False
+    ) -> asyncio.Future:
+        """
+        Queue a message to be sent. The factory is only called when the message is about to be sent.
+
+        :param destination_id: The ID of the channel or thread the message is sent to.
+        :param priority: The priority class of the message.
+        :param factory: A callable returning the coroutine sending the message.
+        :param wait: Whether the caller awaits the result. If not, errors are logged instead of raised.
+        :return: A future resolved with the result of the coroutine, or None if the message was dropped.
+        """
+        future = asyncio.get_running_loop().create_future()
+        message = _OutboundMessage(priority, next(self._sequence), factory, future, wait)
+
+        if self._pending >= self.max_pending and not self._shed_for(message):
+            self._drop(message)
+            return future
+
+        heapq.heappush(self._queues.setdefault(destination_id, []), message)
+        self._pending += 1
+
+        if destination_id not in self._workers:
+            self._workers[destination_id] = asyncio.get_running_loop().create_task(self._run(destination_id))
+
+        return future
+
+    def _drop(self, message: _OutboundMessage) -> None:
+        self.dropped[message.priority] += 1
+
+        if not message.future.done():
+            message.future.set_result(None)
+
+    def _shed_for(self, message: _OutboundMessage) -> bool:
+        """
+        Make room for a message by dropping the newest of the lowest priority waiting messages, if it has a
+        strictly lower priority than the message. Otherwise the oldest message is kept and the new one isn't queued.
+
+        :return: Whether the message can be queued.
+        """
+        worst: Optional[Tuple[int, _OutboundMessage]] = None
+
+        for destination_id, queue in self._queues.items():
+            for waiting in queue:
+                if worst is None or (waiting.priority, waiting.sequence) > (worst[1].priority, worst[1].sequence):
+                    worst = (destination_id, waiting)
+
+        if worst is not None and worst[1].priority > message.priority and worst[1].priority >= self.shed_priority:
+            destination_id, waiting = worst
+
+            self._queues[destination_id].remove(waiting)
+            heapq.heapify(self._queues[destination_id])
+            self._pending -= 1
+            self._drop(waiting)
+
+            return True
+
+        # Messages that can't be shed are queued over the limit rather than lost
+        return message.priority < self.shed_priority
+
+    async def _run(self, destination_id: int) -> None:
+        queue = self._queues[destination_id]
+
+        try:
+            while queue:
+                message = heapq.heappop(queue)
+                self._pending -= 1
+
+                waited = time.monotonic() - message.queued_at
+                self.total_wait[message.priority] += waited
+                self.max_wait[message.priority] = max(self.max_wait[message.priority], waited)
+
+                async with self._semaphore:
+                    await self._send(message)
+        finally:
+            del self._workers[destination_id]
+
+            if not queue:
+                del self._queues[destination_id]
+
+    async def _send(self, message: _OutboundMessage) -> None:
+        try:
+            result = await message.factory()
+        except Exception as error:
+            self.failed[message.priority] += 1
+
+            if isinstance(error, HTTPException) and error.status == 429:
+                self.rate_limited += 1
+
+            if message.wait:
+                message.future.set_exception(error)
+            else:
+                self.logger.warning(f"Failed to send {message.priority.name.lower()} message: {error!r}")
+                message.future.set_result(None)
+
+            return
+
+        self.sent[message.priority] += 1
+        message.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the queue. Wait times are in milliseconds.
+
+        :return: A dictionary of the queue statistics.
+        """
+        depth = {priority: 0 for priority in Priority}
+
+        for queue in self._queues.values():
+            for message in queue:
+                depth[message.priority] += 1
+
+        return {
+            "pending": self._pending,
+            "destinations": len(self._queues),
+            "rate_limited": self.rate_limited,
+            **{
+                priority.name.lower(): {
+                    "depth": depth[priority],
+                    "sent": self.sent[priority],
+                    "failed": self.failed[priority],
+                    "dropped": self.dropped[priority],
+                    "avg_wait_ms": round(
+                        self.total_wait[priority] / max(self.sent[priority] + self.failed[priority], 1) * 1000, 3
+                    ),
+                    "max_wait_ms": round(self.max_wait[priority] * 1000, 3)
+                }
+                for priority in Priority
+            }
+        }
@@ -0,0 +1,138 @@
+from functools import lru_cache
+from logging import getLogger
+from typing import TYPE_CHECKING, Dict, Tuple, Hashable, Union, List, Optional, Any
+
+from disnake import PermissionOverwrite, Role, Member, Guild
+
+from src.cache import LRUCache
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+    from src.classes.guild_settings import GuildSettings
+
+# Overwrites are shared between channels, they must never be mutated
+OWNER_OVERWRITE = PermissionOverwrite(
+    connect=True,
+    manage_channels=True,
+    mute_members=True,
+    deafen_members=True,
+    move_members=True
+)
+MEMBER_OVERWRITE = PermissionOverwrite(connect=True)
+KAVA_OVERWRITE = PermissionOverwrite(connect=True, speak=True)
+
+
+@lru_cache(maxsize=None)
+def base_role_overwrite(
+        locked: bool,
+        soundboard_enabled: Optional[bool],
+        media_allowed: Optional[bool],
+        stream: Optional[bool],
+        use_embedded_activities: Optional[bool]
+) -> PermissionOverwrite:
+    """
+    Get the shared overwrite of the base role for a combination of channel settings.
+
+    :param locked: Whether the channel is locked.
+    :param soundboard_enabled: Whether the soundboard is enabled, None for the default.
+    :param media_allowed: Whether files and links are allowed.
+    :param stream: Whether streaming is allowed.
+    :param use_embedded_activities: Whether activities are allowed.
+    :return: The overwrite of the base role.
+    """
+    return PermissionOverwrite(
+        connect=not locked,
+        use_soundboard=False if soundboard_enabled is None else soundboard_enabled,  # To make it's False by default
+        attach_files=media_allowed,
+        embed_links=media_allowed,
+        use_external_sounds=True,
+        use_application_commands=True,
+        stream=stream,
+        use_embedded_activities=use_embedded_activities
+    )
+
+
+class OverwriteTemplates:
+    """
+    Keeps the per-guild templates channel overwrites are generated from, and the generated channel metadata.
+
+    A template is a copy of the overwrites of the category of the guild, taken once instead of on every generation.
+    Templates are versioned, invalidating the template of a guild bumps its version, so the metadata generated
+    from the old template is never returned again and ages out of the cache.
+    """
+    logger = getLogger("krabbe.overwrite_templates")
+
+    def __init__(self, bot: "Krabbe", metadata_cache_size: int = 10000):
+        """
+        :param bot: The bot instance.
+        :param metadata_cache_size: The number of generated channel metadata kept.
+        """
+        self.bot: "Krabbe" = bot
+
+        self._templates: Dict[int, Tuple[int, Dict[Union[Role, Member], PermissionOverwrite]]] = {}
+        self._versions: Dict[int, int] = {}
+
+        self.metadata_cache: LRUCache[Hashable, Dict[str, Any]] = LRUCache(max_size=metadata_cache_size)
+
+        self.template_hits: int = 0
+        self.template_misses: int = 0
+
+    def version(self, guild_id: int) -> int:
+        return self._versions.get(guild_id, 0)
+
+    def invalidate(self, guild_id: int) -> None:
+        """
+        Drop the template of a guild, it will be rebuilt from its category on the next generation.
+
+        :param guild_id: The guild ID.
+        """
+        self._templates.pop(guild_id, None)
+        self._versions[guild_id] = self.version(guild_id) + 1
+
+        self.logger.debug(f"Invalidated the overwrite template of {guild_id}")
+
+    def category_overwrites(self, guild_settings: "GuildSettings") -> Dict[Union[Role, Member], PermissionOverwrite]:
+        """
+        Get the template of the overwrites of the category of a guild.
+
+        :param guild_settings: The settings of the guild.
+        :return: The overwrites of the category, must be copied before being modified.
+        """
+        template = self._templates.get(guild_settings.guild_id)
+
+        if template is not None and template[0] == guild_settings.category_channel_id:
+            self.template_hits += 1
+            return template[1]
+
+        self.template_misses += 1
+
+        overwrites = guild_settings.category_channel.overwrites
+
+        self._templates[guild_settings.guild_id] = (guild_settings.category_channel_id, overwrites)
+
+        return overwrites
+
+    def kava_members(self, guild: Guild) -> List[Member]:
+        """
+        Get the members of a guild that are connected Kava bots.
+
+        :param guild: The guild.
+        :return: The members of the Kava bots.
+        """
+        return [
+            member for member in map(guild.get_member, self.bot.kava_server.clients) if member is not None
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the templates.
+
+        :return: A dictionary of the template statistics.
+        """
+        return {
+            "templates": len(self._templates),
+            "template_hits": self.template_hits,
+            "template_misses": self.template_misses,
+            "base_role_overwrites": base_role_overwrite.cache_info().currsize,
+            "metadata_cache": self.metadata_cache.stats()
+        }
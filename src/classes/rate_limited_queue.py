@@ -0,0 +1,117 @@
+import asyncio
+import time
+from collections import deque
+from logging import getLogger
+from typing import Callable, Awaitable, Any, Deque, Optional, Dict
+
+
+class RateLimitedQueue:
+    """
+    A first-in-first-out queue of coroutines, running at most `rate` of them every `per` seconds.
+    Used for low priority REST calls that should not compete with interactions.
+    """
+    logger = getLogger("krabbe.rate_limited_queue")
+
+    def __init__(self, name: str, rate: int, per: float, max_size: int = 0):
+        """
+        :param name: The name of the queue, used in logs.
+        :param rate: The number of coroutines allowed to start in each period.
+        :param per: The length of the period in seconds.
+        :param max_size: The maximum number of pending coroutines. 0 for unbounded.
+        """
+        self.name: str = name
+        self.rate: int = rate
+        self.per: float = per
+        self.max_size: int = max_size
+
+        self._pending: Deque[Callable[[], Awaitable[Any]]] = deque()
+        self._started_at: Deque[float] = deque()
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._idle: asyncio.Event = asyncio.Event()
+        self._idle.set()
+        self._worker: Optional[asyncio.Task] = None
+
+        self.processed: int = 0
+        self.failed: int = 0
+        self.dropped: int = 0
+
+    def put(self, coroutine_factory: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Queue a coroutine to be run. The factory is only called when the coroutine is about to run.
+
+        :param coroutine_factory: A callable returning the coroutine to run.
+        :return: Whether the coroutine was queued. False if the queue is full.
+        """
+        if self.max_size and len(self._pending) >= self.max_size:
+            self.dropped += 1
+            return False
+
+        self._pending.append(coroutine_factory)
+        self._idle.clear()
+        self._wakeup.set()
+
+        return True
+
+    def start(self) -> None:
+        """
+        Start processing the queue.
+        """
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        """
+        Stop processing the queue. Pending coroutines are kept.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    async def join(self) -> None:
+        """
+        Wait until every queued coroutine has been run.
+        """
+        await self._idle.wait()
+
+    async def _throttle(self) -> None:
+        while len(self._started_at) >= self.rate:
+            wait_for = self._started_at[0] + self.per - time.monotonic()
+
+            if wait_for <= 0:
+                self._started_at.popleft()
+                continue
+
+            await asyncio.sleep(wait_for)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            await self._throttle()
+
+            coroutine_factory = self._pending.popleft()
+            self._started_at.append(time.monotonic())
+
+            try:
+                await coroutine_factory()
+                self.processed += 1
+            except Exception as error:
+                self.failed += 1
+                self.logger.warning(f"Queued task in {self.name} failed: {error}")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the statistics of this queue.
+
+        :return: A dictionary of the queue statistics.
+        """
+        return {
+            "pending": len(self._pending),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import time
+from collections import deque
+from logging import getLogger
+from typing import TYPE_CHECKING, Dict, Deque, Optional, Any
+
+from disnake import HTTPException
+
+from src.errors import FailedToResolve
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+    from src.classes.voice_channel import VoiceChannel
+
+RENAME_LIMIT = 2
+RENAME_PERIOD = 600
+"""Discord allows 2 renames of a channel every 10 minutes."""
+
+
+class RenameQueue:
+    """
+    Renames voice channels and their logging threads apart from their other edits, within the rename budget
+    Discord gives every channel, so a burst of renames never holds back permission or limit changes.
+
+    Every channel has at most one pending rename, and the latest requested name wins:
+    a rename superseded before it's applied is dropped.
+    """
+    logger = getLogger("krabbe.rename_queue")
+
+    def __init__(self, bot: "Krabbe", limit: int = RENAME_LIMIT, period: float = RENAME_PERIOD):
+        """
+        :param bot: The bot instance.
+        :param limit: The number of renames of a channel allowed per period.
+        :param period: The number of seconds of the rename budget period.
+        """
+        self.bot: "Krabbe" = bot
+        self.limit: int = limit
+        self.period: float = period
+
+        self._renames: Dict[int, Deque[float]] = {}
+        self._pending: Dict[int, str] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+        self.requested: int = 0
+        self.applied: int = 0
+        self.superseded: int = 0
+        self.failed: int = 0
+
+    def delay(self, channel_id: int) -> float:
+        """
+        Get the number of seconds until a channel can be renamed within its budget.
+
+        :param channel_id: The channel ID.
+        :return: The delay in seconds, 0 if the channel can be renamed now.
+        """
+        renames = self._renames.get(channel_id)
+
+        if renames and renames[-1] + self.period <= time.monotonic():
+            del self._renames[channel_id]
+            return 0
+
+        if not renames or len(renames) < self.limit:
+            return 0
+
+        return max(renames[0] + self.period - time.monotonic(), 0)
+
+    def record(self, channel_id: int) -> None:
+        """
+        Count a rename of a channel against its budget.
+
+        :param channel_id: The channel ID.
+        """
+        self._renames.setdefault(channel_id, deque(maxlen=self.limit)).append(time.monotonic())
+
+    def is_pending(self, channel_id: int) -> bool:
+        return channel_id in self._pending
+
+    def pending_delay(self, channel_id: int) -> Optional[float]:
+        """
+        Get the expected number of seconds until the pending rename of a channel is applied.
+
+        :param channel_id: The channel ID.
+        :return: The expected delay in seconds, None if no rename is pending.
+        """
+        if channel_id not in self._pending:
+            return None
+
+        return self.delay(channel_id)
+
+    def request(self, voice_channel: "VoiceChannel", name: str) -> Optional[float]:
+        """
+        Request a voice channel to be renamed, replacing its pending rename if any.
+
+        :param voice_channel: The voice channel to rename.
+        :param name: The new name of the channel.
+        :return: The expected number of seconds until the rename is applied, None if no rename is needed.
+        """
+        channel_id = voice_channel.channel_id
+
+        if channel_id in self._pending:
+            if self._pending[channel_id] == name:
+                return self.delay(channel_id)
+
+            self.superseded += 1
+
+        if name == voice_channel.channel.name:
+            self._pending.pop(channel_id, None)
+            return None
+
+        self._pending[channel_id] = name
+        self.requested += 1
+
+        if channel_id not in self._tasks:
+            self._tasks[channel_id] = self.bot.loop.create_task(self._run(voice_channel))
+
+        return self.delay(channel_id)
+
+    async def _run(self, voice_channel: "VoiceChannel") -> None:
+        channel_id = voice_channel.channel_id
+
+        try:
+            while channel_id in self._pending:
+                if (delay := self.delay(channel_id)) > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                name = self._pending.pop(channel_id)
+
+                self.record(channel_id)
+
+                await self._rename(voice_channel, name)
+
+        finally:
+            self._tasks.pop(channel_id, None)
+
+    async def _rename(self, voice_channel: "VoiceChannel", name: str) -> None:
+        try:
+            await voice_channel.channel.edit(name=name)
+        except (HTTPException, FailedToResolve) as error:
+            self.failed += 1
+            self.logger.warning(f"Failed to rename {voice_channel.channel_id} to {name}: {error!r}")
+            return
+
+        self.applied += 1
+
+        if voice_channel.logging_thread_id is None:
+            return
+
+        try:
+            await voice_channel.logging_thread.edit(name=f"{name} ({voice_channel.creation_date})")
+        except (HTTPException, FailedToResolve) as error:
+            self.logger.warning(f"Failed to rename the logging thread of {voice_channel.channel_id}: {error!r}")
+
+    def discard(self, channel_id: int) -> None:
+        """
+        Drop the pending rename of a channel, when it's removed.
+
+        :param channel_id: The channel ID.
+        """
+        self._pending.pop(channel_id, None)
+
+        if task := self._tasks.pop(channel_id, None):
+            task.cancel()
+
+    def stop(self) -> None:
+        for channel_id in list(self._tasks):
+            self.discard(channel_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the queue.
+
+        :return: A dictionary of the queue statistics.
+        """
+        return {
+            "pending": len(self._pending),
+            "requested": self.requested,
+            "applied": self.applied,
+            "superseded": self.superseded,
+            "failed": self.failed
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import math
+from collections import deque
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import TYPE_CHECKING, Callable, Awaitable, Any, Deque, Dict, List, Optional, Tuple, Sequence
+
+from disnake import Embed, Interaction
+
+from src.embeds import WarningEmbed
+from src.emojis import SETTINGS
+
+if TYPE_CHECKING:
+    from src.classes.channel_settings import ChannelSettings
+    from src.classes.voice_channel import VoiceChannel
+
+logger = getLogger("krabbe.setting_change")
+
+
+class SettingLatency:
+    """
+    Keeps the recent latencies of the setting changes, from the click to the response,
+    and from the click to every effect of the change being applied.
+    """
+
+    def __init__(self, samples: int = 500):
+        """
+        :param samples: The number of recent latencies kept per setting to compute the percentiles.
+        """
+        self.samples: int = samples
+
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, setting: str, stage: str, latency: float) -> None:
+        """
+        Record a latency.
+
+        :param setting: The name of the changed setting.
+        :param stage: `response` or `applied`.
+        :param latency: The latency in seconds.
+        """
+        self._latencies.setdefault((setting, stage), deque(maxlen=self.samples)).append(latency)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the latency percentiles of every setting and stage. Latencies are in milliseconds.
+
+        :return: A dictionary of the latency statistics, by `setting.stage`.
+        """
+        stats = {}
+
+        for (setting, stage), latencies in sorted(self._latencies.items()):
+            latencies = sorted(latencies)
+
+            stats[f"{setting}.{stage}"] = {
+                "count": len(latencies),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+                "p95_ms": round(latencies[min(math.ceil(len(latencies) * 0.95) - 1, len(latencies) - 1)] * 1000, 1),
+                "max_ms": round(latencies[-1] * 1000, 1)
+            }
+
+        return stats
+
+
+async def apply_setting_change(
+        interaction: Interaction,
+        channel: "VoiceChannel",
+        setting: str,
+        respond: Callable[[], Awaitable[Any]],
+        notification: Optional[Embed] = None,
+        log_message: Optional[str] = None,
+        channel_settings: Optional["ChannelSettings"] = None,
+        extra_effects: Sequence[Tuple[str, Awaitable[Any]]] = ()
+) -> None:
+    """
+    Respond to the interaction first, then apply the effects of a setting change concurrently:
+    the channel edit, the notification in the channel, the settings event log and the persistence of the settings.
+    Failed effects are reported to the user in a follow-up message.
+    If the response fails, like when the interaction expired, the effects are still applied.
+
+    :param interaction: The interaction of the change, the latencies are measured from its creation.
+    :param channel: The voice channel the change applies to.
+    :param setting: The name of the setting, to tell the latencies apart.
+    :param respond: A callable returning the coroutine responding to the interaction.
+    :param notification: The embed notifying the members of the channel. None to skip.
+    :param log_message: The message logged to the settings event logging thread. None to skip.
+    :param channel_settings: The settings to persist. Defaults to the settings of the channel.
+    :param extra_effects: Other effects of the change, as (name shown to the user, coroutine) pairs.
+    """
+    latency = interaction.bot.setting_latency
+
+    # The change is applied even if the response fails, the extra effects are already created and must be awaited
+    try:
+        await respond()
+    except Exception as error:
+        responded = False
+        logger.warning(f"Failed to respond to the {setting} change of {channel.channel_id}, applying it: {error!r}")
+    else:
+        responded = True
+        latency.record(setting, "response", (datetime.now(timezone.utc) - interaction.created_at).total_seconds())
+
+    async def apply() -> None:
+        await (await channel.apply_setting_and_permissions())
+
+    effects: List[Tuple[str, Awaitable[Any]]] = [
+        ("套用頻道設定", apply()),
+        ("儲存設定", (channel_settings or channel.channel_settings).upsert())
+    ]
+
+    effects.extend(extra_effects)
+
+    if notification is not None:
+        effects.append(("發送頻道通知", channel.notify(wait=True, embed=notification)))
+
+    if log_message is not None:
+        effects.append(
+            ("記錄設定事件", channel.guild_settings.log_settings_event(
+                prefix=f"設定 {SETTINGS}", channel=channel, message=log_message
+            ))
+        )
+
+    results = await asyncio.gather(*[effect for _, effect in effects], return_exceptions=True)
+
+    latency.record(setting, "applied", (datetime.now(timezone.utc) - interaction.created_at).total_seconds())
+
+    failed = [(name, result) for (name, _), result in zip(effects, results) if isinstance(result, Exception)]
+
+    for name, error in failed:
+        logger.warning(f"Failed to apply {setting} of {channel.channel_id} ({name}): {error!r}")
+
+    if failed and responded:
+        await interaction.followup.send(
+            embed=WarningEmbed(
+                title="部分設定未能完成",
+                description="\n".join(f"- {name}：{error}" for name, error in failed)
+            ),
+            ephemeral=True
+        )
@@ -0,0 +1,194 @@
+import asyncio
+import time
+from enum import Enum
+from logging import getLogger
+from typing import Callable, Awaitable, Any, Dict, List, Optional, Iterable
+
+
+class StepState(Enum):
+    PENDING = "⏸️"
+    RUNNING = "⌛"
+    DONE = "✅"
+    FAILED = "❌"
+    CANCELLED = "⏹️"
+    ROLLED_BACK = "↩️"
+
+
+class Step:
+    """
+    A step of a task graph, run once every step it depends on is done.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            label: str,
+            run: Callable[[Dict[str, Any]], Awaitable[Any]],
+            depends_on: Iterable[str] = (),
+            rollback: Optional[Callable[[Any], Awaitable[None]]] = None
+    ):
+        """
+        :param name: The unique name of the step, its result is stored under this name.
+        :param label: The label of the step shown in the progress.
+        :param run: A callable taking the results of the steps so far and returning the coroutine of the step.
+        :param depends_on: The names of the steps that must be done before this one.
+        :param rollback: A callable taking the result of the step and returning the coroutine undoing it.
+        """
+        self.name: str = name
+        self.label: str = label
+        self.run: Callable[[Dict[str, Any]], Awaitable[Any]] = run
+        self.depends_on: List[str] = list(depends_on)
+        self.rollback: Optional[Callable[[Any], Awaitable[None]]] = rollback
+
+        self.state: StepState = StepState.PENDING
+        self.duration: Optional[float] = None
+
+
+class TaskGraph:
+    """
+    Runs steps concurrently as soon as the steps they depend on are done, at most `concurrency` at once.
+
+    If a step fails, no more steps are started, the running steps are left to finish so what they created can be
+    undone, and the finished steps are rolled back in the reverse order they finished in, then the error is raised.
+    """
+    logger = getLogger("krabbe.task_graph")
+
+    def __init__(
+            self,
+            steps: List[Step],
+            concurrency: int = 3,
+            on_progress: Optional[Callable[["TaskGraph"], None]] = None
+    ):
+        """
+        :param steps: The steps of the graph.
+        :param concurrency: The number of steps run at once.
+        :param on_progress: Called every time a step changes state.
+        :raise ValueError: If a step depends on an unknown step, or the steps depend on each other in a cycle.
+        """
+        self.steps: Dict[str, Step] = {step.name: step for step in steps}
+        self.concurrency: int = concurrency
+        self.on_progress: Optional[Callable[["TaskGraph"], None]] = on_progress
+
+        self.results: Dict[str, Any] = {}
+        self._finished: List[str] = []
+        self._failed: bool = False
+
+        self._validate()
+
+    def _validate(self) -> None:
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise ValueError(f"Step {step.name} depends on unknown step {dependency}")
+
+        visited = set()
+
+        while len(visited) < len(self.steps):
+            ready = [
+                name for name, step in self.steps.items()
+                if name not in visited and all(dependency in visited for dependency in step.depends_on)
+            ]
+
+            if not ready:
+                raise ValueError(f"Steps {set(self.steps) - visited} depend on each other in a cycle")
+
+            visited.update(ready)
+
+    def _set_state(self, step: Step, state: StepState) -> None:
+        step.state = state
+
+        if self.on_progress:
+            self.on_progress(self)
+
+    async def _run_step(self, step: Step, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            if self._failed:
+                return self._set_state(step, StepState.CANCELLED)
+
+            self._set_state(step, StepState.RUNNING)
+            started_at = time.perf_counter()
+
+            self.results[step.name] = await step.run(self.results)
+
+            step.duration = time.perf_counter() - started_at
+            self._finished.append(step.name)
+            self._set_state(step, StepState.DONE)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every step of the graph.
+
+        :raise Exception: The error of the first failed step, after the finished steps are rolled back.
+        :return: The results of the steps, by name.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running: Dict[asyncio.Task, Step] = {}
+
+        try:
+            while len(self._finished) < len(self.steps):
+                for step in self.steps.values():
+                    if step.state == StepState.PENDING and step not in running.values() and \
+                            all(dependency in self._finished for dependency in step.depends_on):
+                        running[asyncio.create_task(self._run_step(step, semaphore))] = step
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    step = running.pop(task)
+
+                    if task.exception():
+                        self.logger.error(f"Step {step.name} failed: {task.exception()!r}")
+                        self._set_state(step, StepState.FAILED)
+
+                        raise task.exception()
+
+        except Exception:
+            self._failed = True
+
+            for step, result in zip(running.values(), await asyncio.gather(*running, return_exceptions=True)):
+                if isinstance(result, Exception):
+                    self._set_state(step, StepState.FAILED)
+
+            await self.rollback()
+
+            raise
+
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+
+            await asyncio.gather(*running, return_exceptions=True)
+            await self.rollback()
+
+            raise
+
+        return self.results
+
+    async def rollback(self) -> None:
+        """
+        Undo the finished steps, in the reverse order they finished in. Rollback errors are logged, not raised.
+        """
+        for name in reversed(self._finished):
+            step = self.steps[name]
+
+            if step.rollback is not None:
+                try:
+                    await step.rollback(self.results[name])
+                except Exception as error:
+                    self.logger.warning(f"Failed to roll back step {name}: {error!r}")
+                    continue
+
+            self._set_state(step, StepState.ROLLED_BACK)
+
+        self._finished.clear()
+
+    def progress(self) -> str:
+        """
+        Get the progress of the steps as one line per step.
+
+        :return: The progress text.
+        """
+        return "\n".join(
+            f"{step.state.value} {step.label}" + (f" ({step.duration:.1f}s)" if step.state == StepState.DONE else "")
+            for step in self.steps.values()
+        )
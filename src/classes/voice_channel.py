@@ -1,25 +1,27 @@
 import asyncio
 import random
 from asyncio import Event, Future
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 from logging import getLogger
-from typing import Optional, TYPE_CHECKING, AsyncIterator, Union, List, Dict
+from typing import Optional, TYPE_CHECKING, AsyncIterator, Union, List, Dict, Tuple, Any
 
 import disnake
-from disnake import Member, NotFound, VoiceState, Message, Interaction, User, PermissionOverwrite, Thread, \
-    AllowedMentions, Object, HTTPException
+from disnake import Member, NotFound, VoiceState, Message, Interaction, User, Thread, \
+    AllowedMentions, Object, HTTPException, Embed, Color
 from disnake.ui import Button
 from disnake.utils import MISSING
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, WriteConcern
 
 from src.classes.channel_settings import ChannelSettings
 from src.classes.guild_settings import GuildSettings
 from src.classes.mongo_object import MongoObject
+from src.classes.outbound_queue import Priority
 from src.embeds import SuccessEmbed, InfoEmbed, ErrorEmbed, ChannelNotificationEmbed
 from src.emojis import CLOWN, USER_JOIN, USER_LEAVE, CREATE, TRASH
 from src.errors import FailedToResolve, OwnedChannel, AlternativeOwnerNotFound
-from src.utils import generate_channel_metadata, remove_image, snowflake_time
+from src.utils import generate_channel_metadata, remove_image, snowflake_time, local_time
 
 if TYPE_CHECKING:
     from src.bot import Krabbe
@@ -34,6 +36,15 @@ class VoiceChannelState(Enum):
 
 class VoiceChannel(MongoObject):
     collection_name = "voice_channels"
+    indexes = [
+        IndexModel([("channel_id", ASCENDING)], unique=True),
+        IndexModel([("owner_id", ASCENDING)])
+    ]
+    # Ownership must survive a primary failover, or a channel could end up with two owners
+    write_concerns = {
+        "upsert": WriteConcern(w="majority"),
+        "delete": WriteConcern(w="majority")
+    }
     logger = getLogger("krabbe.voice_channel")
 
     active_channels: Dict[int, "VoiceChannel"] = {}
@@ -44,17 +55,20 @@ class VoiceChannel(MongoObject):
             database: AsyncIOMotorDatabase,
             channel_id: int,
             owner_id: int,
-            logging_thread_id: int,
+            logging_thread_id: Optional[int],
             pin_code: str,
             channel_settings: ChannelSettings,
-            guild_settings: GuildSettings
+            guild_settings: GuildSettings,
+            created_at: Optional[datetime] = None
     ):
         super().__init__(bot, database)
 
         self.channel_id: int = channel_id
         self.owner_id: int = owner_id
-        self.logging_thread_id: int = logging_thread_id
+        self.logging_thread_id: Optional[int] = logging_thread_id  # Created on the first mirrored message
         self.pin_code: Optional[str] = pin_code
+        # Pooled channels are created ahead of time, so the channel ID doesn't tell when the voice channel was
+        self.created_at: Optional[datetime] = created_at
 
         self._channel: Optional[disnake.VoiceChannel] = None
         self._owner: Optional[disnake.Member] = None
@@ -70,6 +84,8 @@ class VoiceChannel(MongoObject):
 
         self.member_queue: list[Union[User, Member]] = []
 
+        self._unlogged_messages: List[Tuple[Message, str, Color, Dict[str, Any]]] = []
+
     def unique_identifier(self) -> dict:
         return {"channel_id": self.channel_id}
 
@@ -78,7 +94,8 @@ class VoiceChannel(MongoObject):
             "channel_id": self.channel_id,
             "owner_id": self.owner_id,
             "logging_thread_id": self.logging_thread_id,
-            "pin_code": self.pin_code
+            "pin_code": self.pin_code,
+            "created_at": self.created_at
         }
 
     def is_locked(self) -> bool:
@@ -159,7 +176,10 @@ class VoiceChannel(MongoObject):
 
     @property
     def creation_date(self) -> str:
-        return snowflake_time(self.channel_id).strftime("%Y-%m-%d %H:%M:%S")
+        if self.created_at is None:  # Channels created before the creation time was stored
+            return snowflake_time(self.channel_id).strftime("%Y-%m-%d %H:%M:%S")
+
+        return local_time(self.created_at).strftime("%Y-%m-%d %H:%M:%S")
 
     @property
     def non_bot_members(self) -> List[Member]:
@@ -186,30 +206,19 @@ class VoiceChannel(MongoObject):
             locked=self.is_locked()
         )
 
-        pending_edits: Dict[str, Union[str, int, PermissionOverwrite, bool]] = {}
+        # Renames are rate limited much harder than other edits, so they go through their own queue
+        self.bot.rename_queue.request(self, new_metadata.pop("name"))
 
-        for key in new_metadata:
-            if getattr(self.channel, key) != new_metadata[key]:
-                pending_edits[key] = new_metadata[key]
+        plan = self.bot.edit_planner.plan(self.channel, new_metadata)
 
-        self.logger.info(f"Applying settings and permissions to {self.channel.name}: {pending_edits}")
+        self.logger.info(f"Applying settings and permissions to {self.channel.name}: {plan}")
 
-        if not pending_edits:
+        if not plan:
             future = Future()
             future.set_result(None)
             return future
 
-        if "name" in pending_edits:
-            future = asyncio.ensure_future(
-                asyncio.gather(
-                    self.channel.edit(**pending_edits),
-                    self.logging_thread.edit(name=f"{pending_edits['name']} ({self.creation_date})")
-                )
-            )
-        else:
-            future = self.bot.loop.create_task(self.channel.edit(**pending_edits))
-
-        return future
+        return self.bot.loop.create_task(plan.execute())
 
     async def lock(self, pin_code: str) -> None:
         """
@@ -328,31 +337,38 @@ class VoiceChannel(MongoObject):
             message=f"{new_owner.mention} 成為了新的擁有者"
         )
 
-    async def notify(self, wait: bool = False, *args, **kwargs) -> Optional[Message]:
+    async def notify(
+            self, wait: bool = False, *args, priority: Priority = Priority.NOTIFICATION, **kwargs
+    ) -> Optional[Message]:
         """
-        Sends a message to the channel
+        Sends a message to the channel through the outbound queue.
         :param wait: Whether to wait the message to be sent.
+        :param priority: The priority of the message in the outbound queue.
         :param args: The args to pass to the `send()` method.
         :param kwargs: The kwargs to pass to the `send()` method.
-        :return: The message sent. None if wait is False
+        :return: The message sent. None if wait is False or the message was dropped.
         """
+        future = self.bot.outbound.put(
+            self.channel_id, priority, lambda: self.channel.send(*args, **kwargs), wait=wait
+        )
+
         if wait:
-            return await self.channel.send(*args, **kwargs)
+            return await future
 
-        _ = self.bot.loop.create_task(
-            self.channel.send(*args, **kwargs)
-        )
+        return None
 
     async def restore_state(self) -> None:
         """
         Restores the state of the channel. Checks if the owner is in the channel or not.
         This should only be called when bot is starting up.
+        The channel is only edited if it doesn't match the settings already, and the edit is awaited
+        so callers can bound how many restores run at once.
         """
         try:
             if self.is_locked():
                 self.locked_channels[self.pin_code] = self
 
-            await self.apply_setting_and_permissions()
+            await (await self.apply_setting_and_permissions())
 
             if any(m.id == self.owner_id for m in self.non_bot_members):  # Owner is in the channel
                 await self.update_state(VoiceChannelState.ACTIVE)
@@ -523,6 +539,8 @@ class VoiceChannel(MongoObject):
         if member in self.member_queue:
             self.member_queue.remove(member)
 
+        self.bot.voice_events.record("join", self, member.id)
+
         if self.channel_settings.join_notifications:
             await self.notify(
                 embed=ChannelNotificationEmbed(
@@ -541,6 +559,8 @@ class VoiceChannel(MongoObject):
         if voice_state.channel.id != self.channel_id:
             return
 
+        self.bot.voice_events.record("leave", self, member.id)
+
         if member.id == self.owner_id:
             await self.update_state(VoiceChannelState.OWNER_DISCONNECTED)
 
@@ -568,6 +588,111 @@ class VoiceChannel(MongoObject):
             message=f"{member.mention} 離開了"
         )
 
+    @staticmethod
+    def mirror_embed(message: Message, content: str, color: Color) -> Embed:
+        """
+        Build the embed mirroring a message in a batch, carrying its author since a batch has many authors.
+
+        :param message: The mirrored message.
+        :param content: The content to show, with the edit or delete marker.
+        :param color: The color of the embed, telling sent, edited and deleted messages apart.
+        :return: The embed.
+        """
+        embed = Embed(
+            description=content[:4096],
+            color=color,
+            timestamp=message.edited_at or message.created_at
+        )
+        embed.set_author(
+            name=message.author.display_name,
+            icon_url=message.author.avatar.url if message.author.avatar else None
+        )
+
+        if message.reference and message.reference.cached_message:
+            embed.add_field(
+                name="回覆",
+                value=f"[{message.reference.cached_message.content[:20] or '訊息'}]({message.reference.jump_url})"
+            )
+
+        return embed
+
+    async def mirror_message(self, message: Message, content: str, color: Color, **kwargs) -> None:
+        """
+        Mirror a message to the logging thread, in a batch or with its own webhook call depending on the guild settings.
+        The logging thread is created on the first mirrored message, messages arriving meanwhile are buffered
+        and mirrored in order once it's created.
+
+        :param message: The mirrored message.
+        :param content: The content to show, with the edit or delete marker.
+        :param color: The color of the embed mirroring the message in a batch.
+        :param kwargs: The arguments of `Webhook.send` mirroring the message on its own.
+        """
+        if self.logging_thread_id is None or self._unlogged_messages:
+            self._unlogged_messages.append((message, content, color, kwargs))
+
+            if len(self._unlogged_messages) == 1 and self.logging_thread_id is None:
+                await self.create_logging_thread()
+
+            return
+
+        await self._mirror(message, content, color, kwargs)
+
+    async def _mirror(self, message: Message, content: str, color: Color, kwargs: Dict[str, Any]) -> None:
+        if self.guild_settings.batch_message_logging:
+            self.bot.message_mirror.add(
+                self.guild_settings,
+                self.logging_thread_id,
+                [self.mirror_embed(message, content, color), *kwargs.get("embeds", [])]
+            )
+            return
+
+        await self.guild_settings.send_message_log(thread=Object(self.logging_thread_id), **kwargs)
+
+    async def create_logging_thread(self) -> None:
+        """
+        Create the logging thread of the channel, persist its ID, then mirror the buffered messages.
+        The buffered messages are dropped if the thread can't be created, or if the channel was removed meanwhile.
+        """
+        try:
+            thread, _ = await self.guild_settings.message_logging_channel.create_thread(
+                name=f"{self.channel.name} ({self.creation_date})",
+                embed=InfoEmbed(
+                    title="頻道紀錄",
+                    description=f"這是 {self.channel.mention} 的頻道訊息紀錄"
+                )
+            )
+        except (HTTPException, FailedToResolve) as error:
+            self.logger.warning(f"Failed to create the logging thread of {self.channel_id}: {error!r}")
+            self._unlogged_messages.clear()
+            return
+
+        # The channel may have been removed while the thread was created, its document must not be upserted back
+        if VoiceChannel.active_channels.get(self.channel_id) is not self:
+            self.logger.info(f"{self.channel_id} was removed while its logging thread was created, deleting it")
+            self._unlogged_messages.clear()
+
+            try:
+                await thread.delete()
+            except HTTPException as error:
+                self.logger.warning(f"Failed to delete the orphaned logging thread of {self.channel_id}: {error!r}")
+
+            return
+
+        self._logging_thread = thread
+        self.logging_thread_id = thread.id
+
+        await self.upsert()
+
+        while self._unlogged_messages:
+            message, content, color, kwargs = self._unlogged_messages[0]
+
+            try:
+                await self._mirror(message, content, color, kwargs)
+            except Exception as error:
+                self.logger.warning(f"Failed to mirror a buffered message of {self.channel_id}: {error!r}")
+
+            self._unlogged_messages.pop(0)
+
     async def on_message(self, message: Message) -> None:
         if not message.channel.id == self.channel_id:
             return
@@ -583,8 +708,10 @@ class VoiceChannel(MongoObject):
         if message.author.id == self.bot.user.id:
             embeds = [remove_image(embed) for embed in message.embeds]
 
-        await self.guild_settings.message_logging_webhook.send(
-            thread=Object(self.logging_thread_id),
+        await self.mirror_message(
+            message,
+            message.content,
+            Color.blurple(),
             username=message.author.display_name,
             avatar_url=message.author.avatar.url if message.author.avatar else MISSING,
             content=message.content,
@@ -610,8 +737,10 @@ class VoiceChannel(MongoObject):
         if after.author.id in self.bot.kava_server.clients:
             return
 
-        await self.guild_settings.message_logging_webhook.send(
-            thread=Object(self.logging_thread_id),
+        await self.mirror_message(
+            after,
+            f"{before.content} => {after.content} (edited)",
+            Color.orange(),
             username=after.author.display_name,
             avatar_url=after.author.avatar.url if after.author.avatar else MISSING,
             content=f"{before.content} => {after.content} (edited)",
@@ -637,8 +766,10 @@ class VoiceChannel(MongoObject):
         if message.author.id in self.bot.kava_server.clients:
             return
 
-        await self.guild_settings.message_logging_webhook.send(
-            thread=Object(self.logging_thread_id),
+        await self.mirror_message(
+            message,
+            message.content + "(deleted)",
+            Color.red(),
             username=message.author.display_name,
             avatar_url=message.author.avatar.url if message.author.avatar else MISSING,
             content=message.content + "(deleted)",
@@ -702,6 +833,8 @@ class VoiceChannel(MongoObject):
 
         self.bot.dispatch("voice_channel_created", self)
 
+        self.bot.voice_events.record("create", self)
+
         await self.guild_settings.log_voice_event(
             prefix=f"{CREATE} 建立",
             channel=self,
@@ -740,6 +873,8 @@ class VoiceChannel(MongoObject):
         """
         self.stop_listeners()
 
+        self.bot.rename_queue.discard(self.channel_id)
+
         try:
             VoiceChannel.active_channels.pop(self.channel_id)
         except KeyError:  # Forgive the channel if it's not in the bot's memory
@@ -751,7 +886,8 @@ class VoiceChannel(MongoObject):
             pass
 
         try:
-            await self.channel.delete()
+            if not await self.bot.channel_pool.release(self):
+                await self.channel.delete()
         except (NotFound, ValueError, FailedToResolve):  # Forgive the channel if it's already deleted or not resolved
             pass
 
@@ -768,6 +904,8 @@ class VoiceChannel(MongoObject):
 
         await self.delete()
 
+        self.bot.voice_events.record("delete", self)
+
         self.logger.info(f"Voice channel {self.channel_id} removed.")
 
         await self.guild_settings.log_voice_event(
@@ -786,7 +924,7 @@ class VoiceChannel(MongoObject):
     ) -> "VoiceChannel":
         """
         Creates a new voice channel in the guild with the given owner.
-        This method will create the channel, upsert the document to the database,
+        This method will claim a pooled channel or create the channel, upsert the document to the database,
         then add the channel to the bot's memory.
 
         :param bot: The bot object.
@@ -799,45 +937,33 @@ class VoiceChannel(MongoObject):
 
         channel_settings = await ChannelSettings.get_settings(bot, database, owner.id)
 
-        created_channel = await guild_settings.category_channel.create_voice_channel(
-            **generate_channel_metadata(
-                bot=bot,
-                owner=owner,
-                members=[],
-                channel_settings=channel_settings,
-                guild_settings=guild_settings,
-                locked=False
-            )
+        metadata = generate_channel_metadata(
+            bot=bot,
+            owner=owner,
+            members=[],
+            channel_settings=channel_settings,
+            guild_settings=guild_settings,
+            locked=False
         )
 
-        thread: Thread
-        message: Message
-
-        timestamp = snowflake_time(created_channel.id).strftime("%Y-%m-%d %H:%M:%S")
-
-        thread, message = await guild_settings.message_logging_channel.create_thread(
-            name=f"{created_channel.name} ({timestamp})",
-            embed=InfoEmbed(
-                title="頻道紀錄",
-                description=f"這是 {created_channel.mention} 的頻道訊息紀錄"
-            )
-        )
+        created_channel = await bot.channel_pool.claim(guild_settings, metadata) or \
+            await guild_settings.category_channel.create_voice_channel(**metadata)
 
         voice_channel = cls(
             bot=bot,
             database=database,
             channel_id=created_channel.id,
             owner_id=owner.id,
-            logging_thread_id=thread.id,
+            logging_thread_id=None,
             pin_code="",
             channel_settings=channel_settings,
-            guild_settings=guild_settings
+            guild_settings=guild_settings,
+            created_at=datetime.now(timezone.utc)
         )
 
+        # The settings are already applied by the creation or the claim, and applied again by `setup`
         await voice_channel.upsert()
 
-        await voice_channel.apply_setting_and_permissions()
-
         VoiceChannel.active_channels[voice_channel.channel_id] = voice_channel
 
         _ = bot.loop.create_task(voice_channel.setup())
@@ -865,6 +991,9 @@ class VoiceChannel(MongoObject):
         Find a document in the collection that matches the specified query.
         """
         cls.logger.info(f"Finding one {cls.collection_name} document: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
 
         document = await database.get_collection(cls.collection_name).find_one(kwargs)
 
@@ -879,20 +1008,32 @@ class VoiceChannel(MongoObject):
             bot, database, guild_id=bot.get_channel(document["channel_id"]).guild.id
         )
 
-        return cls(
+        voice_channel = cls(
             bot=bot, database=database, channel_settings=channel_settings, guild_settings=guild_settings, **document
         )
+        voice_channel.mark_clean()
+
+        return voice_channel
 
     @classmethod
-    async def find(cls, bot: "Krabbe", database: AsyncIOMotorDatabase, **kwargs) -> AsyncIterator["VoiceChannel"]:
+    async def find(
+            cls, bot: "Krabbe", database: AsyncIOMotorDatabase, batch_size: Optional[int] = None,
+            **kwargs
+    ) -> AsyncIterator["VoiceChannel"]:
         """
         Find all documents in the collection that match the specified query.
-        Note that this method will remove the document from the database if the channel failed to resolve.
+        Documents that fail to resolve are skipped, they're cleaned up by the orphan reconciler.
         """
         cls.logger.info(f"Finding {cls.collection_name} documents: {kwargs}")
+        cls.check_indexed(kwargs)
+
+        await cls.settle_journal()
 
         cursor = database.get_collection(cls.collection_name).find(kwargs)
 
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+
         async for document in cursor:
             del document["_id"]
 
@@ -902,13 +1043,78 @@ class VoiceChannel(MongoObject):
                     bot, database, guild_id=bot.get_channel(document["channel_id"]).guild.id
                 )
             except Exception as _error:
-                cls.logger.warning(f"Failed to resolve voice channel {document['channel_id']}, removing.")
-                await database.get_collection(cls.collection_name).delete_one({"channel_id": document["channel_id"]})
+                cls.logger.warning(f"Failed to resolve voice channel {document['channel_id']}, skipping.")
                 continue
 
-            yield cls(
+            voice_channel = cls(
                 bot=bot, database=database, channel_settings=channel_settings, guild_settings=guild_settings, **document
             )
+            voice_channel.mark_clean()
+
+            yield voice_channel
+
+    @classmethod
+    async def load_all(cls, bot: "Krabbe", database: AsyncIOMotorDatabase) -> List["VoiceChannel"]:
+        """
+        Load every voice channel in the collection with a few batched queries.
+        Owners' channel settings and guild settings are fetched in bulk instead of once per channel.
+        Documents that fail to resolve are skipped, they're cleaned up by the orphan reconciler.
+
+        :param bot: The bot instance.
+        :param database: The database instance.
+        :return: The loaded voice channels.
+        """
+        cls.logger.info(f"Loading all {cls.collection_name} documents")
+
+        documents: List[dict] = []
+        guild_ids: Dict[int, int] = {}
+        unresolved: List[int] = []
+
+        await cls.settle_journal()
+
+        async for document in database.get_collection(cls.collection_name).find({}):
+            del document["_id"]
+
+            channel = bot.get_channel(document["channel_id"])
+
+            if channel is None:
+                unresolved.append(document["channel_id"])
+                continue
+
+            guild_ids[document["channel_id"]] = channel.guild.id
+            documents.append(document)
+
+        channel_settings = await ChannelSettings.get_many_settings(
+            bot, database, [document["owner_id"] for document in documents]
+        )
+
+        guild_settings: Dict[int, GuildSettings] = {
+            settings.guild_id: settings
+            async for settings in GuildSettings.find(bot, database, guild_id={"$in": list(set(guild_ids.values()))})
+        }
+
+        voice_channels: List["VoiceChannel"] = []
+
+        for document in documents:
+            if not (settings := guild_settings.get(guild_ids[document["channel_id"]])):
+                unresolved.append(document["channel_id"])
+                continue
+
+            voice_channel = cls(
+                bot=bot,
+                database=database,
+                channel_settings=channel_settings[document["owner_id"]],
+                guild_settings=settings,
+                **document
+            )
+            voice_channel.mark_clean()
+
+            voice_channels.append(voice_channel)
+
+        if unresolved:
+            cls.logger.warning(f"Failed to resolve {len(unresolved)} voice channels, skipping: {unresolved}")
+
+        return voice_channels
 
     @classmethod
     def generate_pin_code(cls) -> str:
@@ -0,0 +1,240 @@
+import asyncio
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import TYPE_CHECKING, Optional, Dict, List, Any, Tuple, Literal
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import PyMongoError, CollectionInvalid, BulkWriteError
+
+if TYPE_CHECKING:
+    from src.bot import Krabbe
+    from src.classes.voice_channel import VoiceChannel
+
+VoiceEventType = Literal["create", "delete", "join", "leave"]
+
+AGGREGATE_COUNTERS: Dict[VoiceEventType, str] = {
+    "create": "channels_created",
+    "delete": "channels_deleted",
+    "join": "joins",
+    "leave": "leaves"
+}
+
+# The server error codes of writes that can succeed if retried, like writes interrupted by a primary step down
+TRANSIENT_WRITE_ERROR_CODES = {6, 7, 50, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+
+class VoiceEventRecorder:
+    """
+    Records the voice channel events in a time-series collection, so the voice activity can be queried,
+    and keeps daily per-guild aggregates of them up to date.
+
+    Events are buffered in memory and written in batches, either every `flush_interval` seconds
+    or as soon as `max_buffer_size` events are waiting.
+    """
+    logger = getLogger("krabbe.voice_events")
+
+    events_collection_name = "voice_events"
+    aggregates_collection_name = "voice_daily_stats"
+
+    aggregate_indexes = [
+        IndexModel([("guild_id", ASCENDING), ("date", ASCENDING)], unique=True)
+    ]
+
+    def __init__(
+            self,
+            bot: "Krabbe",
+            database: AsyncIOMotorDatabase,
+            flush_interval: float = 10,
+            max_buffer_size: int = 500,
+            retention_days: int = 90
+    ):
+        """
+        :param bot: The bot instance.
+        :param database: The database instance.
+        :param flush_interval: The number of seconds between flushes.
+        :param max_buffer_size: The number of buffered events that triggers a flush right away.
+        :param retention_days: The number of days the events are kept before MongoDB expires them.
+        """
+        self.bot: "Krabbe" = bot
+        self.database: AsyncIOMotorDatabase = database
+        self.flush_interval: float = flush_interval
+        self.max_buffer_size: int = max_buffer_size
+        self.retention_days: int = retention_days
+
+        self._events: List[Dict[str, Any]] = []
+        self._aggregates: Dict[Tuple[int, str], Dict[str, float]] = {}
+        self._sessions: Dict[Tuple[int, int], datetime] = {}
+
+        self._flush_lock: asyncio.Lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.recorded: int = 0
+        self.written: int = 0
+        self.failed_flushes: int = 0
+        self.dropped: int = 0
+
+    async def ensure_collections(self) -> None:
+        """
+        Create the time-series events collection and the indexes of the aggregates collection if needed.
+        """
+        try:
+            if self.events_collection_name not in await self.database.list_collection_names():
+                await self.database.create_collection(
+                    self.events_collection_name,
+                    timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"},
+                    expireAfterSeconds=self.retention_days * 86400
+                )
+
+                self.logger.info(f"Created the time-series collection {self.events_collection_name}")
+
+            await self.database.get_collection(self.aggregates_collection_name).create_indexes(self.aggregate_indexes)
+        except (CollectionInvalid, PyMongoError) as error:
+            self.logger.error(f"Failed to set up the voice event collections: {error}")
+
+    def start(self) -> None:
+        """
+        Start flushing the buffered events periodically.
+        """
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop flushing periodically and flush the remaining events.
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def record(self, event: VoiceEventType, voice_channel: "VoiceChannel", user_id: Optional[int] = None) -> None:
+        """
+        Buffer a voice channel event. This never waits for the database.
+
+        :param event: The type of the event.
+        :param voice_channel: The voice channel the event happened in.
+        :param user_id: The user who joined or left, or the owner for create and delete events.
+        :return: None
+        """
+        now = datetime.now(timezone.utc)
+        guild_id = voice_channel.guild_settings.guild_id
+        user_id = user_id or voice_channel.owner_id
+
+        document: Dict[str, Any] = {
+            "timestamp": now,
+            "meta": {"guild_id": guild_id, "event": event},
+            "channel_id": voice_channel.channel_id,
+            "user_id": user_id,
+            "owner_id": voice_channel.owner_id
+        }
+
+        counters = self._aggregates.setdefault((guild_id, now.strftime("%Y-%m-%d")), {})
+        counters[AGGREGATE_COUNTERS[event]] = counters.get(AGGREGATE_COUNTERS[event], 0) + 1
+
+        if event in ("create", "join"):
+            self._sessions[(voice_channel.channel_id, user_id)] = now
+
+        elif event == "leave" and (joined_at := self._sessions.pop((voice_channel.channel_id, user_id), None)):
+            document["duration"] = (now - joined_at).total_seconds()
+            counters["voice_seconds"] = counters.get("voice_seconds", 0) + document["duration"]
+
+        elif event == "delete":
+            for key in [key for key in self._sessions if key[0] == voice_channel.channel_id]:
+                del self._sessions[key]
+
+        self._events.append(document)
+        self.recorded += 1
+
+        if len(self._events) >= self.max_buffer_size and not self._flush_lock.locked():
+            _ = self.bot.loop.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """
+        Write the buffered events with a single insert, and apply the buffered daily aggregates.
+        Events that failed to be written for a transient reason are kept for the next flush, the others are dropped.
+        """
+        async with self._flush_lock:
+            events, self._events = self._events, []
+            aggregates, self._aggregates = self._aggregates, {}
+
+            if events:
+                try:
+                    await self.database.get_collection(self.events_collection_name).insert_many(events, ordered=False)
+                    self.written += len(events)
+                except BulkWriteError as error:
+                    # The insert is unordered, so every event without a write error was written
+                    self.failed_flushes += 1
+                    self._retry_failed_events(events, error)
+                except PyMongoError as error:
+                    self.failed_flushes += 1
+                    self.logger.warning(f"Failed to write {len(events)} voice events, retrying later: {error}")
+
+                    # Keep the newest events only, so an outage can't grow the buffer forever
+                    self._events = (events + self._events)[-self.max_buffer_size * 10:]
+
+            for (guild_id, date), counters in aggregates.items():
+                try:
+                    await self.database.get_collection(self.aggregates_collection_name).update_one(
+                        {"guild_id": guild_id, "date": date},
+                        {"$inc": counters},
+                        upsert=True
+                    )
+                except PyMongoError as error:
+                    self.logger.warning(f"Failed to update the voice stats of {guild_id} on {date}: {error}")
+
+                    pending = self._aggregates.setdefault((guild_id, date), {})
+
+                    for counter, value in counters.items():
+                        pending[counter] = pending.get(counter, 0) + value
+
+    def _retry_failed_events(self, events: List[Dict[str, Any]], error: BulkWriteError) -> None:
+        """
+        Buffer the events of a partially failed insert again, if they failed for a transient reason.
+        Duplicates and other permanent failures are dropped.
+
+        :param events: The inserted events.
+        :param error: The error of the insert.
+        """
+        write_errors = error.details.get("writeErrors", [])
+
+        retried = [
+            events[write_error["index"]] for write_error in write_errors
+            if write_error.get("code") in TRANSIENT_WRITE_ERROR_CODES
+        ]
+        dropped = len(write_errors) - len(retried)
+
+        self.written += error.details.get("nInserted", len(events) - len(write_errors))
+        self.dropped += dropped
+
+        if dropped:
+            self.logger.warning(
+                f"Dropped {dropped} voice events that can't be written: "
+                f"{sorted({write_error.get('code') for write_error in write_errors})}"
+            )
+
+        if retried:
+            self.logger.warning(f"Failed to write {len(retried)} voice events, retrying later")
+
+            self._events = (retried + self._events)[-self.max_buffer_size * 10:]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the statistics of the recorder.
+
+        :return: A dictionary of the recorder statistics.
+        """
+        return {
+            "buffered": len(self._events),
+            "recorded": self.recorded,
+            "written": self.written,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "open_sessions": len(self._sessions)
+        }
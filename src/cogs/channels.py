@@ -1,16 +1,17 @@
 from typing import Union
 
 import disnake
-from disnake import ButtonStyle, VoiceState, Member, Event, ApplicationCommandInteraction
+from disnake import ButtonStyle, VoiceState, Member, Event, ApplicationCommandInteraction, HTTPException
 from disnake.abc import GuildChannel
 from disnake.ext.commands import Cog, slash_command
 from disnake.ui import Button
 
 from src.bot import Krabbe
 from src.classes.guild_settings import GuildSettings
+from src.classes.outbound_queue import Priority
 from src.classes.voice_channel import VoiceChannel
 from src.embeds import ErrorEmbed
-from src.errors import AlternativeOwnerNotFound
+from src.errors import AlternativeOwnerNotFound, FailedToResolve
 from src.panels import LockChannelNotification, ChannelRestoredNotification, ensure_owned_channel
 
 
@@ -66,16 +67,21 @@ class Channels(Cog):
     async def on_voice_channel_created(self, voice_channel: VoiceChannel) -> None:
         view = LockChannelNotification(self.bot)  # The Panel is a singleton, so we can reuse it
 
-        message = await voice_channel.notify(
-            wait=True,
-            embeds=[
-                voice_channel.channel_settings.as_embed(),
-                view.embed
-            ],
-            view=view
-        )
+        try:
+            message = await voice_channel.notify(
+                wait=True,
+                embeds=[
+                    voice_channel.channel_settings.as_embed(),
+                    view.embed
+                ],
+                view=view
+            )
+        except (HTTPException, FailedToResolve) as error:
+            VoiceChannel.logger.warning(f"Failed to notify {voice_channel.channel_id} of its creation: {error!r}")
+            message = None
 
         if voice_channel.guild_settings.lock_message_dm:
+            # Without the notification in the channel, the DM is sent without the link to it
             await voice_channel.owner.send(
                 embeds=[
                     voice_channel.channel_settings.as_embed(),
@@ -87,17 +93,21 @@ class Channels(Cog):
                         style=ButtonStyle.url,
                         url=message.jump_url
                     )
-                ]
+                ] if message is not None else []
             )
 
     @Cog.listener(name="on_voice_channel_restored")
     async def on_voice_channel_restored(self, voice_channel: VoiceChannel) -> None:
         view = ChannelRestoredNotification(self.bot)  # The Panel is a singleton, so we can reuse it
 
-        await voice_channel.notify(
-            wait=True,
-            embed=view.embed,
-            view=view
+        # Restored notices are cosmetic, queue them so they don't compete with the restore itself
+        self.bot.restore_notifications.put(
+            lambda: voice_channel.notify(
+                wait=True,
+                embed=view.embed,
+                view=view,
+                priority=Priority.BACKGROUND
+            )
         )
 
     @Cog.listener(name=Event.guild_channel_delete)
@@ -110,6 +120,11 @@ class Channels(Cog):
         voice_channel = VoiceChannel.active_channels[channel.id]
         await voice_channel.remove()
 
+    @Cog.listener(name=Event.guild_channel_update)
+    async def on_category_channel_update(self, before: GuildChannel, after: GuildChannel) -> None:
+        if isinstance(after, disnake.CategoryChannel) and before.overwrites != after.overwrites:
+            self.bot.overwrite_templates.invalidate(after.guild.id)
+
     @Cog.listener(name=Event.guild_channel_update)
     async def on_guild_channel_update(self,
                                       before: Union[GuildChannel, disnake.VoiceChannel],
@@ -135,7 +150,8 @@ class Channels(Cog):
 
                 await voice_channel.apply_setting_and_permissions()
 
-        if before.name != after.name:
+        # A rename applied while a newer one is queued must not overwrite the newer name
+        if before.name != after.name and not self.bot.rename_queue.is_pending(before.id):
             voice_channel.channel_settings.channel_name = after.name
 
         if before.bitrate != after.bitrate:
@@ -64,6 +64,11 @@ class Configuration(Cog):
                 name="lock_message_dm",
                 description="是否將鎖定通知訊息發送到私人訊息中",
                 type=OptionType.boolean
+            ),
+            Option(
+                name="batch_message_logging",
+                description="是否將語音頻道的訊息合併後批次記錄，減少 Webhook 請求，但紀錄會延遲幾秒",
+                type=OptionType.boolean
             )
         ]
     )
@@ -75,7 +80,8 @@ class Configuration(Cog):
                         message_logging_channel: Optional[ForumChannel] = None,
                         message_logging_webhook: Optional[str] = None,
                         allow_nsfw: Optional[bool] = None,
-                        lock_message_dm: Optional[bool] = None) -> None:
+                        lock_message_dm: Optional[bool] = None,
+                        batch_message_logging: Optional[bool] = None) -> None:
         guild_settings = await GuildSettings.find_one(self.bot, self.bot.database, guild_id=interaction.guild.id)
 
         if not guild_settings:
@@ -104,6 +110,7 @@ class Configuration(Cog):
 
         if message_logging_webhook is not None:
             guild_settings.message_logging_webhook_url = message_logging_webhook
+            guild_settings.message_logging_webhook_pool_urls = []  # The pool belongs to the previous webhook's channel
 
         if allow_nsfw is not None:
             guild_settings.allow_nsfw = allow_nsfw
@@ -111,6 +118,9 @@ class Configuration(Cog):
         if lock_message_dm is not None:
             guild_settings.lock_message_dm = lock_message_dm
 
+        if batch_message_logging is not None:
+            guild_settings.batch_message_logging = batch_message_logging
+
         await guild_settings.upsert()
 
         await interaction.response.send_message(
@@ -1,13 +1,15 @@
 import asyncio
 import uuid
-from typing import TYPE_CHECKING, Literal, Tuple, Dict, Union
+from typing import TYPE_CHECKING, Literal, Tuple, Dict, Union, List
 
 from disnake import ApplicationCommandInteraction, SelectOption, Event, MessageInteraction, ChannelType, \
     CategoryChannel, Interaction, VoiceChannel, Webhook, ButtonStyle, Guild
+from disnake.abc import GuildChannel
 from disnake.ext.commands import Cog, has_permissions, slash_command
 from disnake.ui import StringSelect, ChannelSelect, Button
 
 from src.classes.guild_settings import GuildSettings
+from src.classes.task_graph import Step, TaskGraph
 from src.embeds import SuccessEmbed, ErrorEmbed, VoiceSetupEmbed
 from src.panels import panels
 from src.quick_ui import confirm_button
@@ -127,7 +129,20 @@ class Setup(Cog):
             ephemeral=True
         )
 
-        await channels_and_webhooks_task
+        try:
+            await channels_and_webhooks_task
+        except Exception as error:
+            self.bot.logger.error("Failed to set up guild %s: %s", interaction.guild.name, error)
+
+            if use_custom_category == "new":
+                await category.delete()
+
+            return await interaction.edit_original_message(
+                embed=ErrorEmbed(
+                    title="設定失敗",
+                    description="建立頻道時發生錯誤，已刪除建立的頻道，請檢查 Krabbe 的權限後再試一次"
+                )
+            )
 
         guild_settings = GuildSettings(
             bot=self.bot,
@@ -141,6 +156,9 @@ class Setup(Cog):
             voice_event_logging_thread_id=channels_and_webhooks_task.result()["voice_event_logging_thread"].id,
             message_logging_channel_id=channels_and_webhooks_task.result()["message_logging_channel"].id,
             message_logging_webhook_url=channels_and_webhooks_task.result()["message_logging_webhook"].url,
+            message_logging_webhook_pool_urls=[
+                webhook.url for webhook in channels_and_webhooks_task.result()["message_logging_webhook_pool"]
+            ],
             allow_nsfw=nsfw == "yes",
             lock_message_dm=lock_message_dm == "yes"
         )
@@ -317,58 +335,125 @@ class Setup(Cog):
             bot: "Krabbe",
             interaction: Interaction,
             category: CategoryChannel
-    ) -> Dict[str, Union[CategoryChannel, VoiceChannel, Webhook]]:
-        await interaction.edit_original_message(
-            content="⌛ 正在創建頻道和 Webhook..."
-        )
+    ) -> Dict[str, Union[CategoryChannel, VoiceChannel, Webhook, List[Webhook]]]:
+        """
+        Create the channels, threads and webhooks of Krabbe in the category, running the independent steps concurrently.
+        The progress of every step is shown in the original message of the interaction.
+
+        :param bot: The bot instance.
+        :param interaction: The interaction whose original message shows the progress.
+        :param category: The category to create the channels in.
+        :raise Exception: The error of the failed step, after the created channels are deleted.
+        :return: The created channels and webhooks, by name.
+        """
+
+        async def delete(channel: GuildChannel) -> None:
+            await channel.delete()
+
+        steps = [
+            Step(
+                "root_channel", "根頻道",
+                lambda _: category.create_voice_channel("🔊 建立語音頻道", overwrites=category.overwrites),
+                rollback=delete
+            ),
+            Step(
+                "event_logging_channel", "事件紀錄頻道",
+                lambda _: category.create_forum_channel("事件記錄", overwrites=category.overwrites),
+                rollback=delete
+            ),
+            Step(
+                "settings_event_logging_thread", "設定事件紀錄討論串",
+                lambda results: results["event_logging_channel"].create_thread(
+                    name="設定事件記錄",
+                    content="這裡是設定事件記錄討論串，用於紀錄成員對於頻道設定的更新"
+                ),
+                depends_on=["event_logging_channel"]
+            ),
+            Step(
+                "voice_event_logging_thread", "語音事件紀錄討論串",
+                lambda results: results["event_logging_channel"].create_thread(
+                    name="語音事件記錄",
+                    content="這裡是語音事件記錄頻道，用於紀錄語音頻道的動態，如成員加入、離開等"
+                ),
+                depends_on=["event_logging_channel"]
+            ),
+            Step(
+                "message_logging_channel", "訊息紀錄頻道",
+                lambda _: category.create_forum_channel("訊息記錄", overwrites=category.overwrites),
+                rollback=delete
+            ),
+            Step(
+                "message_logging_webhook", "訊息紀錄 Webhook",
+                lambda results: results["message_logging_channel"].create_webhook(name="Krabbe Logging"),
+                depends_on=["message_logging_channel"]
+            ),
+            Step(
+                "control_panel_channel", "語音控制面板頻道",
+                lambda _: category.create_text_channel("語音控制面板", overwrites=category.overwrites),
+                rollback=delete
+            )
+        ]
 
-        root_channel = await category.create_voice_channel(
-            "🔊 建立語音頻道",
-            overwrites=category.overwrites
-        )
-        event_logging_channel = await category.create_forum_channel(
-            "事件記錄",
-            overwrites=category.overwrites
-        )
-        settings_event_logging_thread, _ = await event_logging_channel.create_thread(
-            name="設定事件記錄",
-            content="這裡是設定事件記錄討論串，用於紀錄成員對於頻道設定的更新"
-        )
-        voice_event_logging_thread, _ = await event_logging_channel.create_thread(
-            name="語音事件記錄",
-            content="這裡是語音事件記錄頻道，用於紀錄語音頻道的動態，如成員加入、離開等"
-        )
-        message_logging_channel = await category.create_forum_channel(
-            "訊息記錄",
-            overwrites=category.overwrites
-        )
-        message_logging_webhook = await message_logging_channel.create_webhook(name="Krabbe Logging")
+        # One step per pool webhook, so they're created within the setup concurrency
+        pool_steps = [f"message_logging_webhook_{index}" for index in range(2, bot.message_logging_webhooks + 1)]
 
-        await interaction.edit_original_message(
-            content="⌛ 正在設置控制面板...",
-        )
+        for index, name in enumerate(pool_steps, start=2):
+            steps.append(
+                Step(
+                    name, f"訊息紀錄 Webhook {index}",
+                    lambda results, index=index: results["message_logging_channel"].create_webhook(
+                        name=f"Krabbe Logging {index}"
+                    ),
+                    depends_on=["message_logging_channel"]
+                )
+            )
 
-        control_panel_channel = await category.create_text_channel(
-            "語音控制面板",
-            overwrites=category.overwrites
-        )
+        # Panels are chained so they're sent in order
+        previous = "control_panel_channel"
 
-        for panel in panels.values():
-            await panel.send_to(control_panel_channel)
+        for name, panel in panels.items():
+            steps.append(
+                Step(
+                    f"panel_{name}", f"控制面板：{name}",
+                    lambda results, panel=panel: panel.send_to(results["control_panel_channel"]),
+                    depends_on=[previous]
+                )
+            )
+            previous = f"panel_{name}"
 
-        await interaction.edit_original_message(
-            content="✅ 設定完成！"
-        )
+        progress_changed = asyncio.Event()
+        graph = TaskGraph(steps, concurrency=bot.setup_concurrency, on_progress=lambda _: progress_changed.set())
+
+        async def report_progress() -> None:
+            while True:
+                await progress_changed.wait()
+                progress_changed.clear()
+
+                await interaction.edit_original_message(content=f"⌛ 正在創建頻道和 Webhook...\n{graph.progress()}")
+                await asyncio.sleep(1)  # Message edits are rate limited
+
+        progress_task = bot.loop.create_task(report_progress())
+
+        try:
+            results = await graph.run()
+        except Exception:
+            await interaction.edit_original_message(content=f"❌ 設定失敗，已刪除建立的頻道\n{graph.progress()}")
+            raise
+        finally:
+            progress_task.cancel()
+
+        await interaction.edit_original_message(content=f"✅ 設定完成！\n{graph.progress()}")
 
         return {
             "category": category,
-            "root_channel": root_channel,
-            "event_logging_channel": event_logging_channel,
-            "settings_event_logging_thread": settings_event_logging_thread,
-            "voice_event_logging_thread": voice_event_logging_thread,
-            "message_logging_channel": message_logging_channel,
-            "message_logging_webhook": message_logging_webhook,
-            "control_panel_channel": control_panel_channel
+            "root_channel": results["root_channel"],
+            "event_logging_channel": results["event_logging_channel"],
+            "settings_event_logging_thread": results["settings_event_logging_thread"].thread,
+            "voice_event_logging_thread": results["voice_event_logging_thread"].thread,
+            "message_logging_channel": results["message_logging_channel"],
+            "message_logging_webhook": results["message_logging_webhook"],
+            "message_logging_webhook_pool": [results[name] for name in pool_steps],
+            "control_panel_channel": results["control_panel_channel"]
         }
 
     @staticmethod
@@ -0,0 +1,65 @@
+from typing import TYPE_CHECKING, Dict, Any
+
+from disnake import ForumChannel
+
+from src.classes.guild_settings import GuildSettings
+from src.migrations.migration import DocumentMigration
+
+if TYPE_CHECKING:
+    from src.migrations.runner import MigrationRunner
+
+THREADS = [
+    (
+        "settings_event_logging_thread_id",
+        "設定事件記錄",
+        "這裡是設定事件記錄討論串，用於紀錄成員對於頻道設定的更新"
+    ),
+    (
+        "voice_event_logging_thread_id",
+        "語音事件記錄",
+        "這裡是語音事件記錄頻道，用於紀錄語音頻道的動態，如成員加入、離開等"
+    )
+]
+"""The field, name and first message of every event logging thread."""
+
+
+class EventLoggingThreads(DocumentMigration):
+    """
+    Create the settings and voice event logging threads of guilds set up before they existed.
+    Only the missing threads of a guild are created. Guilds whose event logging channel no longer exists are removed.
+    """
+    number = 1
+    name = "event_logging_threads"
+    collection_name = GuildSettings.collection_name
+
+    needs_discord = True
+    batch_size = 50
+    concurrency = 2
+    rate = 1  # Every guild creates up to two threads
+
+    def query(self) -> Dict[str, Any]:
+        return {
+            "$or": [
+                {"settings_event_logging_thread_id": None},
+                {"voice_event_logging_thread_id": None}
+            ]
+        }
+
+    async def migrate_document(self, runner: "MigrationRunner", document: Dict[str, Any]) -> None:
+        collection = runner.database.get_collection(self.collection_name)
+
+        event_logging_channel: ForumChannel = runner.client.get_channel(document["event_logging_channel_id"])
+
+        if not event_logging_channel:
+            await collection.delete_one({"_id": document["_id"]})
+            return
+
+        # Only the missing threads are created, and each one is stored as soon as it exists,
+        # so a failure never leaks a thread or replaces a working one
+        for field, name, content in THREADS:
+            if document.get(field) is not None:
+                continue
+
+            thread, _ = await event_logging_channel.create_thread(name=name, content=content)
+
+            await collection.update_one({"_id": document["_id"]}, {"$set": {field: thread.id}})
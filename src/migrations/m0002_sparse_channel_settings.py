@@ -0,0 +1,25 @@
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
+
+from src.classes.channel_settings import ChannelSettings
+from src.migrations.migration import BatchMigration
+
+if TYPE_CHECKING:
+    from src.migrations.runner import MigrationRunner
+
+
+class SparseChannelSettings(BatchMigration):
+    """
+    Rewrite the version 1 channel settings, storing every field including nulls, in the sparse version 2 format.
+    """
+    number = 2
+    name = "sparse_channel_settings"
+    collection_name = ChannelSettings.collection_name
+
+    batch_size = 1000
+
+    def query(self) -> Dict[str, Any]:
+        return {"schema_version": {"$exists": False}}
+
+    async def migrate_batch(self, runner: "MigrationRunner", documents: List[Dict[str, Any]]) -> Tuple[int, int]:
+        # Documents changed during the migration are skipped rather than failed, the next run picks them up
+        return await ChannelSettings.migrate_to_sparse(runner.database, documents), 0
@@ -0,0 +1,106 @@
+import asyncio
+from abc import ABC, abstractmethod
+from logging import getLogger
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
+
+if TYPE_CHECKING:
+    from src.migrations.runner import MigrationRunner
+
+
+class Migration(ABC):
+    """
+    A numbered change applied to every matching document of a collection.
+
+    Migrations implement `migrate_batch`, or derive from DocumentMigration and implement `migrate_document`.
+    Migrations are run in order by the MigrationRunner, which pages through the documents matching `query`
+    by _id and records a checkpoint after every batch, so an interrupted migration resumes where it stopped.
+    The query should only match documents that still need to be migrated, so running a migration again is harmless.
+    """
+    number: int
+    name: str
+    collection_name: str
+
+    needs_discord: bool = False
+    """Whether the migration needs a logged-in Discord client."""
+
+    batch_size: int = 100
+    """The number of documents read and checkpointed at once."""
+
+    concurrency: int = 5
+    """The number of documents migrated concurrently."""
+
+    rate: float = 0
+    """The maximum number of documents migrated per second, for migrations calling Discord. 0 for no limit."""
+
+    logger = getLogger("krabbe.migrations")
+
+    def query(self) -> Dict[str, Any]:
+        """
+        The filter of the documents that still need to be migrated.
+
+        :return: The query.
+        """
+        return {}
+
+    @abstractmethod
+    async def migrate_batch(self, runner: "MigrationRunner", documents: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Migrate a batch of documents.
+
+        :param runner: The runner, giving access to the database and Discord client.
+        :param documents: The documents to migrate.
+        :return: The number of documents migrated and failed.
+        """
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"<Migration {self.number:04d} {self.name}>"
+
+
+class DocumentMigration(Migration, ABC):
+    """
+    A migration rewriting documents one at a time, usually calling Discord for each of them.
+    """
+
+    @abstractmethod
+    async def migrate_document(self, runner: "MigrationRunner", document: Dict[str, Any]) -> None:
+        """
+        Migrate a single document.
+
+        :param runner: The runner, giving access to the database and Discord client.
+        :param document: The document to migrate.
+        """
+        raise NotImplementedError
+
+    async def migrate_batch(self, runner: "MigrationRunner", documents: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Migrate a batch of documents. `migrate_document` is called for every document,
+        with at most `concurrency` of them running at once and at most `rate` starting per second.
+
+        :param runner: The runner, giving access to the database and Discord client.
+        :param documents: The documents to migrate.
+        :return: The number of documents migrated and failed.
+        """
+        semaphore = asyncio.Semaphore(runner.concurrency_of(self))
+
+        async def migrate(document: Dict[str, Any]) -> None:
+            async with semaphore:
+                await runner.throttle(self)
+                await self.migrate_document(runner, document)
+
+        results = await asyncio.gather(*[migrate(document) for document in documents], return_exceptions=True)
+
+        failed = 0
+
+        for document, result in zip(documents, results):
+            if isinstance(result, Exception):
+                failed += 1
+                self.logger.warning(f"Migration {self.number} failed on document {document['_id']}: {result!r}")
+
+        return len(documents) - failed, failed
+
+
+class BatchMigration(Migration, ABC):
+    """
+    A migration rewriting whole batches of documents at once, usually with a few bulk updates.
+    """
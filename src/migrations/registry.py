@@ -0,0 +1,11 @@
+from typing import List
+
+from src.migrations.m0001_event_logging_threads import EventLoggingThreads
+from src.migrations.m0002_sparse_channel_settings import SparseChannelSettings
+from src.migrations.migration import Migration
+
+MIGRATIONS: List[Migration] = [
+    EventLoggingThreads(),
+    SparseChannelSettings()
+]
+"""Every migration, in the order they're run. New migrations are appended with the next number."""
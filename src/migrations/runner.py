@@ -0,0 +1,253 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timezone, timedelta
+from logging import getLogger
+from typing import Optional, List, Dict, Any, Iterable
+
+from disnake import Client
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from src.migrations.migration import Migration
+from src.migrations.registry import MIGRATIONS
+
+
+class MigrationLocked(Exception):
+    """
+    Raised when a migration is being run by another process.
+    """
+    pass
+
+
+class MigrationRunner:
+    """
+    Runs the numbered migrations, recording their progress in the `migrations` collection.
+
+    Each migration has a checkpoint document holding its status and the _id of the last migrated document.
+    The checkpoint is updated after every batch, so a migration interrupted by a crash or a restart resumes from
+    the last batch. A lease on the checkpoint prevents two processes from running the same migration at once.
+    """
+    collection_name = "migrations"
+    indexes = [
+        IndexModel([("number", ASCENDING)], unique=True)
+    ]
+    logger = getLogger("krabbe.migrations")
+
+    lease_duration = timedelta(minutes=5)
+
+    def __init__(
+            self,
+            database: AsyncIOMotorDatabase,
+            client: Optional[Client] = None,
+            migrations: Optional[List[Migration]] = None,
+            batch_size: Optional[int] = None,
+            concurrency: Optional[int] = None
+    ):
+        """
+        :param database: The database instance.
+        :param client: The logged-in Discord client, needed by some migrations.
+        :param migrations: The migrations to choose from. Defaults to every registered migration.
+        :param batch_size: Overrides the batch size of every migration.
+        :param concurrency: Overrides the concurrency of every migration.
+        """
+        self.database: AsyncIOMotorDatabase = database
+        self.client: Optional[Client] = client
+        self.migrations: List[Migration] = sorted(migrations or MIGRATIONS, key=lambda migration: migration.number)
+        self.batch_size: Optional[int] = batch_size
+        self.concurrency: Optional[int] = concurrency
+
+        self.owner: str = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._throttle_lock: asyncio.Lock = asyncio.Lock()
+        self._last_started_at: float = 0
+
+    @property
+    def collection(self):
+        return self.database.get_collection(self.collection_name)
+
+    def get_migration(self, number: int) -> Migration:
+        """
+        Get a registered migration by its number.
+
+        :param number: The number of the migration.
+        :raise KeyError: If there's no migration with this number.
+        :return: The migration.
+        """
+        for migration in self.migrations:
+            if migration.number == number:
+                return migration
+
+        raise KeyError(f"Migration {number} not found")
+
+    def concurrency_of(self, migration: Migration) -> int:
+        return self.concurrency or migration.concurrency
+
+    async def throttle(self, migration: Migration) -> None:
+        """
+        Wait until the next document of the migration can be started, according to its rate.
+
+        :param migration: The migration being run.
+        """
+        if not migration.rate:
+            return
+
+        async with self._throttle_lock:
+            wait_for = self._last_started_at + 1 / migration.rate - time.monotonic()
+
+            if wait_for > 0:
+                await asyncio.sleep(wait_for)
+
+            self._last_started_at = time.monotonic()
+
+    async def status(self) -> List[Dict[str, Any]]:
+        """
+        Get the progress of every migration.
+
+        :return: The checkpoints, with a `pending` status for the migrations never run.
+        """
+        checkpoints = {
+            checkpoint["number"]: checkpoint async for checkpoint in self.collection.find({}, {"_id": 0})
+        }
+
+        return [
+            checkpoints.get(migration.number, {"number": migration.number, "name": migration.name, "status": "pending"})
+            for migration in self.migrations
+        ]
+
+    async def reset(self, number: int) -> None:
+        """
+        Forget the progress of a migration, so it's run again from the start.
+
+        :param number: The number of the migration.
+        """
+        await self.collection.delete_one({"number": self.get_migration(number).number})
+
+    async def _acquire(self, migration: Migration) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+
+        try:
+            await self.collection.update_one(
+                {
+                    "number": migration.number,
+                    "$or": [{"lease_until": {"$lt": now}}, {"lease_until": None}, {"owner": self.owner}]
+                },
+                {
+                    "$set": {"owner": self.owner, "lease_until": now + self.lease_duration, "updated_at": now},
+                    "$setOnInsert": {
+                        "name": migration.name,
+                        "status": "pending",
+                        "last_id": None,
+                        "migrated": 0,
+                        "failed": 0,
+                        "started_at": now
+                    }
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:  # The checkpoint exists but the lease is held by someone else
+            raise MigrationLocked(f"{migration} is being run by another process")
+
+        return await self.collection.find_one({"number": migration.number})
+
+    async def _checkpoint(self, migration: Migration, **fields) -> None:
+        now = datetime.now(timezone.utc)
+
+        await self.collection.update_one(
+            {"number": migration.number, "owner": self.owner},
+            {"$set": {"lease_until": now + self.lease_duration, "updated_at": now, **fields}}
+        )
+
+    async def run_migration(self, migration: Migration) -> Dict[str, Any]:
+        """
+        Run a migration, resuming from its last checkpoint.
+
+        :param migration: The migration to run.
+        :raise MigrationLocked: If the migration is being run by another process.
+        :return: The final checkpoint of the migration.
+        """
+        if migration.needs_discord and self.client is None:
+            raise RuntimeError(f"{migration} needs a Discord client")
+
+        checkpoint = await self._acquire(migration)
+
+        if checkpoint["status"] == "done":
+            await self._checkpoint(migration, lease_until=None)
+
+            return await self.collection.find_one({"number": migration.number}, {"_id": 0})
+
+        last_id = checkpoint["last_id"]
+        migrated = checkpoint["migrated"]
+        failed = checkpoint["failed"] if last_id is not None else 0
+
+        batch_size = self.batch_size or migration.batch_size
+        collection = self.database.get_collection(migration.collection_name)
+
+        self.logger.info(f"Running {migration}" + (f", resuming after {last_id}" if last_id is not None else ""))
+
+        await self._checkpoint(migration, status="running")
+
+        started_at = time.perf_counter()
+
+        while True:
+            query = migration.query()
+
+            if last_id is not None:
+                query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+
+            documents = await collection.find(query).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+
+            if not documents:
+                break
+
+            batch_migrated, batch_failed = await migration.migrate_batch(self, documents)
+
+            last_id = documents[-1]["_id"]
+            migrated += batch_migrated
+            failed += batch_failed
+
+            await self._checkpoint(migration, last_id=last_id, migrated=migrated, failed=failed)
+
+            self.logger.info(
+                f"{migration}: {migrated} migrated, {failed} failed, {time.perf_counter() - started_at:.1f}s elapsed"
+            )
+
+        # Failed documents still match the query, so an incomplete migration is rescanned from the start next time
+        await self._checkpoint(
+            migration,
+            status="incomplete" if failed else "done",
+            last_id=None if failed else last_id,
+            finished_at=datetime.now(timezone.utc),
+            lease_until=None
+        )
+
+        self.logger.info(f"Finished {migration}: {migrated} migrated, {failed} failed")
+
+        return await self.collection.find_one({"number": migration.number}, {"_id": 0})
+
+    async def run(self, numbers: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Run the migrations that aren't done yet, in order.
+        When running every migration, the later migrations aren't run once one is incomplete,
+        since they may rely on it. Migrations requested by number are all run.
+
+        :param numbers: The numbers of the migrations to run. None for every migration.
+        :return: The final checkpoints of the migrations run.
+        """
+        await self.collection.create_indexes(self.indexes)
+
+        if numbers is not None:
+            return [await self.run_migration(self.get_migration(number)) for number in numbers]
+
+        checkpoints = []
+
+        for migration in self.migrations:
+            checkpoints.append(checkpoint := await self.run_migration(migration))
+
+            if checkpoint["status"] == "incomplete":
+                self.logger.warning(f"{migration} is incomplete, not running the migrations after it")
+                break
+
+        return checkpoints
@@ -1,4 +1,3 @@
-import asyncio
 from abc import ABC
 from datetime import datetime
 from typing import Dict, TYPE_CHECKING, Optional, Literal
@@ -10,6 +9,7 @@ from disnake.abc import Messageable
 from disnake.ui import View, Button, Select, Modal, TextInput
 
 from src.classes.channel_settings import ChannelSettings
+from src.classes.setting_change import apply_setting_change
 from src.classes.voice_channel import VoiceChannel
 from src.cogs.music import Music, music_check
 from src.embeds import ErrorEmbed, SuccessEmbed, WarningEmbed, InfoEmbed, ChannelNotificationEmbed
@@ -496,36 +496,32 @@ class ChannelSettingsPanel(Panel):
 
         channel.channel_settings.channel_name = new_name
 
-        task = await channel.apply_setting_and_permissions()
+        await channel.apply_setting_and_permissions()
 
-        try:
-            await asyncio.wait_for(task, timeout=5)
+        await channel.channel_settings.upsert()
 
-            await channel.channel_settings.upsert()
+        delay = interaction.bot.rename_queue.pending_delay(channel.channel_id)
 
+        if delay:
             await interaction.edit_original_message(
-                embed=SuccessEmbed(f"頻道已重新命名為 {new_name}" if new_name else "已重設頻道名稱"),
-            )
-
-            await channel.guild_settings.log_settings_event(
-                prefix=f"命名 {SETTINGS}",
-                channel=channel,
-                message=f"重新命名：{new_name}"
+                embed=InfoEmbed(
+                    title="頻道名稱將稍後更新",
+                    description=f"因為 Discord API 的限制，\n"
+                                f"頻道將於 <t:{int(datetime.now().timestamp() + delay)}:R> "
+                                f"{f'重新命名為 {new_name}' if new_name else '重設名稱'}，\n"
+                                f"在這之前再次更改名稱會取代這次的名稱"
+                )
             )
-
-            return
-        except asyncio.TimeoutError:
-            channel.channel_settings.channel_name = channel.channel.name
-
+        else:
             await interaction.edit_original_message(
-                embed=WarningEmbed(
-                    title="你太快了！",
-                    description="因為 Discord API 的限制，\n"
-                                "請稍後再試著更改頻道名稱！"
-                ),
+                embed=SuccessEmbed(f"頻道已重新命名為 {new_name}" if new_name else "已重設頻道名稱"),
             )
 
-            return
+        await channel.guild_settings.log_settings_event(
+            prefix=f"命名 {SETTINGS}",
+            channel=channel,
+            message=f"重新命名：{new_name}"
+        )
 
     @staticmethod
     async def transfer_ownership(interaction: MessageInteraction) -> None:
@@ -580,6 +576,15 @@ class ChannelSettingsPanel(Panel):
             )
             return
 
+        if delay := interaction.bot.rename_queue.pending_delay(channel.channel_id):
+            return await interaction.response.edit_message(
+                embed=SuccessEmbed(
+                    f"已移交所有權給 {new_owner.name}",
+                    f"因為 Discord API 的限制，頻道名稱將於 <t:{int(datetime.now().timestamp() + delay)}:R> 更新"
+                ),
+                components=[]
+            )
+
         await interaction.response.edit_message(embed=SuccessEmbed(f"已移交所有權給 {new_owner.name}"), components=[])
 
     @staticmethod
@@ -785,22 +790,16 @@ class MemberSettingsPanel(Panel):
 
         channel.channel_settings.user_limit = int(limit)
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "limit_members",
+            lambda: interaction.response.send_message(embed=SuccessEmbed(f"已設定人數限制為 {limit}"), ephemeral=True),
+            notification=InfoEmbed(
                 title="當前語音頻道加入人數限制",
                 description=f"此語音頻道的人數上限為：{limit} 位。"
-            )
-        )
-
-        await interaction.response.send_message(embed=SuccessEmbed(f"已設定人數限制為 {limit}"), ephemeral=True)
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"人數上限：{limit}"
+            ),
+            log_message=f"人數上限：{limit}"
         )
 
     @staticmethod
@@ -810,25 +809,19 @@ class MemberSettingsPanel(Panel):
 
         channel.channel_settings.join_notifications = not channel.channel_settings.join_notifications
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "join_notifications",
+            lambda: interaction.response.send_message(
+                embed=SuccessEmbed(f"已{'啟用' if channel.channel_settings.join_notifications else '禁用'}進出通知"),
+                ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="當前語音頻道進出通知",
                 description=f"進出通知已{'啟用' if channel.channel_settings.join_notifications else '禁用'}"
-            )
-        )
-
-        await interaction.response.send_message(
-            embed=SuccessEmbed(f"已{'啟用' if channel.channel_settings.join_notifications else '禁用'}進出通知"),
-            ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"進出通知：{channel.channel_settings.join_notifications}"
+            ),
+            log_message=f"進出通知：{channel.channel_settings.join_notifications}"
         )
 
 
@@ -898,28 +891,22 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.bitrate = int(selected_bitrate[0])
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "bitrate",
+            lambda: interaction.response.send_message(
+                embeds=[SuccessEmbed(f"已設定比特率為 {int(selected_bitrate[0]) // 1000} Kbps")] +
+                       ([
+                            WarningEmbed("注意", "這個伺服器的加成等級可能限制了比特率")
+                        ] if int(selected_bitrate[0]) > max_bitrate(interaction.guild) else []),
+                ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="當前語音頻道位元率",
                 description=f"此語音頻道的位元率調整為：{int(selected_bitrate[0]) // 1000} Kbps"
-            )
-        )
-
-        await interaction.response.send_message(
-            embeds=[SuccessEmbed(f"已設定比特率為 {int(selected_bitrate[0]) // 1000} Kbps")] +
-                   ([
-                        WarningEmbed("注意", "這個伺服器的加成等級可能限制了比特率")
-                    ] if int(selected_bitrate[0]) > max_bitrate(interaction.guild) else []),
-            ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"比特率：{int(selected_bitrate[0]) // 1000} Kbps"
+            ),
+            log_message=f"比特率：{int(selected_bitrate[0]) // 1000} Kbps"
         )
 
     @staticmethod
@@ -929,39 +916,27 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.nsfw = not channel.channel_settings.nsfw
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        if channel.guild_settings.allow_nsfw:
-            await channel.guild_settings.log_settings_event(
-                prefix=f"設定 {SETTINGS}",
-                channel=channel,
-                message=f"NSFW：{channel.channel_settings.nsfw}"
-            )
-
-            await channel.notify(
-                embed=InfoEmbed(
-                    title="當前語音文字 NSFW 限制級內容",
-                    description=f"NSFW 已{'啟用，允許限制級內容' if channel.channel_settings.nsfw else '禁用'}"
-                )
-            )
-
-            await interaction.response.send_message(
-                embed=SuccessEmbed(f"NSFW：{'開' if channel.channel_settings.nsfw else '關'}"),
-                ephemeral=True
-            )
+        allowed = channel.guild_settings.allow_nsfw
 
-        else:
-            await interaction.response.send_message(
-                embeds=[
-                    SuccessEmbed(f"NSFW：{'開' if channel.channel_settings.nsfw else '關'}"),
+        await apply_setting_change(
+            interaction,
+            channel,
+            "nsfw",
+            lambda: interaction.response.send_message(
+                embeds=[SuccessEmbed(f"NSFW：{'開' if channel.channel_settings.nsfw else '關'}")] + ([] if allowed else [
                     WarningEmbed(
                         title="您的設定檔已更新並保存，但此伺服器設定禁止 NSFW 內容。",
                         description=f"您的頻道因為 {interaction.guild.name} 伺服器設定的關係，無法變更為 NSFW 頻道。"
                     )
-                ],
+                ]),
                 ephemeral=True
-            )
+            ),
+            notification=InfoEmbed(
+                title="當前語音文字 NSFW 限制級內容",
+                description=f"NSFW 已{'啟用，允許限制級內容' if channel.channel_settings.nsfw else '禁用'}"
+            ) if allowed else None,
+            log_message=f"NSFW：{channel.channel_settings.nsfw}" if allowed else None
+        )
 
     @staticmethod
     async def rtc_region(interaction: MessageInteraction) -> None:
@@ -977,22 +952,16 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.rtc_region = rtc_region[0]
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "rtc_region",
+            lambda: interaction.response.edit_message(embed=SuccessEmbed(f"已設定語音區域為 {rtc_region[0]}")),
+            notification=InfoEmbed(
                 title="當前語音頻道伺服器區域位置",
                 description=f"此語音頻道的伺服器區域調整為：{rtc_region[0]}"
-            )
-        )
-
-        await interaction.response.edit_message(embed=SuccessEmbed(f"已設定語音區域為 {rtc_region[0]}"))
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"語音區域：{rtc_region[0]}"
+            ),
+            log_message=f"語音區域：{rtc_region[0]}"
         )
 
     @staticmethod
@@ -1002,25 +971,19 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.soundboard_enabled = not channel.channel_settings.soundboard_enabled
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "toggle_soundboard",
+            lambda: interaction.response.send_message(
+                embed=SuccessEmbed(f"音效板：{'開' if channel.channel_settings.soundboard_enabled else '關'}"),
+                ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="當前語音頻道音效版的設定",
                 description=f"此語音頻道的音效板調整為：{'啟用' if channel.channel_settings.soundboard_enabled else '關閉'}"
-            )
-        )
-
-        await interaction.response.send_message(
-            embed=SuccessEmbed(f"音效板：{'開' if channel.channel_settings.soundboard_enabled else '關'}"),
-            ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"音效板：{channel.channel_settings.soundboard_enabled}"
+            ),
+            log_message=f"音效板：{channel.channel_settings.soundboard_enabled}"
         )
 
     @staticmethod
@@ -1030,25 +993,19 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.media_allowed = not channel.channel_settings.media_allowed
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "media_permission",
+            lambda: interaction.response.send_message(
+                embed=SuccessEmbed(f"媒體傳送許可：{'開' if channel.channel_settings.media_allowed else '關'}"),
+                ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="當前語音頻道檔案上傳的權限",
                 description=f"此語音頻道的檔案上傳調整為：{'允許' if channel.channel_settings.media_allowed else '禁止'}"
-            )
-        )
-
-        await interaction.response.send_message(
-            embed=SuccessEmbed(f"媒體傳送許可：{'開' if channel.channel_settings.media_allowed else '關'}"),
-            ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"媒體傳送許可：{channel.channel_settings.media_allowed}"
+            ),
+            log_message=f"媒體傳送許可：{channel.channel_settings.media_allowed}"
         )
 
     @staticmethod
@@ -1081,24 +1038,18 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.slowmode_delay = int(slowmode_delay)
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "slowmode",
+            lambda: interaction.response.send_message(
+                embed=SuccessEmbed(f"已設定慢速模式為 {slowmode_delay} 秒"), ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="當前語音頻道發言時間限制",
                 description=f"此語音頻道的文字頻道發言時速調整為：{slowmode_delay} 秒"
-            )
-        )
-
-        await interaction.response.send_message(
-            embed=SuccessEmbed(f"已設定慢速模式為 {slowmode_delay} 秒"), ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"慢速模式：{slowmode_delay} 秒"
+            ),
+            log_message=f"慢速模式：{slowmode_delay} 秒"
         )
 
     @staticmethod
@@ -1108,25 +1059,19 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.stream = not channel.channel_settings.stream
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "toggle_stream",
+            lambda: interaction.response.send_message(
+                embed=SuccessEmbed(f"直播 / 視訊：{'開' if channel.channel_settings.stream else '關'}"),
+                ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="當前語音頻道直播 / 視訊的權限",
                 description=f"此語音頻道的直播 / 視訊調整為：{'允許' if channel.channel_settings.stream else '禁止'}"
-            )
-        )
-
-        await interaction.response.send_message(
-            embed=SuccessEmbed(f"直播 / 視訊：{'開' if channel.channel_settings.stream else '關'}"),
-            ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"直播 / 視訊許可：{channel.channel_settings.stream}"
+            ),
+            log_message=f"直播 / 視訊許可：{channel.channel_settings.stream}"
         )
 
     @staticmethod
@@ -1136,25 +1081,19 @@ class VoiceSettingsPanel(Panel):
 
         channel.channel_settings.use_embedded_activities = not channel.channel_settings.use_embedded_activities
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "use_embedded_activities",
+            lambda: interaction.response.send_message(
+                embed=SuccessEmbed(f"使用活動：{'開' if channel.channel_settings.use_embedded_activities else '關'}"),
+                ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="當前語音頻道使用活動的權限",
                 description=f"此語音頻道的活動權限調整為：{'允許' if channel.channel_settings.use_embedded_activities else '禁止'}"
-            )
-        )
-
-        await interaction.response.send_message(
-            embed=SuccessEmbed(f"使用活動：{'開' if channel.channel_settings.use_embedded_activities else '關'}"),
-            ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"使用活動許可：{channel.channel_settings.use_embedded_activities}"
+            ),
+            log_message=f"使用活動許可：{channel.channel_settings.use_embedded_activities}"
         )
 
 
@@ -1208,25 +1147,19 @@ class MusicSettingsPanel(Panel):
 
         channel.channel_settings.shared_music_control = not channel.channel_settings.shared_music_control
 
-        await channel.channel_settings.upsert()
-        await channel.apply_setting_and_permissions()
-
-        await channel.notify(
-            embed=InfoEmbed(
+        await apply_setting_change(
+            interaction,
+            channel,
+            "toggle_music",
+            lambda: interaction.response.send_message(
+                embed=SuccessEmbed(f"共享音樂控制：{'開' if channel.channel_settings.shared_music_control else '關'}"),
+                ephemeral=True
+            ),
+            notification=InfoEmbed(
                 title="共享音樂控制",
                 description=f"此頻道的共享音樂控制設定為：{'允許' if channel.channel_settings.shared_music_control else '禁止'}"
-            )
-        )
-
-        await interaction.response.send_message(
-            embed=SuccessEmbed(f"共享音樂控制：{'開' if channel.channel_settings.shared_music_control else '關'}"),
-            ephemeral=True
-        )
-
-        await channel.guild_settings.log_settings_event(
-            prefix=f"設定 {SETTINGS}",
-            channel=channel,
-            message=f"共享音樂控制：{channel.channel_settings.shared_music_control}"
+            ),
+            log_message=f"共享音樂控制：{channel.channel_settings.shared_music_control}"
         )
 
     @staticmethod
@@ -1269,28 +1202,28 @@ class MusicSettingsPanel(Panel):
 
         channel_settings.volume = int(volume)
 
-        if active_channel:
-            await active_channel.apply_setting_and_permissions()
+        if not active_channel:
+            await interaction.response.send_message(embed=SuccessEmbed(f"已設定預設音量為 {volume}"), ephemeral=True)
 
-            if client := get_active_client_in(bot.kava_server, active_channel):
-                await client.request("volume", channel_id=active_channel.channel_id, vol=int(volume))
+            return await channel_settings.upsert()
 
-            await active_channel.notify(
-                embed=InfoEmbed(
-                    title="當前語音頻道預設音量",
-                    description=f"此語音頻道的預設音量為：{volume}%"
-                )
-            )
+        client = get_active_client_in(bot.kava_server, active_channel)
 
-            await active_channel.guild_settings.log_settings_event(
-                prefix=f"設定 {SETTINGS}",
-                channel=active_channel,
-                message=f"預設音量：{volume}"
-            )
-
-        await channel_settings.upsert()
-
-        await interaction.response.send_message(embed=SuccessEmbed(f"已設定預設音量為 {volume}"), ephemeral=True)
+        await apply_setting_change(
+            interaction,
+            active_channel,
+            "edit_volume",
+            lambda: interaction.response.send_message(embed=SuccessEmbed(f"已設定預設音量為 {volume}"), ephemeral=True),
+            notification=InfoEmbed(
+                title="當前語音頻道預設音量",
+                description=f"此語音頻道的預設音量為：{volume}%"
+            ),
+            log_message=f"預設音量：{volume}",
+            channel_settings=channel_settings,
+            extra_effects=[
+                ("調整音樂機器人音量", client.request("volume", channel_id=active_channel.channel_id, vol=int(volume)))
+            ] if client else []
+        )
 
 
 class LockChannelNotification(Panel):
@@ -0,0 +1,382 @@
+import re
+from abc import ABC, abstractmethod
+from copy import deepcopy
+from typing import Any, Dict, Optional, List, Iterable, Tuple, Union, AsyncIterator
+
+from bson import ObjectId
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure, BulkWriteError
+from pymongo.results import UpdateResult, DeleteResult, InsertManyResult
+
+_MISSING = object()
+
+Document = Dict[str, Any]
+
+
+def get_field(document: Document, path: str) -> Any:
+    """
+    Get the value of a possibly dotted field path in a document.
+
+    :param document: The document.
+    :param path: The field path, like `a` or `a.b`.
+    :return: The value, or `_MISSING` if the field doesn't exist.
+    """
+    value: Any = document
+
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+
+        value = value[part]
+
+    return value
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == "$eq":
+        return value is not _MISSING and value == operand or (value is _MISSING and operand is None)
+    if operator == "$ne":
+        return not _compare(value, "$eq", operand)
+    if operator == "$in":
+        return any(_compare(value, "$eq", item) for item in operand)
+    if operator == "$nin":
+        return not _compare(value, "$in", operand)
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if operator == "$regex":
+        return isinstance(value, str) and re.search(operand, value) is not None
+
+    if value is _MISSING or value is None:
+        return False
+
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+
+    raise OperationFailure(f"Unsupported query operator {operator}")
+
+
+def match_document(document: Document, query: Optional[Document]) -> bool:
+    """
+    Check if a document matches a query. Supports a subset of the MongoDB query language:
+    equality, `$eq`, `$ne`, `$in`, `$nin`, `$gt`, `$gte`, `$lt`, `$lte`, `$exists`, `$regex`, `$and` and `$or`.
+
+    :param document: The document to check.
+    :param query: The query.
+    :return: Whether the document matches the query.
+    """
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(match_document(document, sub_query) for sub_query in condition):
+                return False
+            continue
+
+        if key == "$or":
+            if not any(match_document(document, sub_query) for sub_query in condition):
+                return False
+            continue
+
+        value = get_field(document, key)
+
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            if not all(_compare(value, operator, operand) for operator, operand in condition.items()):
+                return False
+        elif not _compare(value, "$eq", condition):
+            return False
+
+    return True
+
+
+def apply_update(document: Document, update: Document, inserting: bool = False) -> bool:
+    """
+    Apply an update to a document in place. Supports `$set`, `$unset`, `$inc` and `$setOnInsert`.
+
+    :param document: The document to update.
+    :param update: The update.
+    :param inserting: Whether the document is being inserted by an upsert.
+    :return: Whether the document was modified.
+    """
+    before = deepcopy(document)
+
+    for operator, fields in update.items():
+        if operator == "$set" or (operator == "$setOnInsert" and inserting):
+            document.update(deepcopy(fields))
+        elif operator == "$setOnInsert":
+            continue
+        elif operator == "$unset":
+            for key in fields:
+                document.pop(key, None)
+        elif operator == "$inc":
+            for key, amount in fields.items():
+                document[key] = document.get(key, 0) + amount
+        else:
+            raise OperationFailure(f"Unsupported update operator {operator}")
+
+    return document != before
+
+
+def project(document: Document, projection: Optional[Dict[str, int]]) -> Document:
+    """
+    Apply an inclusion or exclusion projection to a document.
+
+    :param document: The document.
+    :param projection: The projection. None to keep every field.
+    :return: A copy of the document with the projection applied.
+    """
+    document = deepcopy(document)
+
+    if not projection:
+        return document
+
+    included = {key for key, value in projection.items() if value and key != "_id"}
+
+    if included:
+        result = {key: document[key] for key in included if key in document}
+
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+
+        return result
+
+    for key, value in projection.items():
+        if not value:
+            document.pop(key, None)
+
+    return document
+
+
+def document_from_filter(query: Document) -> Document:
+    """
+    Build the base document of an upsert from the plain equality conditions of its filter.
+
+    :param query: The filter of the upsert.
+    :return: The base document.
+    """
+    return {
+        key: deepcopy(value) for key, value in query.items()
+        if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+    }
+
+
+def sort_documents(documents: List[Document], sort: List[Tuple[str, int]]) -> List[Document]:
+    """
+    Sort documents by the specified keys, missing values first like MongoDB does.
+    """
+    for key, direction in reversed(sort):
+        documents.sort(
+            key=lambda document: (
+                (value := get_field(document, key)) is not _MISSING and value is not None,
+                value if value is not _MISSING and value is not None else 0
+            ),
+            reverse=direction < 0
+        )
+
+    return documents
+
+
+def update_result(matched: int, modified: int, upserted_id: Optional[Any] = None) -> UpdateResult:
+    raw: Dict[str, Any] = {"n": matched + (1 if upserted_id is not None else 0), "nModified": modified}
+
+    if upserted_id is not None:
+        raw["upserted"] = upserted_id
+
+    return UpdateResult(raw, True)
+
+
+def delete_result(deleted: int) -> DeleteResult:
+    return DeleteResult({"n": deleted}, True)
+
+
+def insert_many_result(ids: List[Any]) -> InsertManyResult:
+    return InsertManyResult(ids, True)
+
+
+def write_error(index: int, error: Exception, document: Document) -> Document:
+    """
+    Build the error of a document of an `insert_many` batch rejected for a duplicate key, like the server reports it.
+    """
+    return {"index": index, "code": 11000, "errmsg": str(error), "op": document}
+
+
+def bulk_write_error(write_errors: List[Document], inserted: int) -> BulkWriteError:
+    """
+    Build the error pymongo raises when documents of an `insert_many` batch are rejected.
+    Like MongoDB, the documents that weren't rejected stay inserted: the ones before the first rejected document
+    of an ordered batch, or every valid document of an unordered batch.
+
+    :param write_errors: The errors of the rejected documents, built with `write_error`.
+    :param inserted: The number of documents inserted.
+    """
+    return BulkWriteError({
+        "writeErrors": write_errors,
+        "writeConcernErrors": [],
+        "nInserted": inserted,
+        "nUpserted": 0,
+        "nMatched": 0,
+        "nModified": 0,
+        "nRemoved": 0,
+        "upserted": []
+    })
+
+
+def index_name(model: IndexModel) -> str:
+    return model.document["name"]
+
+
+class Cursor(ABC):
+    """
+    A Motor-compatible cursor over the results of a query.
+    """
+
+    def __init__(self, query: Optional[Document], projection: Optional[Dict[str, int]]):
+        self.query: Document = query or {}
+        self.projection: Optional[Dict[str, int]] = projection
+
+        self._sort: List[Tuple[str, int]] = []
+        self._limit: int = 0
+        self._batch_size: int = 0
+
+    def sort(self, key_or_list: Union[str, List[Tuple[str, int]]], direction: int = 1) -> "Cursor":
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def limit(self, limit: int) -> "Cursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "Cursor":
+        self._batch_size = batch_size
+        return self
+
+    @abstractmethod
+    def __aiter__(self) -> AsyncIterator[Document]:
+        raise NotImplementedError
+
+    async def to_list(self, length: Optional[int] = None) -> List[Document]:
+        documents = []
+
+        async for document in self:
+            documents.append(document)
+
+            if length and len(documents) >= length:
+                break
+
+        return documents
+
+
+class Collection(ABC):
+    """
+    The subset of the Motor collection interface used by Krabbe.
+    """
+
+    def __init__(self, name: str):
+        self.name: str = name
+
+    @abstractmethod
+    def find(self, query: Optional[Document] = None, projection: Optional[Dict[str, int]] = None) -> Cursor:
+        raise NotImplementedError
+
+    async def find_one(
+            self, query: Optional[Document] = None, projection: Optional[Dict[str, int]] = None
+    ) -> Optional[Document]:
+        async for document in self.find(query, projection).limit(1):
+            return document
+
+        return None
+
+    @abstractmethod
+    async def update_one(self, query: Document, update: Document, upsert: bool = False) -> UpdateResult:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_many(self, query: Document, update: Document, upsert: bool = False) -> UpdateResult:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert_many(self, documents: Iterable[Document], ordered: bool = True) -> InsertManyResult:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_one(self, query: Document) -> DeleteResult:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_many(self, query: Document) -> DeleteResult:
+        raise NotImplementedError
+
+    async def count_documents(self, query: Document) -> int:
+        return len(await self.find(query, {"_id": 1}).to_list())
+
+    @abstractmethod
+    async def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        raise NotImplementedError
+
+
+class Database(ABC):
+    """
+    The subset of the Motor database interface used by Krabbe.
+    """
+
+    def __init__(self, name: str):
+        self.name: str = name
+
+    @abstractmethod
+    def get_collection(self, name: str, **_kwargs) -> Collection:
+        raise NotImplementedError
+
+    def __getitem__(self, name: str) -> Collection:
+        return self.get_collection(name)
+
+    async def create_collection(self, name: str, **_kwargs) -> Collection:
+        return self.get_collection(name)
+
+    @abstractmethod
+    async def list_collection_names(self) -> List[str]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """
+        Release the resources held by this database.
+        """
+        pass
+
+    def watch(self, *_args, **_kwargs):
+        raise OperationFailure(f"Change streams are not supported by the {self.__class__.__name__} backend", 40573)
+
+
+def new_id() -> ObjectId:
+    return ObjectId()
+
+
+def create_database(backend: str, mongodb_client_factory=None, sqlite_path: str = "krabbe.db", name: str = "krabbe"):
+    """
+    Create the database of the specified storage backend.
+
+    :param backend: One of `mongo`, `memory` or `sqlite`.
+    :param mongodb_client_factory: A callable returning the Motor client, used by the `mongo` backend.
+    :param sqlite_path: The path of the SQLite database file, used by the `sqlite` backend.
+    :param name: The name of the database.
+    :return: The database object.
+    """
+    if backend == "mongo":
+        return mongodb_client_factory().get_database(name)
+
+    if backend == "memory":
+        from src.storage.memory import MemoryDatabase
+
+        return MemoryDatabase(name)
+
+    if backend == "sqlite":
+        from src.storage.sqlite import SQLiteDatabase
+
+        return SQLiteDatabase(name, sqlite_path)
+
+    raise ValueError(f"Unknown storage backend {backend}")
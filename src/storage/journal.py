@@ -0,0 +1,313 @@
+import asyncio
+import os
+import time
+from collections import deque
+from logging import getLogger
+from typing import Optional, Dict, Any, Deque, BinaryIO
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import WriteConcern
+from pymongo.errors import PyMongoError, ConnectionFailure, AutoReconnect, NetworkTimeout, NotPrimaryError, \
+    WTimeoutError
+
+JournalEntry = Dict[str, Any]
+
+TRANSIENT_ERRORS = (ConnectionFailure, AutoReconnect, NetworkTimeout, NotPrimaryError, WTimeoutError)
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Check whether a write failed for a reason that goes away by itself, so retrying it can succeed.
+
+    :param error: The error of the write.
+    :return: Whether the write should be retried.
+    """
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+
+    return isinstance(error, PyMongoError) and error.has_error_label("RetryableWriteError")
+
+
+class WriteAheadJournal:
+    """
+    An append-only journal of database writes kept on the local disk.
+
+    A write is acknowledged as soon as it's durably appended to the journal, and applied to the database in the
+    background, in the order it was appended. If the process stops before every entry is applied, the remaining
+    entries are applied when the journal is opened again.
+
+    Journaled writes are upserts by unique identifier and deletes, so applying an entry twice is harmless.
+    The journal file is truncated whenever every entry has been applied.
+
+    Only transient errors are retried. An entry failing with any other error can never be applied, so it's logged,
+    moved to the dead letter file next to the journal (`<path>.dead`) and dropped, rather than holding back
+    every later entry.
+    """
+    logger = getLogger("krabbe.journal")
+
+    def __init__(self, path: str, database: AsyncIOMotorDatabase):
+        """
+        :param path: The path of the journal file.
+        :param database: The database the entries are applied to.
+        """
+        self.path: str = path
+        self.dead_letter_path: str = path + ".dead"
+        self.database: AsyncIOMotorDatabase = database
+
+        self._file: Optional[BinaryIO] = None
+        self._pending: Deque[JournalEntry] = deque()
+        self._pending_by_collection: Dict[str, int] = {}
+        self._sequence: int = 0
+
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._idle: asyncio.Event = asyncio.Event()
+        self._idle.set()
+        self._worker: Optional[asyncio.Task] = None
+
+        self.appended: int = 0
+        self.applied: int = 0
+        self.retries: int = 0
+        self.dead_lettered: int = 0
+        self.total_append_time: float = 0.0
+
+    async def open(self) -> int:
+        """
+        Open the journal file and queue the entries left by a previous run, then start applying them.
+
+        :return: The number of entries left by a previous run.
+        """
+        recovered = 0
+        corrupted = False
+
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                for line_number, line in enumerate(file, start=1):
+                    try:
+                        entry = json_util.loads(line)
+                    except ValueError:
+                        # A crash in the middle of an append leaves a partial line, which was never acknowledged
+                        self.logger.warning(f"Skipping corrupted journal entry on line {line_number} of {self.path}")
+                        corrupted = True
+                        continue
+
+                    self._pending.append(entry)
+                    self._count_pending(entry["collection"], 1)
+                    self._sequence = max(self._sequence, entry["sequence"])
+                    recovered += 1
+
+        if corrupted:
+            # Rewrite the valid entries, so new entries aren't appended to the partial line
+            with open(self.path + ".tmp", "wb") as file:
+                file.writelines(json_util.dumps(entry).encode("utf-8") + b"\n" for entry in self._pending)
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(self.path + ".tmp", self.path)
+
+        self._file = open(self.path, "ab")
+
+        if recovered:
+            self.logger.warning(f"Replaying {recovered} journal entries left by the previous run")
+            self._idle.clear()
+            self._wakeup.set()
+
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+        return recovered
+
+    async def close(self, timeout: float = 10) -> None:
+        """
+        Wait for the pending entries to be applied, then close the journal.
+        Entries that couldn't be applied in time stay in the journal for the next run.
+
+        :param timeout: The maximum number of seconds to wait for the pending entries.
+        """
+        if self._file is None:
+            return
+
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"{len(self._pending)} journal entries not applied yet, they'll be replayed next run")
+
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+        self._file.close()
+        self._file = None
+
+    def _count_pending(self, collection: str, change: int) -> None:
+        self._pending_by_collection[collection] = self._pending_by_collection.get(collection, 0) + change
+
+        if not self._pending_by_collection[collection]:
+            del self._pending_by_collection[collection]
+
+    def pending(self, collection: str) -> int:
+        """
+        Get the number of entries of a collection not applied to the database yet.
+
+        :param collection: The name of the collection.
+        :return: The number of pending entries.
+        """
+        return self._pending_by_collection.get(collection, 0)
+
+    async def join(self) -> None:
+        """
+        Wait until every appended entry has been applied to the database.
+        """
+        await self._idle.wait()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_dead_letter(self, data: bytes) -> None:
+        with open(self.dead_letter_path, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _truncate(self) -> None:
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def append(
+            self,
+            collection: str,
+            operation: str,
+            query: Dict[str, Any],
+            update: Optional[Dict[str, Any]] = None,
+            write_concern: Optional[WriteConcern] = None
+    ) -> int:
+        """
+        Durably append a write to the journal. It's applied to the database in the background.
+
+        :param collection: The name of the collection.
+        :param operation: `upsert` or `delete`.
+        :param query: The filter of the write.
+        :param update: The update document of an upsert.
+        :param write_concern: The write concern to apply the write with. None for the default one.
+        :return: The sequence number of the entry.
+        """
+        started_at = time.perf_counter()
+
+        async with self._lock:
+            self._sequence += 1
+
+            entry: JournalEntry = {
+                "sequence": self._sequence,
+                "collection": collection,
+                "operation": operation,
+                "query": query,
+                "update": update,
+                "write_concern": write_concern.document if write_concern else None
+            }
+
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._write, json_util.dumps(entry).encode("utf-8") + b"\n"
+            )
+
+            self._pending.append(entry)
+            self._count_pending(collection, 1)
+
+        self.appended += 1
+        self.total_append_time += time.perf_counter() - started_at
+
+        self._idle.clear()
+        self._wakeup.set()
+
+        return entry["sequence"]
+
+    async def apply(self, entry: JournalEntry) -> None:
+        """
+        Apply a journal entry to the database.
+
+        :param entry: The journal entry.
+        """
+        if entry["write_concern"] is None:
+            collection = self.database.get_collection(entry["collection"])
+        else:
+            collection = self.database.get_collection(
+                entry["collection"], write_concern=WriteConcern(**entry["write_concern"])
+            )
+
+        if entry["operation"] == "upsert":
+            await collection.update_one(entry["query"], entry["update"], upsert=True)
+        elif entry["operation"] == "delete":
+            await collection.delete_one(entry["query"])
+        else:
+            self.logger.error(f"Unknown journal operation {entry['operation']}, skipping entry {entry['sequence']}")
+
+    async def _run(self) -> None:
+        backoff = 1
+
+        while True:
+            if not self._pending:
+                async with self._lock:
+                    if not self._pending:  # Nothing was appended while waiting for the lock
+                        await asyncio.get_running_loop().run_in_executor(None, self._truncate)
+
+                        self._idle.set()
+                        self._wakeup.clear()
+
+                await self._wakeup.wait()
+                continue
+
+            entry = self._pending[0]
+
+            try:
+                await self.apply(entry)
+            except Exception as error:
+                if is_transient(error):
+                    self.retries += 1
+                    self.logger.warning(
+                        f"Failed to apply journal entry {entry['sequence']}, retrying in {backoff}s: {error!r}"
+                    )
+
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+
+                self.logger.error(
+                    f"Failed to apply journal entry {entry['sequence']} permanently, "
+                    f"moving it to {self.dead_letter_path}: {error!r}"
+                )
+
+                try:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None,
+                        self._write_dead_letter,
+                        json_util.dumps({**entry, "error": repr(error)}).encode("utf-8") + b"\n"
+                    )
+                except Exception as dead_letter_error:
+                    self.logger.error(f"Failed to dead letter journal entry {entry['sequence']}: {dead_letter_error!r}")
+
+                self.dead_lettered += 1
+
+            else:
+                self.applied += 1
+
+            # Entries are only dropped once applied or dead lettered, so the order is kept even when retrying
+            self._pending.popleft()
+            self._count_pending(entry["collection"], -1)
+            backoff = 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the journal.
+
+        :return: A dictionary of the journal statistics.
+        """
+        return {
+            "pending": len(self._pending),
+            "appended": self.appended,
+            "applied": self.applied,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "avg_append_ms": round(self.total_append_time / self.appended * 1000, 3) if self.appended else 0.0
+        }
@@ -0,0 +1,210 @@
+from copy import deepcopy
+from typing import Dict, Optional, List, Iterable, AsyncIterator, Any, Hashable
+
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import UpdateResult, DeleteResult, InsertManyResult
+
+from src.storage.backend import Database, Collection, Cursor, Document, match_document, apply_update, project, \
+    document_from_filter, sort_documents, update_result, delete_result, insert_many_result, index_name, new_id, \
+    get_field, bulk_write_error, write_error
+
+
+def _hashable(value: Any) -> Hashable:
+    """
+    Get a hashable equivalent of a field value, to key the unique indexes with.
+    """
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+
+    return value
+
+
+class MemoryCursor(Cursor):
+    def __init__(self, collection: "MemoryCollection", query: Optional[Document], projection: Optional[Dict[str, int]]):
+        super().__init__(query, projection)
+
+        self.collection: "MemoryCollection" = collection
+
+    async def __aiter__(self) -> AsyncIterator[Document]:
+        documents = [document for document in self.collection.documents.values() if match_document(document, self.query)]
+
+        if self._sort:
+            documents = sort_documents(documents, self._sort)
+
+        if self._limit:
+            documents = documents[:self._limit]
+
+        for document in documents:
+            yield project(document, self.projection)
+
+
+class MemoryCollection(Collection):
+    """
+    A collection kept in a dictionary. Documents are lost when the process exits.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+
+        self.documents: Dict[object, Document] = {}
+        self.indexes: Dict[str, IndexModel] = {}
+        # The _id of the document holding every key of every unique index, by index name
+        self._unique: Dict[str, Dict[Hashable, object]] = {}
+
+    def _matching(self, query: Document) -> List[Document]:
+        return [document for document in self.documents.values() if match_document(document, query)]
+
+    def _unique_keys(self, document: Document) -> Dict[str, Hashable]:
+        return {
+            name: _hashable([get_field(document, key) for key in self.indexes[name].document["key"]])
+            for name in self._unique
+        }
+
+    def _check_unique(self, document: Document) -> None:
+        for name, key in self._unique_keys(document).items():
+            if self._unique[name].get(key, document["_id"]) != document["_id"]:
+                raise DuplicateKeyError(f"Duplicate key {key} for index {name} in {self.name}")
+
+    def _store(self, document: Document) -> None:
+        """
+        Store a new or updated document, after its unique keys are checked.
+        """
+        if (previous := self.documents.get(document["_id"])) is not None:
+            self._remove(previous)
+
+        for name, key in self._unique_keys(document).items():
+            self._unique[name][key] = document["_id"]
+
+        self.documents[document["_id"]] = document
+
+    def _remove(self, document: Document) -> None:
+        for name, key in self._unique_keys(document).items():
+            if self._unique[name].get(key) == document["_id"]:
+                del self._unique[name][key]
+
+        del self.documents[document["_id"]]
+
+    def find(self, query: Optional[Document] = None, projection: Optional[Dict[str, int]] = None) -> MemoryCursor:
+        return MemoryCursor(self, query, projection)
+
+    async def _update(self, query: Document, update: Document, upsert: bool, many: bool) -> UpdateResult:
+        matching = self._matching(query)
+
+        if not many:
+            matching = matching[:1]
+
+        if not matching:
+            if not upsert:
+                return update_result(0, 0)
+
+            document = document_from_filter(query)
+            document["_id"] = document.get("_id", new_id())
+            apply_update(document, update, inserting=True)
+
+            self._check_unique(document)
+            self._store(document)
+
+            return update_result(0, 0, document["_id"])
+
+        modified = 0
+
+        for document in matching:
+            updated = deepcopy(document)
+
+            if apply_update(updated, update):
+                self._check_unique(updated)
+                self._store(updated)
+                modified += 1
+
+        return update_result(len(matching), modified)
+
+    async def update_one(self, query: Document, update: Document, upsert: bool = False) -> UpdateResult:
+        return await self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query: Document, update: Document, upsert: bool = False) -> UpdateResult:
+        return await self._update(query, update, upsert, many=True)
+
+    async def insert_many(self, documents: Iterable[Document], ordered: bool = True) -> InsertManyResult:
+        ids = []
+        write_errors = []
+
+        for index, document in enumerate(documents):
+            document.setdefault("_id", new_id())
+            stored = deepcopy(document)
+
+            try:
+                if stored["_id"] in self.documents:
+                    raise DuplicateKeyError(f"Duplicate _id {stored['_id']} in {self.name}")
+
+                self._check_unique(stored)
+            except DuplicateKeyError as error:
+                write_errors.append(write_error(index, error, document))
+
+                if ordered:  # An ordered batch stops at the first rejected document
+                    break
+
+                continue
+
+            self._store(stored)
+
+            ids.append(stored["_id"])
+
+        if write_errors:
+            raise bulk_write_error(write_errors, len(ids))
+
+        return insert_many_result(ids)
+
+    async def delete_one(self, query: Document) -> DeleteResult:
+        for document in self._matching(query)[:1]:
+            self._remove(document)
+            return delete_result(1)
+
+        return delete_result(0)
+
+    async def delete_many(self, query: Document) -> DeleteResult:
+        matching = self._matching(query)
+
+        for document in matching:
+            self._remove(document)
+
+        return delete_result(len(matching))
+
+    async def count_documents(self, query: Document) -> int:
+        return len(self._matching(query))
+
+    async def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        for model in indexes:
+            name = index_name(model)
+
+            self.indexes[name] = model
+
+            if model.document.get("unique") and name not in self._unique:
+                self._unique[name] = {
+                    _hashable([get_field(document, key) for key in model.document["key"]]): document["_id"]
+                    for document in self.documents.values()
+                }
+
+        return [index_name(model) for model in indexes]
+
+
+class MemoryDatabase(Database):
+    """
+    A database kept in memory, for tests, benchmarks and deployments that don't need persistence.
+    """
+
+    def __init__(self, name: str = "krabbe"):
+        super().__init__(name)
+
+        self.collections: Dict[str, MemoryCollection] = {}
+
+    def get_collection(self, name: str, **_kwargs) -> MemoryCollection:
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(name)
+
+        return self.collections[name]
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self.collections.keys())
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Deque
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.server_api import ServerApi
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Collects the time operations spend waiting for a connection from the pool.
+    A long wait means the pool is too small for the load, or the server is too slow.
+
+    Pymongo calls the listeners from the thread checking out the connection, so the start of each checkout is
+    remembered per thread.
+    """
+
+    def __init__(self, samples: int = 1000):
+        """
+        :param samples: The number of recent wait times kept to compute the percentiles.
+        """
+        self._lock: threading.Lock = threading.Lock()
+        self._local: threading.local = threading.local()
+
+        self._wait_times: Deque[float] = deque(maxlen=samples)
+
+        self.checkouts: int = 0
+        self.failed_checkouts: int = 0
+        self.total_wait: float = 0.0
+        self.max_wait: float = 0.0
+        self.open_connections: int = 0
+        self.pool_clears: int = 0
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        self._local.started_at = time.perf_counter()
+
+    def _check_out_finished(self, failed: bool) -> None:
+        started_at: Optional[float] = getattr(self._local, "started_at", None)
+        self._local.started_at = None
+
+        if started_at is None:
+            return
+
+        wait = time.perf_counter() - started_at
+
+        with self._lock:
+            if failed:
+                self.failed_checkouts += 1
+                return
+
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._wait_times.append(wait)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        self._check_out_finished(failed=False)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        self._check_out_finished(failed=True)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        pass
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the connection pool statistics. Wait times are in milliseconds.
+
+        :return: A dictionary of the pool statistics.
+        """
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+
+            return {
+                "checkouts": self.checkouts,
+                "failed_checkouts": self.failed_checkouts,
+                "open_connections": self.open_connections,
+                "pool_clears": self.pool_clears,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "p95_wait_ms": round(wait_times[int(len(wait_times) * 0.95) - 1] * 1000, 3) if wait_times else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3)
+            }
+
+
+def create_mongo_client(
+        url: str,
+        pool_metrics: Optional[PoolMetrics] = None,
+        max_pool_size: int = 100,
+        min_pool_size: int = 0,
+        server_selection_timeout_ms: int = 30000,
+        connect_timeout_ms: int = 20000,
+        socket_timeout_ms: Optional[int] = None
+) -> AsyncIOMotorClient:
+    """
+    Create the Motor client with the specified connection pool settings.
+
+    :param url: The MongoDB connection string.
+    :param pool_metrics: The listener collecting the pool metrics, if any.
+    :param max_pool_size: The maximum number of connections per server.
+    :param min_pool_size: The number of connections kept open per server, even when idle.
+    :param server_selection_timeout_ms: How long an operation waits for a suitable server before failing.
+    :param connect_timeout_ms: How long opening a connection can take before failing.
+    :param socket_timeout_ms: How long a sent operation can wait for its response before failing. None for no limit.
+    :return: The Motor client.
+    """
+    return AsyncIOMotorClient(
+        url,
+        server_api=ServerApi('1'),
+        maxPoolSize=max_pool_size,
+        minPoolSize=min_pool_size,
+        serverSelectionTimeoutMS=server_selection_timeout_ms,
+        connectTimeoutMS=connect_timeout_ms,
+        socketTimeoutMS=socket_timeout_ms,
+        event_listeners=[pool_metrics] if pool_metrics else []
+    )
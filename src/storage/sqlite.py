@@ -0,0 +1,328 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Optional, List, Iterable, AsyncIterator, Any, Tuple, Set
+
+from bson import ObjectId
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import UpdateResult, DeleteResult, InsertManyResult
+
+from src.storage.backend import Database, Collection, Cursor, Document, match_document, apply_update, project, \
+    document_from_filter, sort_documents, update_result, delete_result, insert_many_result, index_name, new_id, \
+    bulk_write_error, write_error
+
+try:
+    import aiosqlite
+except ImportError:  # aiosqlite is only needed by this backend
+    aiosqlite = None
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    if len(value) == 1 and "$oid" in value:
+        return ObjectId(value["$oid"])
+
+    return value
+
+
+def dumps(document: Document) -> str:
+    return json.dumps({key: value for key, value in document.items() if key != "_id"}, default=_encode)
+
+
+def loads(document_id: str, data: str) -> Document:
+    document = json.loads(data, object_hook=_decode)
+    document["_id"] = ObjectId(document_id) if ObjectId.is_valid(document_id) else document_id
+
+    return document
+
+
+def _is_plain(value: Any) -> bool:
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def _where(query: Document) -> Tuple[str, List[Any]]:
+    """
+    Translate the simple equality and `$in` conditions of a query to SQL, so the expression indexes can be used.
+    Every other condition is checked in Python afterwards.
+    """
+    clauses = []
+    parameters: List[Any] = []
+
+    for key, condition in query.items():
+        if key.startswith("$") or "." in key:
+            continue
+
+        column = "_id" if key == "_id" else f"json_extract(document, '$.{key}')"
+
+        if _is_plain(condition):
+            clauses.append(f"{column} = ?")
+            parameters.append(condition)
+
+        elif isinstance(condition, ObjectId) and key == "_id":
+            clauses.append("_id = ?")
+            parameters.append(str(condition))
+
+        elif isinstance(condition, dict) and list(condition) == ["$in"] and condition["$in"] \
+                and all(_is_plain(item) for item in condition["$in"]):
+            clauses.append(f"{column} IN ({', '.join('?' for _ in condition['$in'])})")
+            parameters.extend(condition["$in"])
+
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", parameters
+
+
+class SQLiteCursor(Cursor):
+    def __init__(self, collection: "SQLiteCollection", query: Optional[Document], projection: Optional[Dict[str, int]]):
+        super().__init__(query, projection)
+
+        self.collection: "SQLiteCollection" = collection
+
+    async def __aiter__(self) -> AsyncIterator[Document]:
+        documents = await self.collection.matching(self.query)
+
+        if self._sort:
+            documents = sort_documents(documents, self._sort)
+
+        if self._limit:
+            documents = documents[:self._limit]
+
+        for document in documents:
+            yield project(document, self.projection)
+
+
+class SQLiteCollection(Collection):
+    """
+    A collection stored as a table of JSON documents in SQLite.
+    """
+
+    def __init__(self, database: "SQLiteDatabase", name: str):
+        super().__init__(name)
+
+        self.database: "SQLiteDatabase" = database
+        self.table: str = '"' + name.replace('"', '""') + '"'
+
+    async def _connection(self) -> "aiosqlite.Connection":
+        return await self.database.connection(self.name)
+
+    async def matching(self, query: Document, limit: int = 0) -> List[Document]:
+        connection = await self._connection()
+        where, parameters = _where(query)
+
+        documents = []
+
+        async with connection.execute(f"SELECT _id, document FROM {self.table}{where}", parameters) as cursor:
+            async for document_id, data in cursor:
+                document = loads(document_id, data)
+
+                if match_document(document, query):
+                    documents.append(document)
+
+                    if limit and len(documents) >= limit:
+                        break
+
+        return documents
+
+    async def _write(self, document: Document, insert: bool) -> None:
+        connection = await self._connection()
+
+        try:
+            if insert:
+                await connection.execute(
+                    f"INSERT INTO {self.table} (_id, document) VALUES (?, ?)", (str(document["_id"]), dumps(document))
+                )
+            else:
+                await connection.execute(
+                    f"UPDATE {self.table} SET document = ? WHERE _id = ?", (dumps(document), str(document["_id"]))
+                )
+        except aiosqlite.IntegrityError as error:
+            raise DuplicateKeyError(f"Duplicate key in {self.name}: {error}")
+
+    def find(self, query: Optional[Document] = None, projection: Optional[Dict[str, int]] = None) -> SQLiteCursor:
+        return SQLiteCursor(self, query, projection)
+
+    async def _update(self, query: Document, update: Document, upsert: bool, many: bool) -> UpdateResult:
+        async with self.database.lock:
+            matching = await self.matching(query, limit=0 if many else 1)
+
+            if not matching:
+                if not upsert:
+                    return update_result(0, 0)
+
+                document = document_from_filter(query)
+                document["_id"] = document.get("_id", new_id())
+                apply_update(document, update, inserting=True)
+
+                try:
+                    await self._write(document, insert=True)
+                except DuplicateKeyError:
+                    await self.database.rollback()
+                    raise
+
+                await self.database.commit()
+
+                return update_result(0, 0, document["_id"])
+
+            modified = 0
+
+            try:
+                for document in matching:
+                    if apply_update(document, update):
+                        await self._write(document, insert=False)
+                        modified += 1
+            except DuplicateKeyError:
+                await self.database.rollback()
+                raise
+
+            await self.database.commit()
+
+        return update_result(len(matching), modified)
+
+    async def update_one(self, query: Document, update: Document, upsert: bool = False) -> UpdateResult:
+        return await self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query: Document, update: Document, upsert: bool = False) -> UpdateResult:
+        return await self._update(query, update, upsert, many=True)
+
+    async def insert_many(self, documents: Iterable[Document], ordered: bool = True) -> InsertManyResult:
+        ids = []
+        write_errors = []
+
+        await self._connection()
+
+        async with self.database.lock:
+            # A rejected insert only fails its own statement, the documents inserted before it are committed
+            for index, document in enumerate(documents):
+                document.setdefault("_id", new_id())
+
+                try:
+                    await self._write(document, insert=True)
+                except DuplicateKeyError as error:
+                    write_errors.append(write_error(index, error, document))
+
+                    if ordered:  # An ordered batch stops at the first rejected document
+                        break
+
+                    continue
+
+                ids.append(document["_id"])
+
+            await self.database.commit()
+
+        if write_errors:
+            raise bulk_write_error(write_errors, len(ids))
+
+        return insert_many_result(ids)
+
+    async def _delete(self, query: Document, many: bool) -> DeleteResult:
+        connection = await self._connection()
+
+        async with self.database.lock:
+            matching = await self.matching(query, limit=0 if many else 1)
+
+            if not matching:
+                return delete_result(0)
+
+            await connection.executemany(
+                f"DELETE FROM {self.table} WHERE _id = ?", [(str(document["_id"]),) for document in matching]
+            )
+            await self.database.commit()
+
+        return delete_result(len(matching))
+
+    async def delete_one(self, query: Document) -> DeleteResult:
+        return await self._delete(query, many=False)
+
+    async def delete_many(self, query: Document) -> DeleteResult:
+        return await self._delete(query, many=True)
+
+    async def count_documents(self, query: Document) -> int:
+        return len(await self.matching(query))
+
+    async def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        connection = await self._connection()
+
+        for model in indexes:
+            keys = list(model.document["key"])
+            columns = ", ".join(f"json_extract(document, '$.{key}')" for key in keys)
+            name = f'"{self.name}_{index_name(model)}"'
+
+            await connection.execute(
+                f"CREATE {'UNIQUE ' if model.document.get('unique') else ''}INDEX IF NOT EXISTS {name} "
+                f"ON {self.table} ({columns})"
+            )
+
+        await self.database.commit()
+
+        return [index_name(model) for model in indexes]
+
+
+class SQLiteDatabase(Database):
+    """
+    A database stored in a single SQLite file, for small self-hosted deployments and benchmarks.
+    Requires the optional `aiosqlite` package.
+    """
+
+    def __init__(self, name: str = "krabbe", path: str = "krabbe.db"):
+        if aiosqlite is None:
+            raise RuntimeError("The sqlite storage backend requires the aiosqlite package, install it with pip")
+
+        super().__init__(name)
+
+        self.path: str = path
+        self.lock: asyncio.Lock = asyncio.Lock()
+
+        self._connection: Optional["aiosqlite.Connection"] = None
+        self._tables: Set[str] = set()
+        self._collections: Dict[str, SQLiteCollection] = {}
+
+    async def connection(self, table: Optional[str] = None) -> "aiosqlite.Connection":
+        """
+        Get the connection to the database file, creating the table of the collection if needed.
+
+        :param table: The name of the collection about to be used.
+        :return: The connection.
+        """
+        if self._connection is None:
+            self._connection = await aiosqlite.connect(self.path)
+            await self._connection.execute("PRAGMA journal_mode=WAL")
+
+        if table is not None and table not in self._tables:
+            await self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" (_id TEXT PRIMARY KEY, document TEXT NOT NULL)'
+            )
+            self._tables.add(table)
+
+        return self._connection
+
+    async def commit(self) -> None:
+        await self._connection.commit()
+
+    async def rollback(self) -> None:
+        await self._connection.rollback()
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    def get_collection(self, name: str, **_kwargs) -> SQLiteCollection:
+        if name not in self._collections:
+            self._collections[name] = SQLiteCollection(self, name)
+
+        return self._collections[name]
+
+    async def list_collection_names(self) -> List[str]:
+        connection = await self.connection()
+
+        async with connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as cursor:
+            return [row[0] async for row in cursor]
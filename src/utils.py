@@ -1,11 +1,13 @@
-from datetime import datetime
-from typing import Union, Dict, TYPE_CHECKING, List, Iterable
+from datetime import datetime, timezone
+from typing import Union, Dict, TYPE_CHECKING, List, Iterable, Optional
 
 from ZeitfreiOauth import AsyncDiscordOAuthClient
 from aiohttp import ClientResponseError
 from disnake import PermissionOverwrite, Member, Role, Guild, User, Embed, utils
 from tzlocal import get_localzone
 
+from src.classes.overwrite_templates import OWNER_OVERWRITE, MEMBER_OVERWRITE, KAVA_OVERWRITE, base_role_overwrite
+
 if TYPE_CHECKING:
     from src.bot import Krabbe
     from src.classes.guild_settings import GuildSettings
@@ -42,6 +44,7 @@ def generate_channel_metadata(
 ) -> Dict[str, Union[str, int, PermissionOverwrite, bool]]:
     """
     Generate the metadata for a channel.
+    The metadata is memoized on its inputs and the version of the overwrite template of the guild.
 
     :param bot: The bot instance.
     :param owner: The owner of the channel.
@@ -50,10 +53,44 @@ def generate_channel_metadata(
     :param guild_settings: The guild settings object.
     :param locked: Whether the channel is locked.
     :return: The metadata for the channel, usually can be passed as kwargs to a channel creation or edit method.
+        The overwrites are shared and must not be modified.
     """
-    return {
-        "name": channel_settings.channel_name or f"{channel_settings.user} 的語音頻道",
-        "overwrites": generate_permission_overwrites(bot, owner, members, channel_settings, guild_settings, locked),
+    templates = bot.overwrite_templates
+
+    name = channel_settings.channel_name or f"{channel_settings.user} 的語音頻道"
+    kava_members = templates.kava_members(guild_settings.guild)
+
+    key = (
+        guild_settings.guild_id,
+        templates.version(guild_settings.guild_id),
+        guild_settings.category_channel_id,
+        guild_settings.base_role_id,
+        guild_settings.allow_nsfw,
+        guild_settings.guild.premium_tier,
+        owner.id,
+        tuple(member.id for member in members) if locked else (),
+        tuple(member.id for member in kava_members),
+        locked,
+        name,
+        channel_settings.bitrate,
+        channel_settings.user_limit,
+        channel_settings.rtc_region,
+        channel_settings.nsfw,
+        channel_settings.slowmode_delay,
+        channel_settings.soundboard_enabled,
+        channel_settings.media_allowed,
+        channel_settings.stream,
+        channel_settings.use_embedded_activities
+    )
+
+    if (metadata := templates.metadata_cache.get(key)) is not None:
+        return dict(metadata)
+
+    metadata = {
+        "name": name,
+        "overwrites": generate_permission_overwrites(
+            bot, owner, members, channel_settings, guild_settings, locked, kava_members
+        ),
         "bitrate": max_bitrate(guild_settings.guild)
         if channel_settings.bitrate and channel_settings.bitrate >= max_bitrate(guild_settings.guild)
         else channel_settings.bitrate or 64000,
@@ -63,6 +100,10 @@ def generate_channel_metadata(
         "slowmode_delay": channel_settings.slowmode_delay or 0
     }
 
+    templates.metadata_cache.put(key, metadata)
+
+    return dict(metadata)
+
 
 def generate_permission_overwrites(
         bot: "Krabbe",
@@ -71,95 +112,40 @@ def generate_permission_overwrites(
         channel_settings: "ChannelSettings",
         guild_settings: "GuildSettings",
         locked: bool = False,
+        kava_members: Optional[List[Member]] = None
 ) -> Dict[Union[Role, Member], PermissionOverwrite]:
     """
-    Generate permission overwrites for a channel.
+    Generate permission overwrites for a channel, from the overwrite template of the guild.
 
     :param owner: The owner of the channel.
     :param members: The members of the channel.
     :param channel_settings: The channel settings.
     :param guild_settings: The guild settings.
     :param locked: Whether the channel is locked.
-    :return: The permission overwrites for the channel.
+    :param kava_members: The members of the connected Kava bots, looked up if not specified.
+    :return: The permission overwrites for the channel. The overwrites are shared and must not be modified.
     """
-    if locked:
-        overwrites = guild_settings.category_channel.overwrites.copy()
-
-        overwrites.update(
-            {
-                owner: PermissionOverwrite(
-                    connect=True,
-                    manage_channels=True,
-                    mute_members=True,
-                    deafen_members=True,
-                    move_members=True
-                ),
-                guild_settings.base_role: PermissionOverwrite(
-                    connect=False,
-                    use_soundboard=False if channel_settings.soundboard_enabled is None
-                    else channel_settings.soundboard_enabled,  # To make it's False by default
-                    attach_files=channel_settings.media_allowed,
-                    embed_links=channel_settings.media_allowed,
-                    use_external_sounds=True,
-                    use_application_commands=True,
-                    stream=channel_settings.stream,
-                    use_embedded_activities=channel_settings.use_embedded_activities
-                )
-            }
-        )
+    templates = bot.overwrite_templates
 
+    overwrites = templates.category_overwrites(guild_settings).copy()
+
+    overwrites[owner] = OWNER_OVERWRITE
+    overwrites[guild_settings.base_role] = base_role_overwrite(
+        locked,
+        channel_settings.soundboard_enabled,
+        channel_settings.media_allowed,
+        channel_settings.stream,
+        channel_settings.use_embedded_activities
+    )
+
+    if locked:
         for member in members:
-            overwrites[member] = PermissionOverwrite(
-                connect=True
-            )
-
-        for kava in [
-            bot.kava_server.clients[member.id] for member in guild_settings.guild.members
-            if member.id in bot.kava_server.clients
-        ]:
-            overwrites[guild_settings.guild.get_member(kava.bot_user_id)] = PermissionOverwrite(
-                connect=True,
-                speak=True
-            )
-
-        return overwrites
-
-    else:
-        overwrites = guild_settings.category_channel.overwrites.copy()
-
-        overwrites.update(
-            {
-                owner: PermissionOverwrite(
-                    connect=True,
-                    manage_channels=True,
-                    mute_members=True,
-                    deafen_members=True,
-                    move_members=True
-                ),
-                guild_settings.base_role: PermissionOverwrite(
-                    connect=True,
-                    use_soundboard=False if channel_settings.soundboard_enabled is None
-                    else channel_settings.soundboard_enabled,  # To make it's False by default
-                    attach_files=channel_settings.media_allowed,
-                    embed_links=channel_settings.media_allowed,
-                    use_external_sounds=True,
-                    use_application_commands=True,
-                    stream=channel_settings.stream,
-                    use_embedded_activities=channel_settings.use_embedded_activities
-                )
-            }
-        )
-
-        for kava in [
-            bot.kava_server.clients[member.id] for member in guild_settings.guild.members
-            if member.id in bot.kava_server.clients
-        ]:
-            overwrites[guild_settings.guild.get_member(kava.bot_user_id)] = PermissionOverwrite(
-                connect=True,
-                speak=True
-            )
-
-        return overwrites
+            overwrites[member] = MEMBER_OVERWRITE
+
+    for kava_member in kava_members if kava_members is not None else templates.kava_members(guild_settings.guild):
+        overwrites[kava_member] = KAVA_OVERWRITE
+
+    return overwrites
 
 
 def is_same_day(date1: datetime, date2: datetime) -> bool:
@@ -195,6 +181,19 @@ def snowflake_time(snowflake: int) -> datetime:
     return utils.snowflake_time(snowflake).astimezone(get_localzone())
 
 
+def local_time(time: datetime) -> datetime:
+    """
+    Convert a time to the local timezone. Naive times, like the ones read from the database, are in UTC.
+
+    :param time: The time to convert.
+    :return: The time in the local timezone.
+    """
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+
+    return time.astimezone(get_localzone())
+
+
 async def is_authorized(oauth_client: AsyncDiscordOAuthClient, user_id: int) -> bool:
     """
     Check if a user is authorized to use the bot.
@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+from disnake import Object, PermissionOverwrite
+
+from src.classes.channel_edit_planner import ChannelEditPlanner, EditStrategy
+
+
+def channel_with(target, roles):
+    return SimpleNamespace(
+        overwrites={target: PermissionOverwrite(connect=True)},
+        guild=SimpleNamespace(get_role=roles.get, get_member=lambda _: None)
+    )
+
+
+def test_unresolved_targets_fall_back_to_a_full_edit():
+    plan = ChannelEditPlanner().plan(channel_with(Object(5), {}), {"overwrites": {}})
+
+    assert plan.strategy == EditStrategy.EDIT
+    assert plan.overwrites == {}
+
+
+def test_uncached_targets_are_resolved_for_set_permissions():
+    role = object()
+
+    plan = ChannelEditPlanner().plan(channel_with(Object(5), {5: role}), {"overwrites": {}})
+
+    assert plan.strategy == EditStrategy.SET_PERMISSIONS
+    assert plan.changed_overwrites == {5: (role, None)}
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiohttp import ClientSession
+
+from src.classes.guild_settings import GuildSettings
+from src.storage.memory import MemoryDatabase
+
+WEBHOOK_URL = "https://discord.com/api/webhooks/{}/" + "t" * 68
+
+
+def guild_settings(bot, database: MemoryDatabase) -> GuildSettings:
+    return GuildSettings(
+        bot=bot,
+        database=database,
+        guild_id=1,
+        category_channel_id=2,
+        root_channel_id=3,
+        base_role_id=4,
+        event_logging_channel_id=5,
+        settings_event_logging_thread_id=6,
+        voice_event_logging_thread_id=7,
+        message_logging_channel_id=8,
+        message_logging_webhook_url=WEBHOOK_URL.format(11111111111111111),
+        allow_nsfw=False,
+        lock_message_dm=False,
+        message_logging_webhook_pool_urls=[WEBHOOK_URL.format(22222222222222222), WEBHOOK_URL.format(33333333333333333)]
+    )
+
+
+def test_retiring_webhooks_updates_the_stored_document():
+    async def run():
+        database = MemoryDatabase()
+        collection = database.get_collection(GuildSettings.collection_name)
+
+        session = ClientSession()
+
+        try:
+            settings = guild_settings(SimpleNamespace(webhooks_client_session=session), database)
+            await settings.upsert()
+
+            main, first, second = settings.message_logging_webhooks
+
+            await settings.retire_message_logging_webhook(first)
+
+            stored = await collection.find_one({"guild_id": 1})
+
+            assert stored["message_logging_webhook_pool_urls"] == [WEBHOOK_URL.format(33333333333333333)]
+
+            await settings.retire_message_logging_webhook(main)
+
+            stored = await collection.find_one({"guild_id": 1})
+
+            assert stored["message_logging_webhook_url"] == WEBHOOK_URL.format(33333333333333333)
+            assert stored["message_logging_webhook_pool_urls"] == []
+        finally:
+            await session.close()
+
+    asyncio.run(run())
@@ -0,0 +1,95 @@
+import asyncio
+
+from bson import json_util
+from pymongo.errors import DuplicateKeyError, AutoReconnect
+
+from src.classes.mongo_object import MongoObject
+from src.storage.journal import WriteAheadJournal
+from src.storage.memory import MemoryDatabase
+from tests.test_mongo_object import Document
+
+
+class SlowJournal(WriteAheadJournal):
+    async def apply(self, entry):
+        await asyncio.sleep(0.1)
+        await super().apply(entry)
+
+
+def test_reads_see_pending_journal_entries(tmp_path):
+    async def run():
+        database = MemoryDatabase()
+        journal = SlowJournal(str(tmp_path / "journal"), database)
+
+        await journal.open()
+        MongoObject.configure_journal(journal)
+
+        try:
+            await Document(None, database, key=1, tags=["a"]).upsert()
+
+            assert journal.pending("documents") == 1
+
+            document = await Document.find_one(None, database, key=1)
+
+            assert document is not None and document.tags == ["a"]
+            assert journal.pending("documents") == 0
+        finally:
+            MongoObject.configure_journal(None)
+            await journal.close()
+
+    asyncio.run(run())
+
+
+class FailingJournal(WriteAheadJournal):
+    def __init__(self, path, database, error):
+        super().__init__(path, database)
+        self.error = error
+
+    async def apply(self, entry):
+        if entry["query"] == {"key": 1}:
+            raise self.error
+
+        await super().apply(entry)
+
+
+def test_permanent_failures_are_dead_lettered(tmp_path):
+    async def run():
+        database = MemoryDatabase()
+        journal = FailingJournal(str(tmp_path / "journal"), database, DuplicateKeyError("duplicate"))
+
+        await journal.open()
+
+        try:
+            await journal.append("documents", "upsert", {"key": 1}, {"$set": {"key": 1}})
+            await journal.append("documents", "upsert", {"key": 2}, {"$set": {"key": 2}})
+
+            await asyncio.wait_for(journal.join(), 1)
+
+            assert await database.get_collection("documents").find_one({"key": 2}) is not None
+            assert journal.stats()["dead_lettered"] == 1
+
+            with open(journal.dead_letter_path, "rb") as file:
+                assert [json_util.loads(line)["query"] for line in file] == [{"key": 1}]
+        finally:
+            await journal.close()
+
+    asyncio.run(run())
+
+
+def test_transient_failures_are_retried(tmp_path):
+    async def run():
+        database = MemoryDatabase()
+        journal = FailingJournal(str(tmp_path / "journal"), database, AutoReconnect("connection lost"))
+
+        await journal.open()
+
+        try:
+            await journal.append("documents", "upsert", {"key": 1}, {"$set": {"key": 1}})
+
+            await asyncio.sleep(0.1)
+
+            assert journal.pending("documents") == 1
+            assert journal.stats()["retries"] == 1
+        finally:
+            await journal.close(timeout=0)
+
+    asyncio.run(run())
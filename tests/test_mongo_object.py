@@ -0,0 +1,63 @@
+import asyncio
+from typing import List
+
+from src.classes.mongo_object import MongoObject
+from src.storage.memory import MemoryDatabase
+
+
+class Document(MongoObject):
+    collection_name = "documents"
+
+    def __init__(self, bot, database, key: int, tags: List[str], name: str = ""):
+        super().__init__(bot, database)
+
+        self.key: int = key
+        self.tags: List[str] = tags
+        self.name: str = name
+
+    def unique_identifier(self) -> dict:
+        return {"key": self.key}
+
+    def to_dict(self) -> dict:
+        return {"key": self.key, "tags": self.tags, "name": self.name}
+
+
+def test_in_place_changes_are_dirty():
+    async def run():
+        database = MemoryDatabase()
+
+        document = Document(None, database, key=1, tags=["a", "b"])
+        await document.upsert()
+
+        document.tags.remove("a")
+
+        assert document.dirty_fields() == {"tags": ["b"]}
+
+        await document.upsert()
+
+        stored = await database.get_collection("documents").find_one({"key": 1})
+
+        assert stored["tags"] == ["b"]
+        assert document.dirty_fields() == {}
+
+    asyncio.run(run())
+
+
+def test_upserting_a_deleted_document_recreates_it_whole():
+    async def run():
+        database = MemoryDatabase()
+
+        document = Document(None, database, key=1, tags=["a"], name="first")
+        await document.upsert()
+
+        await database.get_collection("documents").delete_one({"key": 1})
+
+        document.tags = ["b"]
+        await document.upsert()
+
+        stored = await database.get_collection("documents").find_one({"key": 1})
+
+        assert stored["tags"] == ["b"]
+        assert stored["name"] == "first"
+
+    asyncio.run(run())
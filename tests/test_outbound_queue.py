@@ -0,0 +1,43 @@
+import asyncio
+
+from src.classes.outbound_queue import OutboundQueue, Priority
+
+
+def test_full_queue_only_evicts_lower_priority_messages():
+    async def run():
+        queue = OutboundQueue(max_pending=1)
+        blocker = asyncio.Event()
+        sent = []
+
+        def message(name):
+            async def send():
+                await blocker.wait()
+                sent.append(name)
+
+            return send
+
+        queue.put(1, Priority.AUDIT_LOG, message("busy"))
+        await asyncio.sleep(0)  # The first message is being sent, so it no longer counts as waiting
+
+        first = queue.put(1, Priority.AUDIT_LOG, message("first"))
+        second = queue.put(1, Priority.AUDIT_LOG, message("second"))
+
+        blocker.set()
+        await asyncio.gather(first, second)
+
+        assert sent == ["busy", "first"]
+
+        blocker.clear()
+        queue.put(1, Priority.AUDIT_LOG, message("busy"))
+        await asyncio.sleep(0)
+
+        audit_log = queue.put(1, Priority.AUDIT_LOG, message("audit log"))
+        notification = queue.put(1, Priority.NOTIFICATION, message("notification"))
+
+        blocker.set()
+        await asyncio.gather(audit_log, notification)
+
+        assert sent == ["busy", "first", "busy", "notification"]
+        assert queue.dropped[Priority.AUDIT_LOG] == 2
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from disnake import HTTPException
+
+from src.classes.setting_change import SettingLatency, apply_setting_change
+
+
+def test_effects_are_applied_when_the_response_fails():
+    async def run():
+        applied = []
+
+        def effect(name):
+            async def apply(*_args, **_kwargs):
+                applied.append(name)
+
+            return apply
+
+        async def schedule_edit():
+            applied.append("edit")
+            return asyncio.sleep(0)
+
+        async def respond():
+            raise HTTPException(SimpleNamespace(status=404, reason="Not Found"), "Unknown interaction")
+
+        bot = SimpleNamespace(setting_latency=SettingLatency())
+        channel = SimpleNamespace(
+            channel_id=1,
+            channel_settings=SimpleNamespace(upsert=effect("upsert")),
+            apply_setting_and_permissions=schedule_edit,
+            notify=effect("notify"),
+            guild_settings=SimpleNamespace(log_settings_event=effect("log"))
+        )
+        interaction = SimpleNamespace(bot=bot, created_at=datetime.now(timezone.utc))
+
+        await apply_setting_change(
+            interaction, channel, "limit", respond, notification=object(), log_message="limit",
+            extra_effects=[("extra", effect("extra")())]
+        )
+
+        assert sorted(applied) == ["edit", "extra", "log", "notify", "upsert"]
+        assert "limit.response" not in bot.setting_latency.stats()
+
+    asyncio.run(run())
+
+
+def test_p95_of_small_samples_is_the_nearest_rank():
+    latency = SettingLatency()
+
+    for value in range(1, 11):
+        latency.record("limit", "response", value / 1000)
+
+    assert latency.stats()["limit.response"]["p95_ms"] == 10.0
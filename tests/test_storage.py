@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from src.storage.memory import MemoryDatabase
+from src.storage.sqlite import SQLiteDatabase
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+@pytest.mark.parametrize("ordered, inserted, keys", [(True, 1, [1, 2, 4]), (False, 2, [1, 2, 3, 4])])
+def test_insert_many_duplicate_key_keeps_the_valid_documents(backend, ordered, inserted, keys, tmp_path):
+    async def run():
+        database = MemoryDatabase() if backend == "memory" else SQLiteDatabase(path=str(tmp_path / "test.db"))
+        collection = database.get_collection("events")
+
+        try:
+            await collection.create_indexes([IndexModel([("key", ASCENDING)], unique=True)])
+            await collection.insert_many([{"key": 1}])
+
+            with pytest.raises(BulkWriteError) as error:
+                await collection.insert_many([{"key": 2}, {"key": 1}, {"key": 3}, {"key": 1}], ordered=ordered)
+
+            assert error.value.details["nInserted"] == inserted
+            assert [write_error["index"] for write_error in error.value.details["writeErrors"]] == \
+                   ([1] if ordered else [1, 3])
+
+            await collection.update_one({"key": 4}, {"$set": {"value": True}}, upsert=True)
+
+            assert sorted(document["key"] for document in await collection.find({}).to_list(None)) == keys
+        finally:
+            await database.close()
+
+    asyncio.run(run())
+
+
+def test_memory_unique_index_follows_updates_and_deletes():
+    async def run():
+        collection = MemoryDatabase().get_collection("events")
+
+        await collection.create_indexes([IndexModel([("key", ASCENDING)], unique=True)])
+        await collection.insert_many([{"key": 1}, {"key": 2}])
+
+        await collection.update_one({"key": 1}, {"$set": {"key": 3}})
+        await collection.delete_one({"key": 2})
+
+        await collection.insert_many([{"key": 1}, {"key": 2}])
+
+        with pytest.raises(DuplicateKeyError):
+            await collection.update_one({"key": 1}, {"$set": {"key": 3}})
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import asyncio
+from types import SimpleNamespace
+
+from pymongo.errors import BulkWriteError
+
+from src.classes.voice_event_recorder import VoiceEventRecorder
+
+
+class PartiallyFailingCollection:
+    def __init__(self, write_errors):
+        self.write_errors = write_errors
+
+    async def insert_many(self, documents, ordered=True):
+        raise BulkWriteError({
+            "writeErrors": self.write_errors,
+            "writeConcernErrors": [],
+            "nInserted": len(documents) - len(self.write_errors),
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": []
+        })
+
+
+def test_only_transient_failures_are_retried():
+    async def run():
+        collection = PartiallyFailingCollection([
+            {"index": 1, "code": 11000, "errmsg": "duplicate key"},
+            {"index": 2, "code": 91, "errmsg": "shutdown in progress"}
+        ])
+        recorder = VoiceEventRecorder(None, SimpleNamespace(get_collection=lambda _: collection))
+
+        recorder._events = [{"event": index} for index in range(4)]
+
+        await recorder.flush()
+
+        assert recorder._events == [{"event": 2}]
+        assert recorder.written == 2
+        assert recorder.dropped == 1
+
+    asyncio.run(run())